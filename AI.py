@@ -1,39 +1,57 @@
-import curses
-from random import choice
-import time
+from random import Random
 
 __author__ = 'Felipe V. Calderan'
 __copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
 __license__ = 'BSD 3-Clause "New" or "Revised" License'
 __version__ = '1.0'
 
-# Random variable for the AI
-RND = 0
-
 # AI Atrociousness : int (from 4 to 60. The higher, the more atrocious)
 ATROCIOUSNESS = 10 # A.K.A "difficulty level"
 
-def AI(screen, arena, player, keys, is_AI, game_status) -> str or None:
-    """An AI will send the inputs to the game"""
 
-    time.sleep(0.033)
+class Bot:
+    """An AI player with its own difficulty level and random generator, so
+    that several of them can play at once (e.g. in tournament.py)"""
+
+    def __init__(self, atrociousness : int = None, seed : int = None):
+        """Create an AI as atrocious as asked (ATROCIOUSNESS by default),
+        playing the same way every time it's given the same seed"""
+        if atrociousness is None: atrociousness = ATROCIOUSNESS
+        self.atrociousness = min(max(atrociousness, 4), 60)
+        self.random = Random(seed)
+        self.rnd    = 0
+
+
+    def __call__(
+        self, screen, arena, player, keys, is_AI, game_status
+    ) -> str or None:
+        """The bot will send the inputs to the game"""
+        atrociousness = self.atrociousness
+        ball_x, ball_y, _, ball_vy = game_status['ball']
 
-    global ATROCIOUSNESS
-    global RND
+        if atrociousness+2 > abs(ball_x-player.x) > atrociousness:
+            self.rnd = self.random.choice((-1, 0, 1))
 
-    if ATROCIOUSNESS < 4: ATROCIOUSNESS = 4
-    if ATROCIOUSNESS > 60: ATROCIOUSNESS = 60
+        elif atrociousness > abs(ball_x-player.x) > 1:
+            if ball_vy != 0:
+                if   ball_y < player.y : return 'up'
+                elif ball_y > player.y : return 'down'
+                else                   : return None
 
-    if ATROCIOUSNESS+2 > abs(game_status['ball'][0]-player.x) > ATROCIOUSNESS:
-        RND = choice((-1, 0, 1))
+            else:
+                if   ball_y < player.y + self.rnd : return 'up'
+                elif ball_y > player.y + self.rnd : return 'down'
+                else                              : return None
 
-    elif ATROCIOUSNESS > abs(game_status['ball'][0]-player.x) > 1:
-        if game_status['ball'][3] != 0:
-            if   game_status['ball'][1] < player.y : return 'up'
-            elif game_status['ball'][1] > player.y : return 'down'
-            else                                   : return None
 
-        else:
-            if   game_status['ball'][1] < player.y + RND : return 'up'
-            elif game_status['ball'][1] > player.y + RND : return 'down'
-            else                                         : return None
+def create(param : str or None, seed : int = None) -> Bot:
+    """The bot as registered in agents.py, param being its atrociousness"""
+    return Bot(None if param is None else int(param), seed)
+
+
+# The default bot, as a plain AI function
+_BOT = Bot()
+
+def AI(screen, arena, player, keys, is_AI, game_status) -> str or None:
+    """An AI will send the inputs to the game"""
+    return _BOT(screen, arena, player, keys, is_AI, game_status)
@@ -1,21 +1,152 @@
 from tkinter import Tk, Label, Button, Entry
 import sys
+import queue
 import socket
-import _thread as thread
+import select
+import struct
+import time
+import threading
 
 __author__ = 'Felipe V. Calderan'
 __copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
 __license__ = 'BSD 3-Clause "New" or "Revised" License'
 __version__ = '1.0'
 
+# Spong wire protocol (see protocol.py in the game's folder). It is copied here
+# so that this file can be loaded on the phone on its own.
+PROTOCOL_VERSION = 9
+MSG_HELLO, MSG_INPUT, MSG_ACK = 1, 2, 8
+SIDE_CONTROLLER  = 3
+HEADER      = struct.Struct('!HBB')
+HELLO_FRAME = struct.Struct('!HBB16sBBIIB')
+INPUT_FRAME = struct.Struct('!HBBIB')
+HELLO_LEN   = HELLO_FRAME.size-HEADER.size
+INPUT_LEN   = INPUT_FRAME.size-HEADER.size
+ACTION_BITS = {None : 0, 'up' : 1, 'down' : 2}
+
+# The action is sent when a button is pressed and when it's released (the
+# host holds it in between), at most SEND_RATE times per second (or the rate
+# given as the first argument). The host sends an ACK every second
+SEND_RATE   = 30
+ACK_TIMEOUT = 5
+
+# Seconds the network thread waits for an action before checking the ACKs,
+# and milliseconds between two checks of the network thread's events by Tk
+NET_POLL = 0.25
+UI_POLL  = 50
+
+
+def recv_exactly(skt, size):
+    """Receive exactly size bytes from the socket"""
+    data = b''
+    while len(data) < size:
+        chunk = skt.recv(size-len(data))
+        if not chunk: raise ConnectionError('peer closed the connection')
+        data += chunk
+    return data
+
+
+def recv_frame(skt):
+    """Receive a whole frame, returning its type and raw payload"""
+    length, version, msg_type = HEADER.unpack(recv_exactly(skt, HEADER.size))
+    if version != PROTOCOL_VERSION:
+        raise ConnectionError('incompatible game version')
+    return msg_type, recv_exactly(skt, length)
+
+
+def coalesce(pending, sent):
+    """Actions to send out of those pending, given the last one sent: only
+    the newest, unless it undoes an older one (a quick tap), which must
+    still reach the host"""
+    if not pending: return []
+    if pending[-1] != sent: return pending[-1:]
+    if len(pending) > 1 and pending[-2] != sent: return pending[-2:]
+    return []
+
+
+class Connection(threading.Thread):
+    """The network side of the controller, on its own thread. It never
+    touches Tk's widgets: actions come in through one queue, and what
+    happens to the connection goes out through another"""
+
+    def __init__(self, address, name, send_rate, events):
+        super().__init__(daemon=True)
+        self.address  = address
+        self.name     = name
+        self.interval = 1/send_rate
+        self.events   = events
+        self.actions  = queue.Queue()
+        self.closing  = threading.Event()
+
+
+    def close(self):
+        """Ask the thread to disconnect"""
+        self.closing.set()
+        self.actions.put(None)
+
+
+    def run(self):
+        try:
+            skt = socket.create_connection(self.address)
+        except:
+            self.events.put('disconnected')
+            return
+
+        try:
+            # Send name (first, a dedicated server waits for both players'
+            # names before answering), then receive the opponent's one
+            skt.sendall(HELLO_FRAME.pack(
+                HELLO_LEN, PROTOCOL_VERSION, MSG_HELLO,
+                self.name.encode()[:16].ljust(16), SIDE_CONTROLLER, 0, 0, 0, 0
+            ))
+            recv_frame(skt)
+            self.events.put('connected')
+
+            seq, sent, last_send = 0, None, 0
+            last_ack = time.monotonic()
+            while not self.closing.is_set():
+                # Sleep until an action comes (or it's time to check the
+                # ACKs), taking every action queued meanwhile
+                pending = []
+                try:
+                    pending.append(self.actions.get(timeout=NET_POLL))
+                    while True: pending.append(self.actions.get_nowait())
+                except queue.Empty:
+                    pass
+                if self.closing.is_set(): break
+
+                # Send the new actions, no faster than the send rate
+                for action in coalesce(pending, sent):
+                    wait = last_send+self.interval-time.monotonic()
+                    if wait > 0: time.sleep(wait)
+                    seq = (seq+1) & 0xFFFFFFFF
+                    skt.sendall(INPUT_FRAME.pack(
+                        INPUT_LEN, PROTOCOL_VERSION, MSG_INPUT, seq,
+                        ACTION_BITS[action]
+                    ))
+                    sent, last_send = action, time.monotonic()
+
+                # Take in the host's ACKs
+                while select.select([skt], [], [], 0)[0]:
+                    msg_type, _ = recv_frame(skt)
+                    if msg_type == MSG_ACK: last_ack = time.monotonic()
+                if time.monotonic()-last_ack > ACK_TIMEOUT:
+                    raise ConnectionError('host timed out')
+        except:
+            pass
+        finally:
+            skt.close()
+        self.events.put('disconnected')
+
+
 class Root(Tk):
-    def __init__(self):
+    def __init__(self, send_rate=SEND_RATE):
         super().__init__()
 
-        # Game flow variables
-        self.action = None
-        self.can_go = False
-        self.skt    = None
+        # Connection, running on its own thread, and what it reports
+        self.send_rate  = send_rate
+        self.connection = None
+        self.events     = queue.Queue()
 
         # Create widgets
         self.lblIP = Label(self, text='IP:')
@@ -44,86 +175,66 @@ class Root(Tk):
         self.lbl_ = Label(self, text='')
         self.lbl_.pack()
 
-        self.btnUp = Button(
-            self, text='UP', width=30, height=10, command=self.up_tapped
-        )
+        # The paddle moves for as long as a button is held
+        self.btnUp = Button(self, text='UP', width=30, height=10)
+        self.btnUp.bind('<ButtonPress-1>', lambda _: self.press('up'))
+        self.btnUp.bind('<ButtonRelease-1>', lambda _: self.press(None))
         self.btnUp.pack()
 
-        self.btnDown = Button(
-            self, text='DOWN', width=30, height=10, command=self.down_tapped
-        )
+        self.btnDown = Button(self, text='DOWN', width=30, height=10)
+        self.btnDown.bind('<ButtonPress-1>', lambda _: self.press('down'))
+        self.btnDown.bind('<ButtonRelease-1>', lambda _: self.press(None))
         self.btnDown.pack()
 
+        self.after(UI_POLL, self.poll_events)
 
-    def connect_tapped(self):
-        if not self.can_go:
-            self.can_go = True
-            thread.start_new_thread(self.game_loop, ())
-        else:
-            self.error_disconnect()
-            thread.start_new_thread(self.game_loop, ())
 
+    def connect_tapped(self):
+        if self.connection is not None:
+            self.connection.close()
+            return
 
-    def up_tapped(self):
-        self.action = 'up'
+        try:
+            address = (self.txtIP.get(), int(self.txtPort.get()))
+        except ValueError:
+            self.show_disconnected()
+            return
+        self.connection = Connection(
+            address, self.txtName.get(), self.send_rate, self.events
+        )
+        self.connection.start()
+        self.btnConn.configure(text='Disconnect')
 
 
-    def down_tapped(self):
-        self.action = 'down'
+    def press(self, action):
+        if self.connection is not None: self.connection.actions.put(action)
 
 
-    def error_disconnect(self):
+    def show_disconnected(self):
         self.lblMsg.configure(text='Disconnected')
         self.btnConn.configure(text='Connect')
-        self.action = None
-        self.can_go = False
-
 
-    def game_loop(self):
-        self.skt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.skt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-        self.accepted = False
-        self.btnConn.configure(text='Connect')
-
-        # Establish connection with the server
+    def poll_events(self):
+        """Update the widgets with what the connection reported (only Tk's
+        own thread may touch them)"""
         try:
-            self.skt.connect((self.txtIP.get(), int(self.txtPort.get())))
-        except:
-            self.error_disconnect()
-
-        while self.can_go:
-            if not self.accepted:
-                # Receive host name
-                try:
-                    self.skt.recv(16).strip().decode()
-                    self.btnConn.configure(text='Disconnect')
-                except:
-                    self.error_disconnect()
-                    break
-
-                # Send name
-                try:
-                    self.skt.send(self.txtName.get().encode().ljust(16))
-                    self.accepted = True
+            while True:
+                event = self.events.get_nowait()
+                if event == 'connected':
                     self.lblMsg.configure(text='Connected')
-                except:
-                    self.error_disconnect()
-                    break
-
-            # Send action and receive the game status
-            try:
-                self.skt.send((str(self.action)).encode().ljust(16))
-                self.action = None
-                self.skt.recv(256)
-            except:
-                self.error_disconnect()
-                break
+                elif event == 'disconnected':
+                    self.connection = None
+                    self.show_disconnected()
+        except queue.Empty:
+            pass
+        self.after(UI_POLL, self.poll_events)
 
 
 if __name__ == '__main__':
     # Setup screen
-    root = Root()
+    send_rate = float(sys.argv[1]) if len(sys.argv) > 1 else SEND_RATE
+    root = Root(send_rate)
     root.title("SpongControl")
     root.resizable(False, False)
     root.geometry("420x600")
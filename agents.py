@@ -0,0 +1,181 @@
+"""AI controllers running off the game loop.
+
+An AIWorker runs an AI function (see AI.py for its signature) in its own
+thread. On every input sample the game hands it the latest game status and
+waits for its decision, but never longer than the deadline: if the AI is
+late, the game carries on with the AI's last decision and counts a miss. A
+slow AI then plays worse instead of slowing the game down.
+
+AI controllers are also registered by name in CONTROLLERS, so that they can
+be picked as 'name' or 'name:param' (e.g. 'ai:20', AI.py's bot with an
+atrociousness of 20) with spong.py's --ai and by tournament.py. A controller
+is any callable with the AI function's signature, made by a factory taking
+the controller's parameter and a random seed. The registry only names the
+module holding the factory, which is imported when the controller is first
+picked, so that unused AIs cost nothing at startup.
+
+Each controller also declares what a decision costs and the share of the
+game loop's time it may take. The game asks a controller too slow for its
+budget only every few input samples, and keeps its last decision between.
+"""
+
+import math
+import time
+import threading
+import importlib
+from collections import namedtuple
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Seconds the game waits for a decision (a 120 Hz input sample lasts 8 ms)
+DEADLINE = 0.002
+
+
+class AIWorker:
+    """An AI function running in a thread, queried with a deadline"""
+
+    def __init__(
+        self,
+        ai       : callable,
+        deadline : float = DEADLINE,
+        every    : int = 1
+    ):
+        """Start the thread that will run ai, asking it for a decision on
+        one call to act out of every"""
+        self.ai       = ai
+        self.deadline = deadline
+        self.every    = every
+        self.calls    = 0
+        self.cond     = threading.Condition()
+        self.running  = True
+
+        # Latest request (sequence number, arguments) not yet taken by the
+        # thread, and the latest decision it made
+        self.request  = None
+        self.seq      = 0
+        self.done_seq = 0
+        self.action   = None
+
+        # Statistics
+        self.decisions = 0
+        self.missed    = 0
+        self.busy      = 0.0
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+
+    def _run(self):
+        """Take the latest request, decide, repeat"""
+        while True:
+            with self.cond:
+                while self.request is None and self.running: self.cond.wait()
+                if not self.running: return
+                (seq, args), self.request = self.request, None
+
+            start = time.perf_counter()
+            try:
+                action = self.ai(*args)
+            except Exception:
+                action = None
+            elapsed = time.perf_counter()-start
+
+            with self.cond:
+                self.done_seq, self.action = seq, action
+                self.decisions += 1
+                self.busy      += elapsed
+                self.cond.notify_all()
+
+
+    def act(self, *args) -> str or None:
+        """Hand the AI the latest game status (the AI function's arguments)
+        and wait for its decision, until the deadline
+
+        Returns
+        -------
+
+        action : str or None
+            the AI's decision, or its last one if it missed the deadline or
+            wasn't asked this time
+        """
+        self.calls += 1
+        with self.cond:
+            if (self.calls-1) % self.every: return self.action
+
+            # A request the thread didn't take yet is stale, replace it
+            self.seq += 1
+            seq, self.request = self.seq, (self.seq, args)
+            self.cond.notify_all()
+
+            end = time.monotonic()+self.deadline
+            while self.done_seq < seq:
+                left = end-time.monotonic()
+                if left <= 0:
+                    self.missed += 1
+                    break
+                self.cond.wait(left)
+
+            return self.action
+
+
+    def rate(self) -> float:
+        """Decisions per second of computing time"""
+        return self.decisions/self.busy if self.busy else 0.0
+
+
+    def close(self):
+        """Stop the thread (after its current decision, if any)"""
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+
+# A registered AI controller: the module and the name of its factory, which
+# takes the controller's parameter (a string, or None for its default) and a
+# random seed, the seconds a decision takes (on a desktop, see
+# benchmarks/bench_ai.py) and the share of the game loop's time it may take
+Controller = namedtuple(
+    'Controller', ('module', 'factory', 'cost', 'budget')
+)
+
+# AI controllers by name
+CONTROLLERS = {
+    'ai' : Controller('AI', 'create', 0.000002, 0.05)
+}
+
+
+def _controller(spec : str) -> (Controller, str or None):
+    """Registered controller and parameter of 'name' or 'name:param',
+    raising ValueError if there's no such controller"""
+    name, _, param = spec.partition(':')
+    if name not in CONTROLLERS:
+        raise ValueError('unknown AI controller: {}'.format(name))
+    return CONTROLLERS[name], param or None
+
+
+def validate(spec : str):
+    """Check that 'name' or 'name:param' names a registered controller,
+    raising ValueError if not, without importing its module (a bad param or
+    a missing module only shows when the controller is created)"""
+    _controller(spec)
+
+
+def create(spec : str, seed : int = None) -> callable:
+    """Create the AI controller given as 'name' or 'name:param' (importing
+    its module, the first time), raising ValueError if there's no such
+    controller or the param is invalid, and ImportError if its module is
+    missing"""
+    controller, param = _controller(spec)
+    module = importlib.import_module(controller.module)
+    return getattr(module, controller.factory)(param, seed)
+
+
+def interval(spec : str, rate : float) -> int:
+    """Decisions asked for at most on one call out of how many, for the
+    controller given as 'name' or 'name:param' to stay within its budget
+    when called rate times per second"""
+    controller, _ = _controller(spec)
+    return max(math.ceil(controller.cost*rate/controller.budget), 1)
@@ -0,0 +1,209 @@
+"""NumPy-vectorized simulator stepping many independent matches at once.
+
+Meant for AI evaluation and training, with a Gym-style API:
+
+    env = BatchEnv(4096, seed=1)
+    obs = env.reset()
+    obs, rewards, dones = env.step(actions)
+
+The state of all matches is kept as struct-of-arrays (one row per field of
+engine.State, one column per match), and the rules are the ones of
+engine.step written as array operations. Every match has its own copy of
+engine's random generator, so match i is exactly the match that
+engine.new_state(seed+i) would give with the same actions. Like in engine,
+the ball's coordinates are fixed-point (in 1/engine.ONE of a cell).
+
+Requires NumPy (`pip install numpy`).
+"""
+
+import numpy as np
+
+import engine
+from engine import SHIFT, ONE, HALF, RAMP
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Actions, same values as the action bits in protocol.py
+NOOP, UP, DOWN = 0, 1, 2
+
+# Rows of the state array, in engine.State's order
+TICK, P1_Y, P2_Y, P1_SCORE, P2_SCORE, X, Y, VX, VY, RNG = range(10)
+
+# Rows handed out as observations (p1_y, p2_y, scores, ball x, y, vx, vy)
+OBS = slice(P1_Y, VY+1)
+
+
+class BatchEnv:
+    """N matches simulated in lockstep"""
+
+    def __init__(self, n : int, seed : int = 0, rules : engine.Rules = None):
+        """Allocate the state of n matches (reset() must be called before
+        the first step)"""
+        self.n     = n
+        self.seed  = seed
+        self.rules = rules or engine.RULES
+
+        # Whole state, with a view on each of its rows
+        self.state = np.zeros((len(engine.State._fields), n), dtype=np.int64)
+        (self.tick, self.p1_y, self.p2_y, self.p1_score, self.p2_score,
+         self.x, self.y, self.vx, self.vy, self.rng) = self.state
+
+        # Observations are a (n, 8) view on the state, never a copy
+        self.obs = self.state[OBS].T
+
+        # Preallocated outputs and scratch space
+        self.rewards = np.zeros(n, dtype=np.int8)
+        self.dones   = np.zeros(n, dtype=bool)
+        self._mask   = np.zeros(n, dtype=bool)
+
+
+    def reset(self, seed : int = None) -> np.ndarray:
+        """Start every match over, match i being seeded with seed+i
+
+        Returns
+        -------
+
+        obs : np.ndarray
+            (n, 8) view with p1_y, p2_y, p1_score, p2_score and ball's x, y,
+            vx and vy (fixed-point) of each match
+        """
+        if seed is not None: self.seed = seed
+        rules = self.rules
+
+        self.state[:] = 0
+        self.p1_y[:] = self.p2_y[:] = rules.bound_y//2 + rules.y//2
+        self.x[:] = rules.bound_x//2 << SHIFT
+        self.y[:] = rules.bound_y//2 << SHIFT
+        self.rng[:] = (self.seed + np.arange(self.n)) & engine.RNG_MASK
+        self._serve(slice(None))
+        return self.obs
+
+
+    def _serve(self, which : slice or np.ndarray):
+        """Advance the random generator of the selected matches and send
+        their balls in a random direction (see engine.serve)"""
+        rng = (self.rng[which]*1103515245 + 12345) & engine.RNG_MASK
+        self.rng[which] = rng
+        self.vx[which]  = np.where(rng >> 30, 1, -1)*self.rules.speed
+        self.vy[which]  = ((rng >> 16) % 3 - 1)*self.rules.speed
+
+
+    def _cross(self, i : np.ndarray, face : np.ndarray, dist : np.ndarray,
+               paddle_y : np.ndarray):
+        """Move the balls of the selected matches, which reach the column in
+        front of a paddle this tick (see engine.step): up to that column,
+        then back if the paddle is there, or on otherwise"""
+        _, top, _, bound_y, serve, max_speed, _ = self.rules
+        low, high = (top+1) << SHIFT, (bound_y-1) << SHIFT
+        vx, vy = self.vx[i], self.vy[i]
+        run = np.abs(vx)
+
+        y = self.y[i] + vy*dist//run
+        vy = np.where((y > high) | (y < low), -vy, vy)
+        y = np.where(y > high, 2*high-y, np.where(y < low, 2*low-y, y))
+        run -= dist
+
+        d = y - (paddle_y << SHIFT)
+        hit = (np.abs(d) < 2*ONE) | (
+            (np.abs(d) <= 2*ONE+HALF) & (d*vy < 0)
+        )
+        speed = np.minimum(np.abs(vx) + np.abs(vx)//RAMP, max_speed)
+        vx = np.where(hit, np.where(vx < 0, speed, -speed), vx)
+        vy = np.where(hit, np.where(
+            d > HALF, serve, np.where(d < -HALF, -serve, 0)
+        ), vy)
+
+        self.x[i]  = face + np.where(vx > 0, run, -run)
+        self.y[i]  = y + vy*run//np.abs(vx)
+        self.vx[i] = vx
+        self.vy[i] = vy
+
+
+    def step(self, actions : np.ndarray) -> (np.ndarray, np.ndarray,
+                                              np.ndarray):
+        """Advance every match by one tick
+
+        Parameters
+        ----------
+
+        actions : np.ndarray
+            (n, 2) array of NOOP, UP or DOWN, for player 1 and player 2
+
+        Returns
+        -------
+
+        tuple(obs : np.ndarray, rewards : np.ndarray, dones : np.ndarray)
+            obs as in reset(), rewards (from player 1's point of view) is +1
+            or -1 in the matches where a point was scored, and dones tells
+            which matches had a point scored (their ball is back at the
+            center). All three are preallocated and overwritten by the next
+            step
+        """
+        left, top, bound_x, bound_y, _, _, _ = self.rules
+        x, y, vx, vy = self.x, self.y, self.vx, self.vy
+        rewards, dones, mask = self.rewards, self.dones, self._mask
+        goal_left, goal_right = (left+1) << SHIFT, (bound_x-1) << SHIFT
+        low, high = (top+1) << SHIFT, (bound_y-1) << SHIFT
+
+        rewards[:] = 0
+        dones[:]   = False
+
+        # Check for goals (those balls are served once the others moved)
+        np.greater_equal(x, goal_right, out=mask)
+        self.p1_score += mask
+        rewards += mask
+        np.logical_or(dones, mask, out=dones)
+        np.less_equal(x, goal_left, out=mask)
+        self.p2_score += mask
+        rewards -= mask
+        np.logical_or(dones, mask, out=dones)
+
+        # Balls reaching the column in front of a paddle go on apart, the
+        # others just move
+        going_left = vx < 0
+        face = np.where(going_left, (left+3) << SHIFT, (bound_x-3) << SHIFT)
+        dist = np.where(going_left, x-face, face-x)
+        np.greater_equal(dist, 0, out=mask)
+        np.logical_and(mask, dist < np.abs(vx), out=mask)
+        np.logical_and(mask, ~dones, out=mask)
+        i = np.flatnonzero(mask)
+        np.logical_not(mask, out=mask)
+        np.add(x, vx, out=x, where=mask)
+        np.add(y, vy, out=y, where=mask)
+        if i.size:
+            self._cross(
+                i, face[i], dist[i],
+                np.where(going_left[i], self.p1_y[i], self.p2_y[i])
+            )
+
+        # Bounce off the top and bottom walls, and stop at the goal lines
+        np.greater(y, high, out=mask)
+        np.negative(vy, out=vy, where=mask)
+        np.subtract(2*high, y, out=y, where=mask)
+        np.less(y, low, out=mask)
+        np.negative(vy, out=vy, where=mask)
+        np.subtract(2*low, y, out=y, where=mask)
+        np.clip(x, goal_left, goal_right, out=x)
+
+        # Balls that went in go back to the center
+        if dones.any():
+            x[dones] = (bound_x//2 + left//2) << SHIFT
+            y[dones] = (bound_y//2 + top//2) << SHIFT
+            self._serve(dones)
+
+        # Move the paddles, kept inside the arena
+        for paddle_y, action in ((self.p1_y, actions[:, 0]),
+                                 (self.p2_y, actions[:, 1])):
+            paddle_y -= (action == UP)   & (paddle_y > top+3)
+            paddle_y += (action == DOWN) & (paddle_y < bound_y-3)
+
+        self.tick += 1
+        return self.obs, rewards, dones
+
+
+    def match(self, i : int) -> engine.State:
+        """State of match i, as an engine.State"""
+        return engine.State(*(int(v) for v in self.state[:, i]))
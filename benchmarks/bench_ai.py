@@ -0,0 +1,102 @@
+"""Decisions per second of the AI, and how long the game loop waits for it,
+called directly or through an agents.AIWorker with a deadline. A slowed down
+AI shows the game loop keeping its pace while the AI misses deadlines.
+
+Usage: python3 benchmarks/bench_ai.py [samples] [deadline_ms]
+"""
+
+import os
+import sys
+import time
+from copy import copy
+from random import Random
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import agents
+import engine
+from AI import AI
+from spong import Arena, Player, Ball, sync, SCR_H, SCR_W
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Seconds the slowed down AI takes per decision
+SLOW = 0.01
+
+
+def slow_AI(*args) -> str or None:
+    """The same AI, thinking a lot harder"""
+    time.sleep(SLOW)
+    return AI(*args)
+
+
+def statuses(count : int) -> iter:
+    """(player, game status) of a match with random inputs, one per sample"""
+    rnd = Random(0)
+    arena = Arena(0, 1, SCR_W, SCR_H)
+    player1, player2 = Player('left', arena), Player('right', arena)
+    ball = Ball(0, 0, 0, 0)
+    state = engine.new_state(0)
+    for _ in range(count):
+        state = engine.step(
+            state, rnd.choice((None, 'up', 'down')),
+            rnd.choice((None, 'up', 'down'))
+        )
+        sync(state, player1, player2, ball)
+        yield arena, copy(player1), {
+            'p1' : state.p1_y, 'p2' : state.p2_y, 'ball' : engine.ball(state)
+        }
+
+
+def run(ai : callable, samples : int, deadline : float or None) -> dict:
+    """Query the AI on every sample, directly if deadline is None
+
+    Returns
+    -------
+
+    results : dict
+        decisions per second of computing time, deadlines missed and the
+        longest the caller waited for a decision (in ms)
+    """
+    worker = None if deadline is None else agents.AIWorker(ai, deadline)
+    longest = busy = 0.0
+
+    for arena, player, status in statuses(samples):
+        start = time.perf_counter()
+        if worker is None: ai(None, arena, player, None, True, status)
+        else             : worker.act(None, arena, player, None, True, status)
+        elapsed = time.perf_counter()-start
+        longest = max(longest, elapsed)
+        busy   += elapsed
+
+    if worker is None:
+        return {'rate' : samples/busy, 'missed' : 0, 'longest' : longest*1000}
+
+    worker.close()
+    return {
+        'rate'    : worker.rate(),
+        'missed'  : worker.missed,
+        'longest' : longest*1000
+    }
+
+
+if __name__ == '__main__':
+    samples  = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    deadline = int(sys.argv[2])/1000 if len(sys.argv) > 2 else agents.DEADLINE
+
+    print('%-14s %16s %8s %12s' % ('ai', 'decisions/s', 'missed', 'wait (ms)'))
+    for name, ai, count, limit in (
+        ('direct',      AI,      samples,     None),
+        ('worker',      AI,      samples,     deadline),
+        ('slow direct', slow_AI, samples//100, None),
+        ('slow worker', slow_AI, samples//100, deadline),
+    ):
+        r = run(ai, count, limit)
+        print('%-14s %16.0f %8d %12.2f' % (
+            name, r['rate'], r['missed'], r['longest']
+        ))
@@ -0,0 +1,198 @@
+"""Run every benchmark and save the results as JSON, to compare them between
+commits.
+
+    python3 benchmarks/bench_all.py --out before.json
+    (change something)
+    python3 benchmarks/bench_all.py --out after.json --base before.json
+
+With --base, every measure is printed next to its baseline, and the ones at
+least THRESHOLD worse are flagged as regressions (the exit status is then 1).
+--quick runs every benchmark ten times shorter, to check they all work (its
+numbers are too noisy to compare).
+
+Usage: python3 benchmarks/bench_all.py [--out file] [--base file] [--quick]
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import agents
+from AI import AI
+
+import bench_ai
+import bench_engine
+import bench_loopback
+import bench_protocol
+import bench_render
+
+try:
+    import bench_batch
+    import bench_chaos
+except ImportError:
+    bench_batch = bench_chaos = None # numpy isn't installed
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Relative change of a measure counted as a regression
+THRESHOLD = 0.10
+
+# Measures where more is better (for all the others, less is better), and
+# measures never flagged (not about speed, or single worst samples, too noisy
+# to compare)
+HIGHER_IS_BETTER = ('_per_s', 'rate')
+NOT_COMPARED     = ('snapshot_share', 'longest', 'latency_max')
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 benchmarks/bench_all.py [--out file] ' \
+              '[--base file] [--quick]'
+MSG_HEADER  = '{:<40} {:>14} {:>14} {:>8}'
+MSG_ROW     = '{:<40} {:>14.3f} {:>14.3f} {:>+7.1f}%{}'
+MSG_RESULT  = '{:<40} {:>14.3f}'
+MSG_REGRESS = '{} regression(s) of {:.0f}% or more'
+
+
+def commit() -> str or None:
+    """Hash of the commit checked out, if this is a git repository"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale : float = 1) -> dict:
+    """Run every benchmark, with their default sizes times scale
+
+    Returns
+    -------
+
+    results : dict
+        where and when it ran, and every benchmark's results
+    """
+    def size(n): return max(int(n*scale), 1)
+
+    results = {
+        'meta' : {
+            'commit'   : commit(),
+            'python'   : platform.python_version(),
+            'platform' : platform.platform(),
+            'time'     : round(time.time()),
+            'scale'    : scale
+        },
+        'engine'   : bench_engine.run(size(500000)),
+        'render'   : bench_render.run(size(3000)),
+        'draw'     : bench_render.run_draws(size(3000)),
+        'protocol' : bench_protocol.run(size(200000)),
+        'loopback' : bench_loopback.run(size(20000)),
+        'ai'       : {
+            'direct' : bench_ai.run(AI, size(20000), None),
+            'worker' : bench_ai.run(AI, size(20000), agents.DEADLINE)
+        }
+    }
+    if bench_batch is not None:
+        results['batch'] = {
+            'engine' : {
+                'ticks_per_s' : bench_batch.run_engine(100, size(300))
+            },
+            'batch'  : {
+                'ticks_per_s' : bench_batch.run_batch(10000, size(300))
+            }
+        }
+        results['chaos'] = bench_chaos.run(200, size(1000))
+    return results
+
+
+def measures(results : dict, prefix : str = '') -> iter:
+    """(dotted name, value) of every measure in results, metadata aside"""
+    for name, value in sorted(results.items()):
+        if name == 'meta': continue
+        if isinstance(value, dict):
+            yield from measures(value, prefix + name + '.')
+        else:
+            yield prefix + name, value
+
+
+def compare(base : dict, results : dict) -> int:
+    """Print every measure next to its baseline
+
+    Returns
+    -------
+
+    regressions : int
+        measures THRESHOLD worse than their baseline
+    """
+    baseline = dict(measures(base))
+    regressions = 0
+
+    print(MSG_HEADER.format('measure', 'base', 'now', 'change'))
+    for name, value in measures(results):
+        old = baseline.get(name)
+        if not old:
+            print(MSG_RESULT.format(name, value))
+            continue
+
+        change = (value-old)/old
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        if worse >= THRESHOLD and not name.endswith(NOT_COMPARED):
+            flag, regressions = '  <- regression', regressions+1
+        print(MSG_ROW.format(name, old, value, change*100, flag))
+
+    return regressions
+
+
+def get_args() -> dict:
+    """Parse `[--out file] [--base file] [--quick]`, exiting on bad
+    arguments"""
+    args = sys.argv[1:]
+    options = {'out' : None, 'base' : None, 'quick' : False}
+    while args:
+        name = args.pop(0)
+        if name == '--quick':
+            options['quick'] = True
+        elif name in ('--out', '--base') and args:
+            options[name[2:]] = args.pop(0)
+        else:
+            sys.exit(MSG_USAGE)
+    return options
+
+
+def main():
+    options = get_args()
+
+    base = None
+    if options['base'] is not None:
+        with open(options['base']) as file: base = json.load(file)
+
+    results = run(0.1 if options['quick'] else 1)
+    if options['out'] is not None:
+        with open(options['out'], 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    if base is None:
+        for name, value in measures(results):
+            print(MSG_RESULT.format(name, value))
+        return
+
+    regressions = compare(base, results)
+    if regressions:
+        print(MSG_REGRESS.format(regressions, THRESHOLD*100))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
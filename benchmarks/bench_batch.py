@@ -0,0 +1,56 @@
+"""Compare match-ticks per second of engine.step against batch.BatchEnv.
+
+Usage: python3 benchmarks/bench_batch.py [matches] [ticks]
+"""
+
+import os
+import sys
+import time
+from random import Random
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import numpy as np
+
+import batch
+import engine
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+def run_engine(matches : int, ticks : int) -> float:
+    """Match-ticks per second stepping one engine.State at a time"""
+    rnd = Random(0)
+    actions = [rnd.choice((None, 'up', 'down')) for _ in range(ticks)]
+    states = [engine.new_state(i) for i in range(matches)]
+    step = engine.step
+
+    start = time.perf_counter()
+    for i, state in enumerate(states):
+        for action in actions: state = step(state, action, action)
+        states[i] = state
+    return matches*ticks/(time.perf_counter()-start)
+
+
+def run_batch(matches : int, ticks : int) -> float:
+    """Match-ticks per second stepping every match at once"""
+    env = batch.BatchEnv(matches)
+    env.reset()
+    actions = np.random.default_rng(0).integers(0, 3, (matches, 2))
+
+    start = time.perf_counter()
+    for _ in range(ticks): env.step(actions)
+    return matches*ticks/(time.perf_counter()-start)
+
+
+if __name__ == '__main__':
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ticks   = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+
+    print('engine : %14.0f match-ticks/s' % run_engine(matches//100, ticks))
+    print('batch  : %14.0f match-ticks/s' % run_batch(matches, ticks))
@@ -0,0 +1,102 @@
+"""Frames per second of chaos mode (see chaos.py), a tick and a frame each,
+with the balls in NumPy columns stepped and drawn in one pass, against the
+same balls as objects: an engine.State stepped and a Ball drawn per ball.
+Frames are composed and diffed by a renderer, as in the game, but written
+nowhere.
+
+Usage: python3 benchmarks/bench_chaos.py [balls] [frames]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import chaos
+import engine
+import render
+from profiling import NullWindow
+from spong import Arena, Player, Ball, SCR_H, SCR_W
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+def _setup() -> (Arena, Player, Player, render.Renderer, engine.Rules):
+    """Arena, paddles, renderer and rules, as in chaos.play"""
+    arena = Arena(0, 1, SCR_W, SCR_H)
+    renderer = render.Renderer(NullWindow(), SCR_H+2, SCR_W+2, NullWindow())
+    arena.draw(renderer.static)
+    rules = engine.make_rules(engine.BASE_TICK_RATE, arena.x, arena.y)
+    return arena, Player('left', arena), Player('right', arena), renderer, \
+           rules
+
+
+def run_arrays(balls : int, frames : int) -> float:
+    """Frames per second with the balls in NumPy columns"""
+    arena, player1, player2, renderer, rules = _setup()
+    game = chaos.Chaos(balls, 0, rules)
+
+    start = time.perf_counter()
+    for tick in range(frames):
+        game.step('up' if tick % 40 < 20 else 'down', None)
+        frame = renderer.begin()
+        player1.y, player2.y = game.p1_y, game.p2_y
+        player1.draw(frame, arena)
+        player2.draw(frame, arena)
+        ys, xs = game.cells()
+        frame.plot(ys, xs, 'O')
+        renderer.flush()
+    return frames/(time.perf_counter()-start)
+
+
+def run_objects(balls : int, frames : int) -> float:
+    """Frames per second with a State and a Ball per ball"""
+    arena, player1, player2, renderer, rules = _setup()
+    states = [engine.new_state(i, rules) for i in range(balls)]
+    objs = [Ball(0, 0, 0, 0) for _ in range(balls)]
+    step, ball = engine.step, engine.ball
+
+    start = time.perf_counter()
+    for tick in range(frames):
+        action = 'up' if tick % 40 < 20 else 'down'
+        states = [step(state, action, None, rules) for state in states]
+        frame = renderer.begin()
+        player1.y, player2.y = states[0].p1_y, states[0].p2_y
+        player1.draw(frame, arena)
+        player2.draw(frame, arena)
+        for state, obj in zip(states, objs):
+            obj.download(ball(state))
+            obj.draw(frame)
+        renderer.flush()
+    return frames/(time.perf_counter()-start)
+
+
+def run(balls : int, frames : int) -> dict:
+    """Frames per second both ways
+
+    Returns
+    -------
+
+    results : dict
+        frames per second with arrays and with objects
+    """
+    return {
+        'arrays'  : {'frames_per_s' : run_arrays(balls, frames)},
+        'objects' : {'frames_per_s' : run_objects(balls, frames)}
+    }
+
+
+if __name__ == '__main__':
+    balls  = int(sys.argv[1]) if len(sys.argv) > 1 else chaos.CHAOS_BALLS
+    frames = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    results = run(balls, frames)
+
+    print('%-8s %12s' % ('storage', 'frames/s'))
+    for name, r in results.items():
+        print('%-8s %12.0f' % (name, r['frames_per_s']))
@@ -0,0 +1,77 @@
+"""Ticks per second of the simulation (engine.step), over a match with
+random inputs, over a long rally with no input at all, and with rollback
+netcode at its worst (every tick's prediction wrong, so every tick simulates
+the last rollback.WINDOW ticks again).
+
+Usage: python3 benchmarks/bench_engine.py [ticks]
+"""
+
+import os
+import sys
+import time
+from random import Random
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import engine
+import rollback
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+def run(ticks : int) -> dict:
+    """Step a match for the given number of ticks, both ways
+
+    Returns
+    -------
+
+    results : dict
+        ticks per second with random actions, with no action and with a
+        rollback on every tick
+    """
+    rnd = Random(0)
+    actions = [
+        (rnd.choice((None, 'up', 'down')), rnd.choice((None, 'up', 'down')))
+        for _ in range(ticks)
+    ]
+    step, results = engine.step, {}
+
+    state = engine.new_state(0)
+    start = time.perf_counter()
+    for p1_action, p2_action in actions:
+        state = step(state, p1_action, p2_action)
+    results['random'] = {'ticks_per_s' : ticks/(time.perf_counter()-start)}
+
+    state = engine.new_state(0)
+    start = time.perf_counter()
+    for _ in range(ticks): state = step(state, None, None)
+    results['idle'] = {'ticks_per_s' : ticks/(time.perf_counter()-start)}
+
+    # The peer's inputs arrive WINDOW ticks late, alternating between up and
+    # down, so each one undoes the prediction made from the one before
+    window = rollback.WINDOW
+    session = rollback.Rollback(engine.new_state(0), True)
+    for p1_action, _ in actions[:window]: session.advance(p1_action)
+    start = time.perf_counter()
+    for tick, (p1_action, _) in enumerate(actions[window:]):
+        session.advance(p1_action)
+        session.receive(tick, 'up' if tick % 2 else 'down')
+        session.reconcile()
+    elapsed = time.perf_counter()-start
+    results['rollback'] = {'ticks_per_s' : (ticks-window)/elapsed}
+
+    return results
+
+
+if __name__ == '__main__':
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    results = run(ticks)
+
+    print('%-8s %14s' % ('inputs', 'ticks/s'))
+    for name, r in results.items():
+        print('%-8s %14.0f' % (name, r['ticks_per_s']))
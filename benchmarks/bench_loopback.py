@@ -0,0 +1,158 @@
+"""A whole TCP match between a host and a joiner over loopback, each in its
+own process, exchanging the same frames as spong.py does but as fast as the
+sockets go (no clock, random inputs on both sides).
+
+Measures the ticks per second of the pair, the joiner's latency (from
+sending its input to getting the host's answer) and the bytes the host
+sends per tick.
+
+Usage: python3 benchmarks/bench_loopback.py [ticks]
+"""
+
+import os
+import sys
+import time
+import socket
+import selectors
+import multiprocessing
+from random import Random
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import engine
+import protocol
+import transport
+from stats import Stats
+from spong import KEYFRAME_INTERVAL
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+SEED      = 42
+TICK_RATE = engine.BASE_TICK_RATE
+
+
+def _actions(seed : int):
+    """Random actions, forever"""
+    rnd = Random(seed)
+    while True: yield rnd.choice((None, 'up', 'down'))
+
+
+def receive(
+    link     : transport.TcpLink,
+    selector : selectors.BaseSelector
+) -> (int, tuple):
+    """Wait for the link's next frame (spong.main draws in the meantime)"""
+    while True:
+        msg = link.next()
+        if msg is not None: return msg
+        selector.select()
+
+
+def host(listener : socket.socket, ticks : int):
+    """Host's end, as in spong.main: get the joiner's action, step, then
+    send a snapshot on events and the host's action otherwise"""
+    conn, _ = listener.accept()
+    conn.sendall(protocol.encode_hello(
+        'host', protocol.SIDE_RIGHT, TICK_RATE, SEED
+    ))
+    protocol.FrameReader(conn).expect(protocol.MSG_HELLO)
+    link, selector = transport.TcpLink(conn), selectors.DefaultSelector()
+    selector.register(conn, selectors.EVENT_READ)
+
+    state, actions = engine.new_state(SEED), _actions(1)
+    keyframe_every = TICK_RATE*KEYFRAME_INTERVAL
+    for _ in range(ticks):
+        _, fields = receive(link, selector)
+        action = next(actions)
+
+        previous = state
+        state = engine.step(
+            state, action, protocol.unpack_action(fields[1])
+        )
+        if (state.ball_vx != previous.ball_vx
+            or state.p1_score != previous.p1_score
+            or state.p2_score != previous.p2_score
+            or state.tick % keyframe_every == 0):
+            link.send(protocol.encode_snapshot(0, state))
+        else:
+            link.send(protocol.encode_input(state.tick, action))
+    conn.close()
+
+
+def run(ticks : int) -> dict:
+    """Play a match of the given number of ticks
+
+    Returns
+    -------
+
+    results : dict
+        ticks per second, joiner's latency percentiles (in ms), bytes sent
+        by the host per tick and the share of ticks sent as snapshots
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    process = multiprocessing.Process(target=host, args=(listener, ticks))
+    process.start()
+
+    skt = socket.create_connection(listener.getsockname())
+    skt.sendall(protocol.encode_hello('join', protocol.SIDE_LEFT))
+    _, _, _, seed, _, _ = protocol.FrameReader(skt).expect(
+        protocol.MSG_HELLO
+    )
+    link, stats = transport.TcpLink(skt), Stats()
+    link.stats, selector = stats, selectors.DefaultSelector()
+    selector.register(skt, selectors.EVENT_READ)
+
+    # Joiner's end, as in spong.main
+    state, actions = engine.new_state(seed), _actions(2)
+    latencies, received, snapshots = [], 0, 0
+    now = time.perf_counter
+    start = now()
+    for _ in range(ticks):
+        action = next(actions)
+        sent = now()
+        ping = stats.ping() or b''
+        link.send(ping + protocol.encode_input(state.tick, action))
+        msg_type, fields = receive(link, selector)
+        latencies.append(now()-sent)
+
+        if msg_type == protocol.MSG_INPUT:
+            state = engine.step(
+                state, protocol.unpack_action(fields[1]), action
+            )
+            received += protocol.HEADER.size + protocol.INPUT.size
+        else:
+            state = engine.State(*fields[1:])
+            received += protocol.HEADER.size + protocol.SNAPSHOT.size
+            snapshots += 1
+    elapsed = now()-start
+
+    process.join()
+    skt.close()
+    listener.close()
+
+    latencies.sort()
+    def percentile(p): return latencies[int(p/100*(len(latencies)-1))]*1000
+    return {
+        'ticks_per_s'    : ticks/elapsed,
+        'latency_p50'    : percentile(50),
+        'latency_p99'    : percentile(99),
+        'latency_max'    : latencies[-1]*1000,
+        'bytes_per_tick' : received/ticks,
+        'snapshot_share' : snapshots/ticks
+    }
+
+
+if __name__ == '__main__':
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    results = run(ticks)
+
+    print('%-16s %12s' % ('measure', 'value'))
+    for name, value in results.items():
+        print('%-16s %12.3f' % (name, value))
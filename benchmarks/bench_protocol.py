@@ -0,0 +1,108 @@
+"""Compare the binary wire protocol against the old per-frame pickle path,
+and time the whole-state snapshots sent over TCP and UDP.
+
+Usage: python3 benchmarks/bench_protocol.py [iterations]
+"""
+
+import os
+import sys
+import pickle
+import timeit
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import engine
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# A typical mid-rally tick
+ACTION = 'down'
+BALL   = (39*engine.ONE, 9*engine.ONE, -engine.ONE, engine.ONE)
+P1_Y, P2_Y, P1_SCORE, P2_SCORE = 10, 8, 3, 5
+
+
+def pickle_encode() -> bytes:
+    """Host frame as sent by spong.py before the binary protocol"""
+    return pickle.dumps((str(ACTION), BALL))
+
+
+def pickle_decode(data : bytes) -> tuple:
+    """Joiner side of the pickle path"""
+    return pickle.loads(data)
+
+
+def binary_encode() -> bytes:
+    """Host frame as sent by the binary protocol"""
+    return protocol.encode_state(
+        1234, ACTION, BALL, P1_Y, P2_Y, P1_SCORE, P2_SCORE
+    )
+
+
+def binary_decode(buf : bytearray) -> tuple:
+    """Joiner side of the binary protocol, the frame being already in the
+    reader's preallocated buffer (as recv_into leaves it)"""
+    protocol.HEADER.unpack_from(buf)
+    return protocol.STATE.unpack_from(buf, protocol.HEADER.size)
+
+
+def snapshot_encode(state : engine.State) -> bytes:
+    """Host frame holding the whole state"""
+    return protocol.encode_snapshot(1234, state)
+
+
+def snapshot_decode(data : bytes) -> engine.State:
+    """Joiner side of a snapshot, as a datagram (see transport.py)"""
+    return engine.State(*protocol.decode(data)[1][1:])
+
+
+def run(iterations : int) -> dict:
+    """Time every codec
+
+    Returns
+    -------
+
+    results : dict
+        ops per second and bytes per tick of every codec
+    """
+    pickled = pickle_encode()
+    buf = bytearray(protocol.MAX_FRAME)
+    frame = binary_encode()
+    buf[:len(frame)] = frame
+    state = engine.new_state(0)
+    snapshot = snapshot_encode(state)
+
+    results = {}
+    codecs = (
+        ('pickle', pickle_encode, lambda: pickle_decode(pickled), pickled),
+        ('binary', binary_encode, lambda: binary_decode(buf),     frame),
+        ('snapshot', lambda: snapshot_encode(state),
+         lambda: snapshot_decode(snapshot), snapshot)
+    )
+    for name, encode, decode, sample in codecs:
+        enc = timeit.timeit(encode, number=iterations)
+        dec = timeit.timeit(decode, number=iterations)
+        results[name] = {
+            'encode_per_s'   : iterations/enc,
+            'decode_per_s'   : iterations/dec,
+            'bytes_per_tick' : len(sample),
+        }
+    return results
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    results = run(iterations)
+
+    print('%-9s %14s %14s %14s' % (
+        'codec', 'encode/s', 'decode/s', 'bytes/tick'
+    ))
+    for name, r in results.items():
+        print('%-9s %14.0f %14.0f %14d' % (
+            name, r['encode_per_s'], r['decode_per_s'], r['bytes_per_tick']
+        ))
@@ -0,0 +1,160 @@
+"""Compare the terminal traffic of full redraws against the dirty-cell
+renderer, over a simulated match drawn on a fake curses window, and time
+each drawing routine on its own.
+
+Usage: python3 benchmarks/bench_render.py [frames]
+"""
+
+import os
+import sys
+import curses
+import timeit
+from random import Random
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+)
+
+import engine
+import render
+from spong import Arena, Player, Ball, sync, draw_score, SCR_H, SCR_W
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Nothing to update without a terminal, and the renderer's pad is a fake
+# window too
+curses.doupdate = lambda: None
+curses.newpad   = lambda height, width: FakeWindow()
+
+
+class FakeWindow:
+    """Stands in for a curses window, counting what would be written"""
+
+    def __init__(self):
+        self.cells = 0
+        self.bytes = 0
+
+
+    def addstr(self, y : int, x : int, text : str):
+        self.cells += len(text)
+        self.bytes += len(text) + render.cursor_move_bytes(y, x)
+
+
+    def getmaxyx(self): return (SCR_H+2, SCR_W+2)
+    def erase(self): pass
+    def noutrefresh(self, *args): pass
+    def refresh(self): pass
+
+
+def frames(count : int) -> iter:
+    """States of a match with random inputs, one per frame"""
+    rnd = Random(0)
+    state = engine.new_state(0)
+    for _ in range(count):
+        state = engine.step(
+            state, rnd.choice((None, 'up', 'down')),
+            rnd.choice((None, 'up', 'down'))
+        )
+        yield state
+
+
+def draw(screen, arena, player1, player2, ball):
+    """Dynamic part of a frame, as drawn by spong.main"""
+    player1.draw(screen, arena)
+    player2.draw(screen, arena)
+    ball.draw(screen)
+
+
+def run(count : int) -> dict:
+    """Draw count frames both ways
+
+    Returns
+    -------
+
+    results : dict
+        cells written and bytes flushed per frame, for both ways
+    """
+    arena = Arena(0, 1, SCR_W, SCR_H)
+    objs  = (Player('left', arena), Player('right', arena), Ball(0, 0, 0, 0))
+
+    # Every frame drawn straight on the window
+    full = FakeWindow()
+    arena.draw(full)
+    for state in frames(count):
+        sync(state, *objs)
+        full.addstr(0, SCR_W//2-6, str(state.p1_score))
+        full.addstr(0, SCR_W//2+6, str(state.p2_score))
+        draw(full, arena, *objs)
+
+    # Frames composed off-screen on top of the static and score layers,
+    # only the changes written
+    renderer = render.Renderer(FakeWindow(), SCR_H+2, SCR_W+2)
+    arena.draw(renderer.static)
+    score = None
+    for state in frames(count):
+        sync(state, *objs)
+        if (state.p1_score, state.p2_score) != score:
+            score = (state.p1_score, state.p2_score)
+            draw_score(renderer.score, score)
+            renderer.invalidate()
+        draw(renderer.begin(), arena, *objs)
+        renderer.flush()
+    diff = renderer.pad
+
+    return {
+        'full' : {'cells' : full.cells/count, 'bytes' : full.bytes/count},
+        'diff' : {'cells' : diff.cells/count, 'bytes' : diff.bytes/count},
+    }
+
+
+def run_draws(iterations : int) -> dict:
+    """Time each drawing routine on a fake window and on a renderer's layer
+
+    Returns
+    -------
+
+    results : dict
+        calls per second of Arena.draw, Player.draw, Ball.draw and of a
+        renderer's whole frame (begin, drawing and flush)
+    """
+    arena = Arena(0, 1, SCR_W, SCR_H)
+    player, ball = Player('left', arena), Ball(0, 0, 0, 0)
+    window, layer = FakeWindow(), render.Layer(SCR_H+2, SCR_W+2)
+    renderer = render.Renderer(FakeWindow(), SCR_H+2, SCR_W+2)
+    arena.draw(renderer.static)
+
+    def frame():
+        # Move the ball, so that there's something to flush
+        ball.x = ball.x % SCR_W + 1
+        draw(renderer.begin(), arena, player, player, ball)
+        renderer.flush()
+
+    calls = (
+        ('arena',  lambda: arena.draw(window)),
+        ('player', lambda: player.draw(window, arena)),
+        ('ball',   lambda: ball.draw(window)),
+        ('layer',  lambda: player.draw(layer, arena)),
+        ('frame',  frame),
+    )
+    return {
+        name : {'calls_per_s' : iterations/timeit.timeit(call,
+                                                         number=iterations)}
+        for name, call in calls
+    }
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    results = run(count)
+
+    print('%-6s %14s %14s' % ('draw', 'cells/frame', 'bytes/frame'))
+    for name, r in results.items():
+        print('%-6s %14.1f %14.1f' % (name, r['cells'], r['bytes']))
+
+    print()
+    print('%-6s %14s' % ('call', 'calls/s'))
+    for name, r in run_draws(count).items():
+        print('%-6s %14.0f' % (name, r['calls_per_s']))
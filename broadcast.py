@@ -0,0 +1,211 @@
+"""Spectators of a game hosted from the terminal.
+
+Spectators connect to the host's port like a joiner would, sending a HELLO
+with protocol.SIDE_SPECTATOR as its side. They get two HELLOs back (the left
+player's name and the right one's), then a frame on every tick.
+
+Each tick's frame is encoded once and the same bytes are written to every
+spectator's socket. Sockets are non-blocking: a spectator whose socket can't
+take a frame gets the rest of it later, and misses the frames in between
+(every frame holds the whole state, so a missed frame is never needed). The
+players never wait for a spectator.
+
+The dedicated server (see server.py) takes spectators the same way, and a
+Viewer is the spectator's end of both.
+
+A joiner coming back after its connection dropped connects the same way, its
+HELLO carrying the session token (see protocol.py): the host takes its socket
+back from the spectators.
+"""
+
+import socket
+
+import engine
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Spectators beyond this number are turned away
+MAX_SPECTATORS = 64
+
+# Bytes read at once from a spectator that hasn't sent its HELLO yet
+RECV_SIZE = 64
+
+# Bytes read at once by a viewer
+VIEW_SIZE = 4096
+
+
+class Spectator:
+    """A spectator's socket, and what it still has to be sent"""
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a non-blocking socket that's yet to send its HELLO"""
+        self.sock    = sock
+        self.parser  = protocol.FrameParser()
+        self.ready   = False
+        self.pending = b''
+        self.dropped = 0
+
+
+class Spectators:
+    """Every spectator of the game"""
+
+    def __init__(self, listener : socket.socket, hellos : bytes):
+        """Take in spectators from the listening socket (made non-blocking),
+        greeting them with the hellos (both players' HELLO frames)"""
+        listener.setblocking(False)
+        self.listener   = listener
+        self.hellos     = hellos
+        self.spectators = []
+        self.token      = 0
+        self.rejoined   = None
+
+
+    def _drop(self, spectator : Spectator):
+        """Forget a spectator, closing its socket"""
+        self.spectators.remove(spectator)
+        spectator.sock.close()
+
+
+    def poll(self):
+        """Accept the new spectators and read the HELLO of those that haven't
+        sent it yet"""
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                break
+            if len(self.spectators) >= MAX_SPECTATORS:
+                sock.close()
+                continue
+            sock.setblocking(False)
+            self.spectators.append(Spectator(sock))
+
+        for spectator in [s for s in self.spectators if not s.ready]:
+            try:
+                data = spectator.sock.recv(RECV_SIZE)
+                frames = spectator.parser.feed(data)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except (OSError, protocol.ProtocolError):
+                self._drop(spectator)
+                continue
+
+            # The joiner, back with its session token
+            if (self.token and frames
+                and frames[0][0] == protocol.MSG_HELLO
+                and frames[0][1][1] != protocol.SIDE_SPECTATOR
+                and frames[0][1][4] == self.token):
+                self.spectators.remove(spectator)
+                if self.rejoined is not None: self.rejoined.close()
+                self.rejoined = spectator.sock
+                continue
+
+            # Closed, or not a spectator (the game already has two players)
+            if not data or any(
+                msg_type != protocol.MSG_HELLO
+                or fields[1] != protocol.SIDE_SPECTATOR
+                for msg_type, fields in frames
+            ):
+                self._drop(spectator)
+            elif frames:
+                spectator.ready, spectator.pending = True, self.hellos
+
+
+    def rejoin(self) -> socket.socket or None:
+        """The socket of the joiner that came back, if it did"""
+        sock, self.rejoined = self.rejoined, None
+        return sock
+
+
+    def send(self, frame : bytes):
+        """Send the same frame to every spectator that can take it"""
+        for spectator in [s for s in self.spectators if s.ready]:
+            try:
+                # Finish the frame that didn't fit last time. If it still
+                # doesn't, this frame is dropped
+                if spectator.pending:
+                    sent = spectator.sock.send(spectator.pending)
+                    spectator.pending = spectator.pending[sent:]
+                    if spectator.pending:
+                        spectator.dropped += 1
+                        continue
+
+                sent = spectator.sock.send(frame)
+                if sent < len(frame): spectator.pending = frame[sent:]
+            except (BlockingIOError, InterruptedError):
+                spectator.dropped += 1
+            except OSError:
+                self._drop(spectator)
+
+
+    def close(self):
+        """Disconnect every spectator"""
+        for spectator in list(self.spectators): self._drop(spectator)
+
+
+class Viewer:
+    """Spectator's end: keeps up with the newest state sent by the host or
+    the server"""
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a connected socket"""
+        self.sock   = sock
+        self.parser = protocol.FrameParser()
+
+
+    def join(self, name : str) -> (str, str, int):
+        """Ask to watch and get both players' HELLOs
+
+        Returns
+        -------
+
+        tuple(left : str, right : str, tick_rate : int)
+            names of the players on the left and on the right, and the tick
+            rate of the game
+        """
+        self.sock.sendall(
+            protocol.encode_hello(name, protocol.SIDE_SPECTATOR)
+        )
+        reader = protocol.FrameReader(self.sock)
+        left,  _, tick_rate, _, _, _ = reader.expect(protocol.MSG_HELLO)
+        right, _, _,         _, _, _ = reader.expect(protocol.MSG_HELLO)
+
+        self.sock.setblocking(False)
+        return (
+            protocol.decode_name(left), protocol.decode_name(right), tick_rate
+        )
+
+
+    def poll(self, state : engine.State) -> engine.State:
+        """Read every frame waiting, raising ConnectionError if the game is
+        over
+
+        Returns
+        -------
+
+        state : engine.State
+            the newest state received, or the given one if none arrived
+        """
+        while True:
+            try:
+                data = self.sock.recv(VIEW_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            if not data: raise ConnectionError('game over')
+
+            for msg_type, fields in self.parser.feed(data):
+                if msg_type == protocol.MSG_SNAPSHOT:
+                    state = engine.State(*fields[1:])
+                elif msg_type == protocol.MSG_STATE:
+                    (seq, _, bx, by, bvx, bvy, p1_y, p2_y,
+                     p1_score, p2_score, _) = fields
+                    state = engine.State(
+                        seq, p1_y, p2_y, p1_score, p2_score,
+                        bx, by, bvx, bvy, 0
+                    )
+
+        return state
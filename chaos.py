@@ -0,0 +1,255 @@
+"""Chaos mode: a match with many balls in play at once.
+
+Run it with `python3 spong.py chaos [--balls n] [--tick 30/60/120] [--seed n]
+[--ai name:param]`. You play the left paddle against an AI (a controller
+registered in agents.py) on a single terminal, with n balls (CHAOS_BALLS by
+default) scattered over the arena. Every ball that goes in scores and is
+served again from the center.
+
+Balls aren't Ball objects: their positions and velocities live in the NumPy
+columns of a batch.BatchEnv, one column per ball. Each column is simulated
+as a match of its own, but every column gets the same actions, so that all
+of them share the same two paddles. Paddle hits, wall bounces and goals are
+then resolved for every ball at once, by the same rules as engine.step.
+Drawing takes one pass too: the balls' cells are computed as arrays and
+plotted on the frame, and the renderer only sends the cells that changed.
+
+Requires NumPy (`pip install numpy`).
+"""
+
+import sys
+import time
+import curses
+
+import numpy as np
+
+import agents
+import batch
+import engine
+from engine import SHIFT, HALF, TICK_RATES, BASE_TICK_RATE
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Balls in play when not given
+CHAOS_BALLS = 200
+
+# Actions, as BatchEnv takes them
+ACTIONS = {None : batch.NOOP, 'up' : batch.UP, 'down' : batch.DOWN}
+
+# Message variables
+MSG_USAGE  = 'Usage: python3 spong.py chaos [--balls n] [--tick 30/60/120] ' \
+             '[--seed n] [--ai name:param]'
+MSG_STATUS = '{} balls {:3.0f} fps'
+MSG_CANT_AI = 'Could not load the AI controller {}'
+
+
+class Chaos:
+    """Many balls in play between one pair of paddles"""
+
+    def __init__(
+        self,
+        balls : int = CHAOS_BALLS,
+        seed  : int = 0,
+        rules : engine.Rules = engine.RULES
+    ):
+        """Scatter the balls over the arena, each one going in a direction
+        given by the seed"""
+        self.env = batch.BatchEnv(balls, seed, rules)
+        self.env.reset()
+
+        # Start anywhere but in front of the paddles, on a whole cell
+        rnd = np.random.RandomState(seed)
+        left, top, bound_x, bound_y, _, _, _ = rules
+        self.env.x[:] = rnd.randint(left+4, bound_x-3, balls) << SHIFT
+        self.env.y[:] = rnd.randint(top+1, bound_y, balls) << SHIFT
+
+        # Both players' actions, the same for every ball
+        self.actions = np.zeros((balls, 2), dtype=np.int64)
+
+
+    @property
+    def tick(self) -> int:
+        return int(self.env.tick[0])
+
+
+    @property
+    def p1_y(self) -> int:
+        return int(self.env.p1_y[0])
+
+
+    @property
+    def p2_y(self) -> int:
+        return int(self.env.p2_y[0])
+
+
+    def score(self) -> (int, int):
+        """Goals scored by each player, over every ball"""
+        return int(self.env.p1_score.sum()), int(self.env.p2_score.sum())
+
+
+    def step(self, p1_action : str or None, p2_action : str or None):
+        """Advance every ball, and both paddles, by one tick"""
+        self.actions[:, 0] = ACTIONS.get(p1_action, batch.NOOP)
+        self.actions[:, 1] = ACTIONS.get(p2_action, batch.NOOP)
+        self.env.step(self.actions)
+
+
+    def cells(self) -> (list, list):
+        """Cells of every ball
+
+        Returns
+        -------
+
+        tuple(ys : list, xs : list)
+            row and column of each ball
+        """
+        env = self.env
+        return ((env.y+HALF) >> SHIFT).tolist(), \
+               ((env.x+HALF) >> SHIFT).tolist()
+
+
+    def threat(self, side : int) -> (int, int, int, int):
+        """The ball the left (side 0) or right (side 1) paddle should go
+        for: the closest one heading to it (or the closest one, if none is),
+        as engine.ball gives it"""
+        env = self.env
+        toward = env.vx < 0 if side == 0 else env.vx > 0
+        distance = env.x if side == 0 else -env.x
+        i = int(np.argmin(
+            np.where(toward, distance, distance + (1 << 62))
+        ))
+        x, y, vx, vy = int(env.x[i]), int(env.y[i]), env.vx[i], env.vy[i]
+        return (
+            (x+HALF) >> SHIFT, (y+HALF) >> SHIFT,
+            int(vx > 0) - int(vx < 0), int(vy > 0) - int(vy < 0)
+        )
+
+
+def play(
+    scr       : curses.window,
+    balls     : int,
+    tick_rate : int,
+    seed      : int,
+    ai_spec   : str
+):
+    """Play a chaos match on the terminal until q is pressed"""
+    # The drawing code is the game's own
+    from spong import Arena, Player, draw_score, SCR_H, SCR_W
+    from clock import Clock
+    import render
+
+    try:
+        ai = agents.create(ai_spec, seed)
+    except (ValueError, ImportError):
+        sys.exit(MSG_CANT_AI.format(ai_spec))
+
+    curses.curs_set(0)
+    scr.nodelay(1)
+
+    arena   = Arena(0, 1, SCR_W, SCR_H)
+    player1 = Player('left', arena)
+    player2 = Player('right', arena)
+    rules   = engine.make_rules(tick_rate, arena.x, arena.y, SCR_W, SCR_H)
+    chaos   = Chaos(balls, seed, rules)
+
+    renderer = render.Renderer(scr, SCR_H+2, SCR_W+2)
+    arena.draw(renderer.static)
+
+    up_keys   = (curses.KEY_UP,   ord('k'), ord('K'), ord('w'), ord('W'))
+    down_keys = (curses.KEY_DOWN, ord('j'), ord('J'), ord('s'), ord('S'))
+
+    clock, now = Clock(tick_rate), time.perf_counter
+    action, ai_action, score, fps = None, None, None, 0.0
+    last_frame = now()
+
+    while True:
+        # The last key pressed wins, and holds until a tick takes it
+        key = scr.getch()
+        while key != -1:
+            if key in (ord('q'), ord('Q')): return
+            elif key in up_keys   : action = 'up'
+            elif key in down_keys : action = 'down'
+            elif key == curses.KEY_RESIZE: renderer.resize()
+            key = scr.getch()
+
+        for _ in range(clock.ticks_due()):
+            if engine.ai_decides(chaos.tick, rules):
+                player2.y = chaos.p2_y
+                ai_action = ai(None, arena, player2, None, True, {
+                    'p1' : chaos.p1_y, 'p2' : chaos.p2_y,
+                    'ball' : chaos.threat(1)
+                })
+            if engine.paddle_moves(chaos.tick, rules):
+                chaos.step(action, ai_action)
+            else:
+                chaos.step(action, None)
+            action = None
+
+        if clock.render_due():
+            if chaos.score() != score:
+                score = chaos.score()
+                draw_score(renderer.score, score)
+                renderer.invalidate()
+
+            frame = renderer.begin()
+            frame.addstr(0, 0, MSG_STATUS.format(balls, fps))
+            player1.y, player2.y = chaos.p1_y, chaos.p2_y
+            player1.draw(frame, arena)
+            player2.draw(frame, arena)
+            ys, xs = chaos.cells()
+            frame.plot(ys, xs, 'O')
+            renderer.flush()
+
+            # Frames per second, smoothed
+            drawn = now()
+            fps += (1/max(drawn-last_frame, 1e-6)-fps)/16
+            last_frame = drawn
+
+        clock.wait()
+
+
+def get_args() -> dict:
+    """Parse `chaos [--balls n] [--tick 30/60/120] [--seed n] [--ai
+    name:param]`, exiting on bad arguments
+
+    Returns
+    -------
+
+    args : dict
+        play()'s arguments but the screen
+    """
+    args = sys.argv[2:]
+    if len(args) % 2: sys.exit(MSG_USAGE)
+
+    options = {
+        'balls' : CHAOS_BALLS, 'tick_rate' : BASE_TICK_RATE, 'seed' : 0,
+        'ai_spec' : 'ai'
+    }
+    for name, value in zip(args[::2], args[1::2]):
+        if name == '--balls' and value.isdigit() and int(value) > 0:
+            options['balls'] = int(value)
+        elif name == '--tick' and value.isdigit() and int(value) in TICK_RATES:
+            options['tick_rate'] = int(value)
+        elif name == '--seed' and value.isdigit():
+            options['seed'] = int(value)
+        elif name == '--ai':
+            try:
+                agents.validate(value)
+            except ValueError:
+                sys.exit(MSG_USAGE)
+            options['ai_spec'] = value
+        else:
+            sys.exit(MSG_USAGE)
+
+    return options
+
+
+def main():
+    curses.wrapper(play, **get_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Fixed timestep scheduler driving the game loops (terminal and server)"""
+
+import time
+import selectors
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Loop config variables (in Hz)
+INPUT_RATE   = 120
+RENDER_RATE  = 60
+MAX_CATCH_UP = 5 # max. ticks simulated at once before frames are dropped
+
+
+class Clock:
+    """Fixed timestep scheduler for the game loop. The simulation advances in
+    fixed ticks, no matter how long input and drawing take, while input is
+    sampled and the screen is drawn at their own rates"""
+
+    def __init__(
+        self,
+        tick_rate    : int,
+        input_rate   : int = INPUT_RATE,
+        render_rate  : int = RENDER_RATE,
+        max_catch_up : int = MAX_CATCH_UP
+    ):
+        """Start the clock now, with the given rates (in Hz)"""
+        self.tick_dt      = 1/tick_rate
+        self.input_dt     = 1/input_rate
+        self.render_dt    = 1/render_rate
+        self.max_catch_up = max_catch_up
+        self.accumulator  = 0.0
+        self.skipped      = 0
+        self.deferred     = False
+        self.last         = time.monotonic()
+        self.next_input   = self.last
+        self.next_render  = self.last
+
+
+    def ticks_due(self) -> int:
+        """Number of simulation ticks to run now. If the loop fell too far
+        behind, the backlog is dropped (frame-skip) instead of spiralling"""
+        self.deferred = False
+        now = time.monotonic()
+        self.accumulator += now-self.last
+        self.last = now
+
+        ticks = int(self.accumulator/self.tick_dt)
+        if ticks > self.max_catch_up:
+            self.skipped    += ticks-self.max_catch_up
+            self.accumulator = 0.0
+            return self.max_catch_up
+
+        self.accumulator -= ticks*self.tick_dt
+        return ticks
+
+
+    def defer(self, ticks : int):
+        """Give back ticks that couldn't run yet (waiting on the network),
+        so that they're due again on the next call to ticks_due()"""
+        self.accumulator += ticks*self.tick_dt
+        self.deferred     = True
+
+
+    def resync(self):
+        """Drop the ticks left waiting (after a long wait on the network),
+        so that the game carries on from now instead of trying to catch up
+        with the peer's pace"""
+        self.accumulator = 0.0
+        self.last        = time.monotonic()
+
+
+    def input_due(self) -> bool:
+        """Whether it's time to sample input"""
+        now = time.monotonic()
+        if now < self.next_input: return False
+        self.next_input = max(self.next_input+self.input_dt, now)
+        return True
+
+
+    def render_due(self) -> bool:
+        """Whether it's time to draw a new frame"""
+        now = time.monotonic()
+        if now < self.next_render: return False
+        self.next_render = max(self.next_render+self.render_dt, now)
+        return True
+
+
+    def next_tick_in(self) -> float:
+        """Seconds until the next simulation tick is due"""
+        return self.last+self.tick_dt-self.accumulator-time.monotonic()
+
+
+    def wait(self, selector : selectors.BaseSelector = None):
+        """Sleep until the next tick, input sample or frame is due, or until
+        a socket registered in the selector can be read. Deferred ticks
+        aren't waited for, the socket is"""
+        now = time.monotonic()
+        delay = min(self.next_input-now, self.next_render-now)
+        if not self.deferred: delay = min(delay, self.next_tick_in())
+        if delay <= 0: return
+
+        if selector is None: time.sleep(delay)
+        else               : selector.select(delay)
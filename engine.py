@@ -0,0 +1,261 @@
+"""Headless simulation core of Spong, with no curses nor terminal required.
+
+The whole game state is an immutable State tuple and the game rules are a
+single pure function, step(state, p1_action, p2_action) -> state. The
+terminal game, the dedicated server and the AI all drive this same core.
+
+Randomness (the ball's direction after a goal) comes from a small generator
+whose state is part of State, so a match is fully determined by its seed and
+both players' actions.
+
+The ball's position and velocity are fixed-point integers, in 1/ONE of a
+cell, so it can move by fractions of a cell per tick (at high tick rates) or
+by several cells (as it speeds up during a rally). Each tick its path is
+swept against the walls and the paddle it's heading to, finding where it
+crosses them instead of checking the cells it lands on, so it never goes
+through a paddle whatever its speed.
+"""
+
+from collections import namedtuple
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Arena config variables
+SCR_H = 18
+SCR_W = 78
+
+# Simulation tick rates (in Hz). The ball is served at BASE_TICK_RATE cells
+# per second, whatever the tick rate is
+TICK_RATES     = (30, 60, 120)
+BASE_TICK_RATE = 30
+
+# Fixed-point ball coordinates: a cell is ONE units wide
+SHIFT = 8
+ONE   = 1 << SHIFT
+HALF  = ONE >> 1
+
+# Ball's top speed across the arena (in cells per BASE_TICK_RATE tick), and
+# how much faster it gets at every paddle hit (by 1/RAMP of its speed). Its
+# vertical speed never changes, so that paddles can keep up with it
+MAX_SPEED = 2
+RAMP      = 16
+
+# Seeds and the generator's state are 31 bits long
+RNG_MASK = 0x7FFFFFFF
+
+State = namedtuple('State', (
+    'tick',
+    'p1_y', 'p2_y',
+    'p1_score', 'p2_score',
+    'ball_x', 'ball_y', 'ball_vx', 'ball_vy',
+    'rng'
+))
+State.__doc__ = 'Everything needed to carry on a match'
+
+Rules = namedtuple(
+    'Rules',
+    ('x', 'y', 'bound_x', 'bound_y', 'speed', 'max_speed', 'paddle_every')
+)
+Rules.__doc__ = """Arena's top-left corner (x, y) and bottom-right corner
+(bound_x, bound_y), the ball's speed when served and its top speed (in
+1/ONE of a cell per tick), and the ticks between two moves of a paddle whose
+action is held (see paddle_moves)"""
+
+# Faster than State(...) or State._replace, which validate their arguments
+_new_state = tuple.__new__
+
+
+def make_rules(
+    tick_rate : int = BASE_TICK_RATE,
+    x         : int = 0,
+    y         : int = 1,
+    size_x    : int = SCR_W,
+    size_y    : int = SCR_H,
+    max_speed : int = MAX_SPEED
+) -> Rules:
+    """Rules for an arena with the top-left corner located at (x,y) and with
+    size (size_x, size_y), simulated at tick_rate Hz, with the ball speeding
+    up to max_speed cells per BASE_TICK_RATE tick (1 for no speed-up)"""
+    speed = ONE*BASE_TICK_RATE//tick_rate
+    return Rules(
+        x, y, x+size_x, y+size_y, speed, speed*max_speed,
+        max(tick_rate//BASE_TICK_RATE, 1)
+    )
+
+
+RULES = make_rules()
+
+
+def next_rng(rng : int) -> int:
+    """Advance the random generator (31 bits linear congruential)"""
+    return (rng*1103515245 + 12345) & RNG_MASK
+
+
+def serve(rng : int) -> (int, int, int):
+    """Pick a random direction for the ball
+
+    Returns
+    -------
+
+    tuple(rng : int, vx : int, vy : int)
+        the generator's new state and the ball's velocity, with vx in (-1, 1)
+        and vy in (-1, 0, 1)
+    """
+    rng = next_rng(rng)
+    return rng, (-1, 1)[rng >> 30], (rng >> 16) % 3 - 1
+
+
+def new_state(seed : int, rules : Rules = RULES) -> State:
+    """State at the start of a match: paddles and ball at the arena's center,
+    the ball going in a direction given by the seed"""
+    center_y = rules.bound_y//2 + rules.y//2
+    rng, vx, vy = serve(seed & RNG_MASK)
+    return State(
+        0, center_y, center_y, 0, 0, rules.bound_x//2 << SHIFT,
+        rules.bound_y//2 << SHIFT, vx*rules.speed, vy*rules.speed, rng
+    )
+
+
+def paddle_x(side : int, rules : Rules = RULES) -> int:
+    """Column of the left (side 0) or right (side 1) player's paddle"""
+    return rules.x+2 if side == 0 else rules.bound_x-2
+
+
+def move_paddle(y : int, action : str or None, rules : Rules = RULES) -> int:
+    """Paddle's new y after the action, kept inside the arena"""
+    if   action == 'up'   and y > rules.y+3      : return y-1
+    elif action == 'down' and y < rules.bound_y-3: return y+1
+    return y
+
+
+def paddle_moves(tick : int, rules : Rules = RULES) -> bool:
+    """Whether an action held from tick to tick (an AI's, or a remote
+    control's) moves its paddle on the given tick: only the last tick out of
+    every rules.paddle_every does, so that such a paddle is as fast against
+    the ball at every tick rate. A key press is used up by a single tick,
+    and needs no such limit"""
+    return tick % rules.paddle_every == rules.paddle_every-1
+
+
+def ai_decides(tick : int, rules : Rules = RULES) -> bool:
+    """Whether an AI run along with the simulation decides on the given
+    tick: only the first tick out of every rules.paddle_every does, its
+    action waiting for paddle_moves, so that it sees the ball as late
+    before its paddle moves (a BASE_TICK_RATE tick) at every tick rate"""
+    return tick % rules.paddle_every == 0
+
+
+def ball(state : State) -> (int, int, int, int):
+    """Ball's cell (x, y) and direction (vx, vy, each -1, 0 or 1)"""
+    x, y, vx, vy = state[5:9]
+    return (
+        (x+HALF) >> SHIFT, (y+HALF) >> SHIFT,
+        (vx > 0) - (vx < 0), (vy > 0) - (vy < 0)
+    )
+
+
+def step(
+    state     : State,
+    p1_action : str or None,
+    p2_action : str or None,
+    rules     : Rules = RULES
+) -> State:
+    """Advance the match by one tick: move the ball (sweeping its path
+    against the walls and paddles, or scoring a goal), then move both paddles
+
+    Parameters
+    ----------
+
+    state     : State
+    p1_action : str or None
+    p2_action : str or None
+        'up', 'down' or None (anything else is ignored)
+    rules     : Rules
+
+    Returns
+    -------
+
+    state : State
+        the state one tick later (the given one is left untouched)
+    """
+    tick, p1_y, p2_y, p1_score, p2_score, x, y, vx, vy, rng = state
+    left, top, bound_x, bound_y, speed, max_speed, _ = rules
+    goal_left, goal_right = (left+1) << SHIFT, (bound_x-1) << SHIFT
+
+    if x <= goal_left or x >= goal_right:
+        # Goal, the ball goes back to the center in a random direction
+        if x >= goal_right: p1_score += 1
+        else              : p2_score += 1
+        x, y = (bound_x//2 + left//2) << SHIFT, (bound_y//2 + top//2) << SHIFT
+        rng, vx, vy = serve(rng)
+        vx, vy = vx*speed, vy*speed
+    else:
+        # Rows the ball can be on, and the column in front of the paddle it's
+        # heading to (how far it is from it, and how far it goes this tick)
+        low, high = (top+1) << SHIFT, (bound_y-1) << SHIFT
+        if vx < 0:
+            face, paddle_y = (left+3) << SHIFT, p1_y
+            dist, run = x-face, -vx
+        else:
+            face, paddle_y = (bound_x-3) << SHIFT, p2_y
+            dist, run = face-x, vx
+
+        if 0 <= dist < run:
+            # The ball reaches the paddle's column this tick: move it there
+            # (bouncing off a wall on the way), then check for the paddle
+            y += vy*dist//run
+            if   y > high: y, vy = 2*high-y, -vy
+            elif y < low : y, vy = 2*low-y,  -vy
+            run -= dist
+
+            # A ball touching the paddle's rows, or clipping its corner
+            # while heading to its center, goes back faster (up, down or
+            # straight depending on where it hit, at the serve's speed)
+            d = y - (paddle_y << SHIFT)
+            if -2*ONE < d < 2*ONE or (
+                -2*ONE-HALF <= d <= 2*ONE+HALF and d*vy < 0
+            ):
+                hit = min(abs(vx) + abs(vx)//RAMP, max_speed)
+                vx = hit if vx < 0 else -hit
+                vy = speed if d > HALF else -speed if d < -HALF else 0
+            x = face + (run if vx > 0 else -run)
+            y += vy*run//abs(vx)
+        else:
+            x, y = x+vx, y+vy
+
+        # Bounce off the top and bottom walls, and stop at the goal lines
+        if   y > high: y, vy = 2*high-y, -vy
+        elif y < low : y, vy = 2*low-y,  -vy
+        if   x < goal_left : x = goal_left
+        elif x > goal_right: x = goal_right
+
+    # Move the paddles, kept inside the arena
+    if   p1_action == 'up'   and p1_y > top+3      : p1_y -= 1
+    elif p1_action == 'down' and p1_y < bound_y-3  : p1_y += 1
+    if   p2_action == 'up'   and p2_y > top+3      : p2_y -= 1
+    elif p2_action == 'down' and p2_y < bound_y-3  : p2_y += 1
+
+    return _new_state(State, (
+        tick+1, p1_y, p2_y, p1_score, p2_score, x, y, vx, vy, rng
+    ))
+
+
+def run(
+    state   : State,
+    actions : iter,
+    rules   : Rules = RULES
+) -> State:
+    """Run step over a sequence of (p1_action, p2_action) pairs
+
+    Returns
+    -------
+
+    state : State
+        the state after the last pair of actions
+    """
+    for p1_action, p2_action in actions:
+        state = step(state, p1_action, p2_action, rules)
+    return state
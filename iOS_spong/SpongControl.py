@@ -3,6 +3,9 @@
 import ui
 import sys
 import socket
+import select
+import struct
+import time
 from objc_util import ObjCInstance, on_main_thread
 
 __author__ = 'Felipe V. Calderan'
@@ -10,6 +13,42 @@ __copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
 __license__ = 'BSD 3-Clause "New" or "Revised" License'
 __version__ = '1.0'
 
+# Spong wire protocol (see protocol.py in the game's folder). It is copied here
+# so that this file can be loaded on the phone on its own.
+PROTOCOL_VERSION = 9
+MSG_HELLO, MSG_INPUT, MSG_ACK = 1, 2, 8
+SIDE_CONTROLLER  = 3
+HEADER      = struct.Struct('!HBB')
+HELLO_FRAME = struct.Struct('!HBB16sBBIIB')
+INPUT_FRAME = struct.Struct('!HBBIB')
+HELLO_LEN   = HELLO_FRAME.size-HEADER.size
+INPUT_LEN   = INPUT_FRAME.size-HEADER.size
+ACTION_BITS = {None : 0, 'up' : 1, 'down' : 2}
+
+# The action is only sent when it changes, and the host sends an ACK every
+# second. Seconds between two checks of the action, and without any ACK
+# before giving up
+POLL_INTERVAL = 1/60
+ACK_TIMEOUT   = 5
+
+
+def recv_exactly(skt, size):
+    """Receive exactly size bytes from the socket"""
+    data = b''
+    while len(data) < size:
+        chunk = skt.recv(size-len(data))
+        if not chunk: raise ConnectionError('peer closed the connection')
+        data += chunk
+    return data
+
+
+def recv_frame(skt):
+    """Receive a whole frame, returning its type and raw payload"""
+    length, version, msg_type = HEADER.unpack(recv_exactly(skt, HEADER.size))
+    if version != PROTOCOL_VERSION:
+        raise ConnectionError('incompatible game version')
+    return msg_type, recv_exactly(skt, length)
+
 # Game flow variables
 action = None
 can_go = False
@@ -81,29 +120,48 @@ def game_loop(v):
 
     while can_go:
         if not accepted:
-            # Receive host name
+            # Send name (first, a dedicated server waits for both players'
+            # names before answering)
             try:
-                skt.recv(16).strip().decode()
-                v['btnConn'].title = 'Disconnect'
+                name = v['txtName'].text.encode()[:16].ljust(16)
+                skt.sendall(HELLO_FRAME.pack(
+                    HELLO_LEN, PROTOCOL_VERSION, MSG_HELLO, name,
+                    SIDE_CONTROLLER, 0, 0, 0, 0
+                ))
+                seq, sent = 0, None
+                accepted = True
             except:
                 error_disconnect(v)
                 break
 
-            # Send name
+            # Receive opponent's name
             try:
-                skt.send(v['txtName'].text.encode().ljust(16))
-                accepted = True
+                recv_frame(skt)
+                last_ack = time.monotonic()
+                v['btnConn'].title = 'Disconnect'
                 v['lblMsg'].text_color = 'lightgreen'
                 v['lblMsg'].text = 'Connected'
             except:
                 error_disconnect(v)
                 break
 
-        # Send action and receive the game status
+        # Send the action only when it changes (a tap is one tick of 'up' or
+        # 'down', then None again) and take in the host's ACKs
         try:
-            skt.send(str(action).encode().ljust(16))
-            action = None
-            skt.recv(256)
+            tapped, action = action, None
+            if tapped != sent:
+                seq = (seq+1) & 0xFFFFFFFF
+                skt.sendall(INPUT_FRAME.pack(
+                    INPUT_LEN, PROTOCOL_VERSION, MSG_INPUT, seq,
+                    ACTION_BITS[tapped]
+                ))
+                sent = tapped
+
+            if select.select([skt], [], [], POLL_INTERVAL)[0]:
+                msg_type, _ = recv_frame(skt)
+                if msg_type == MSG_ACK: last_ack = time.monotonic()
+            if time.monotonic()-last_ack > ACK_TIMEOUT:
+                raise ConnectionError('host timed out')
         except:
             error_disconnect(v)
             break
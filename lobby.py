@@ -0,0 +1,331 @@
+"""Lobby: matchmaking in front of a pool of worker processes, each one a
+dedicated server (see server.py) running many matches.
+
+Run it with `python3 spong.py lobby ip port [--workers n] [--tick 30/60/120]
+[--record directory]`. Players and spectators connect to the lobby just like
+they connect to a server. The lobby only reads their HELLO: players wait in
+a matchmaking queue (connecting again under the same name replaces the
+older connection, once it's closed) and are paired in order of arrival.
+Players may share a name, as AIs do: each connection waits on its own.
+
+Each pair's sockets are then handed off to the worker with the fewest
+matches running, which plays the match to its end. The lobby never touches
+the game traffic, so matches scale with the workers, one per core by
+default. Spectators go to the busiest worker, to watch its oldest match.
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import selectors
+import multiprocessing
+from multiprocessing import reduction
+from collections import OrderedDict
+
+import protocol
+import server
+from engine import TICK_RATES, BASE_TICK_RATE
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 spong.py lobby ip port [--workers n] ' \
+              '[--tick 30/60/120] [--record directory]'
+MSG_SERVING = 'Lobby on {}:{} at {} Hz, {} worker(s) (Ctrl+C to stop)'
+
+# Bytes of a whole HELLO frame, the only frame the lobby reads
+HELLO_SIZE = protocol.HEADER.size + protocol.HELLO.size
+
+# Seconds a new connection has to send its HELLO
+HELLO_TIMEOUT = 10
+
+# Bytes read at once from a connection
+RECV_SIZE = 256
+
+
+class Peer:
+    """A connection the lobby hasn't handed off yet"""
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a non-blocking socket that's yet to send its HELLO"""
+        self.sock  = sock
+        self.data  = bytearray()
+        self.since = time.monotonic()
+        self.name  = None
+        self.side  = None
+
+
+class Worker:
+    """A worker process, the end of the pipe to it and its matches running"""
+
+    def __init__(self, tick_rate : int, record : str or None):
+        """Start the worker process"""
+        self.pipe, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=work, args=(child, tick_rate, record), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.rooms = 0
+
+
+    def hand_off(self, kind : str, number : int, peers : list):
+        """Send the peers' sockets to the worker (their names, sides and
+        the bytes that followed their HELLO first), then forget them"""
+        self.pipe.send((kind, number, [
+            (peer.name, peer.side, bytes(peer.data)) for peer in peers
+        ]))
+        for peer in peers:
+            reduction.send_handle(
+                self.pipe, peer.sock.fileno(), self.process.pid
+            )
+            peer.sock.close()
+
+
+class Lobby:
+    """Reads the HELLOs, pairs players and balances them over the workers"""
+
+    def __init__(self, listener : socket.socket, workers : list):
+        """Take in connections from the listening socket (made
+        non-blocking)"""
+        listener.setblocking(False)
+        self.listener = listener
+        self.workers  = workers
+        self.waiting  = OrderedDict()
+        self.matches  = 0
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(listener, selectors.EVENT_READ)
+        for worker in workers:
+            self.selector.register(worker.pipe, selectors.EVENT_READ, worker)
+
+
+    def _drop(self, peer : Peer):
+        """Forget a connection, closing it"""
+        if self.waiting.get(peer.sock) is peer: del self.waiting[peer.sock]
+        self.selector.unregister(peer.sock)
+        peer.sock.close()
+
+
+    def _alive(self, peer : Peer) -> bool:
+        """Whether a connection is still open (it may have been closed
+        without the lobby having read so yet)"""
+        try:
+            return peer.sock.recv(1, socket.MSG_PEEK) != b''
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+
+
+    def accept(self):
+        """Take in every new connection"""
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                return
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, Peer(sock))
+
+
+    def read(self, peer : Peer):
+        """Read from a connection, until its HELLO is whole"""
+        try:
+            data = peer.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._drop(peer)
+            return
+
+        peer.data += data
+        if peer.name is not None or len(peer.data) < HELLO_SIZE: return
+        try:
+            msg_type, fields = protocol.decode(bytes(peer.data[:HELLO_SIZE]))
+        except protocol.ProtocolError:
+            msg_type = None
+        if msg_type != protocol.MSG_HELLO:
+            self._drop(peer)
+            return
+        del peer.data[:HELLO_SIZE]
+        peer.name, peer.side = protocol.decode_name(fields[0]), fields[1]
+
+        if peer.side == protocol.SIDE_SPECTATOR:
+            self.selector.unregister(peer.sock)
+            worker = max(self.workers, key=lambda worker: worker.rooms)
+            worker.hand_off('watch', 0, [peer])
+        else:
+            # Someone waiting under this name may have reconnected: its
+            # older connection goes if it's closed
+            for other in list(self.waiting.values()):
+                if other.name == peer.name and not self._alive(other):
+                    self._drop(other)
+            self.waiting[peer.sock] = peer
+            self.pair()
+
+
+    def pair(self):
+        """Hand off the players waiting the longest, two by two, to the
+        workers with the fewest matches"""
+        while len(self.waiting) >= 2:
+            _, left  = self.waiting.popitem(last=False)
+            _, right = self.waiting.popitem(last=False)
+            for peer in (left, right): self.selector.unregister(peer.sock)
+
+            self.matches += 1
+            worker = min(self.workers, key=lambda worker: worker.rooms)
+            worker.hand_off('match', self.matches, [left, right])
+            worker.rooms += 1
+
+
+    def reap(self):
+        """Drop the connections that didn't send their HELLO in time"""
+        now = time.monotonic()
+        for key in list(self.selector.get_map().values()):
+            peer = key.data
+            if (isinstance(peer, Peer) and peer.name is None
+                and now-peer.since > HELLO_TIMEOUT):
+                self._drop(peer)
+
+
+    def run(self):
+        """Serve forever (until a worker dies)"""
+        while True:
+            for key, _ in self.selector.select(1):
+                if key.fileobj is self.listener:
+                    self.accept()
+                elif isinstance(key.data, Worker):
+                    # A worker tells whenever one of its matches ended
+                    try:
+                        key.data.pipe.recv()
+                    except EOFError:
+                        return
+                    key.data.rooms -= 1
+                else:
+                    self.read(key.data)
+            self.reap()
+
+
+class WorkerServer(server.Server):
+    """A dedicated server that takes its clients from the lobby"""
+
+    def __init__(self, pipe, tick_rate : int, record : str = None):
+        """Start with no rooms, reporting to the lobby through the pipe"""
+        super().__init__(tick_rate, record)
+        self.pipe = pipe
+
+
+    def drop(self, client : server.Client):
+        """Forget a disconnected client, telling the lobby when its match
+        ended"""
+        rooms = len(self.rooms)
+        super().drop(client)
+        if len(self.rooms) < rooms: self.pipe.send('closed')
+
+
+    def receive(self):
+        """Take in the sockets handed off by the lobby"""
+        kind, number, peers = self.pipe.recv()
+        socks = [
+            socket.socket(fileno=reduction.recv_handle(self.pipe))
+            for _ in peers
+        ]
+        asyncio.ensure_future(self.adopt(kind, number, peers, socks))
+
+
+    async def adopt(self, kind : str, number : int, peers : list, socks):
+        """Start serving the sockets, as a match or as a spectator"""
+        loop, clients = asyncio.get_running_loop(), []
+        for (name, side, data), sock in zip(peers, socks):
+            _, client = await loop.connect_accepted_socket(
+                lambda: server.Client(self), sock
+            )
+            client.identify(name, side)
+            clients.append(client)
+
+        if kind == 'watch':
+            self.watch(clients[0])
+        elif any(client.transport.is_closing() for client in clients):
+            # Someone left during the hand off
+            for client in clients: client.transport.close()
+            self.pipe.send('closed')
+            return
+        else:
+            self.start(clients[0], clients[1], number)
+
+        # What came after the HELLOs
+        for (_, _, data), client in zip(peers, clients):
+            if data: client.data_received(data)
+
+
+def work(pipe, tick_rate : int, record : str or None):
+    """A worker process: a dedicated server fed by the lobby"""
+    async def serve():
+        worker = WorkerServer(pipe, tick_rate, record)
+        asyncio.get_running_loop().add_reader(pipe.fileno(), worker.receive)
+        await worker.run()
+
+    try:
+        asyncio.run(serve())
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+def get_args() -> (str, int, int, int, str or None):
+    """Parse `lobby ip port [--workers n] [--tick 30/60/120] [--record
+    directory]`, exiting on bad arguments
+
+    Returns
+    -------
+
+    tuple(ip : str, port : int, workers : int, tick_rate : int,
+          record : str or None)
+    """
+    args = sys.argv[2:]
+    workers, tick_rate, record = os.cpu_count() or 1, BASE_TICK_RATE, None
+
+    if len(args) < 2 or len(args) % 2 or not args[1].isdigit():
+        sys.exit(MSG_USAGE)
+
+    # Optional arguments, given as "--name value" pairs
+    for name, value in zip(args[2::2], args[3::2]):
+        if name == '--workers' and value.isdigit() and int(value) > 0:
+            workers = int(value)
+        elif name == '--tick' and value.isdigit() and int(value) in TICK_RATES:
+            tick_rate = int(value)
+        elif name == '--record' and os.path.isdir(value):
+            record = value
+        else:
+            sys.exit(MSG_USAGE)
+
+    return args[0], int(args[1]), workers, tick_rate, record
+
+
+def main():
+    ip, port, workers, tick_rate, record = get_args()
+
+    # Workers first, so that they don't inherit the listening socket
+    pool = [Worker(tick_rate, record) for _ in range(workers)]
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((ip, port))
+    listener.listen(128)
+    print(MSG_SERVING.format(ip, port, tick_rate, workers))
+
+    try:
+        Lobby(listener, pool).run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
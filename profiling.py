@@ -0,0 +1,361 @@
+"""Profiling of the game loop.
+
+Add `--profile file` to a game's options to profile it from its first tick
+until it quits, when the profile is written to file. Only the game loop's
+thread is profiled (the AI decides on its own thread, see agents.py). Two
+profilers are available, picked with `--profiler`:
+
+- `sample` (the default) looks at the loop's stack every SAMPLE_INTERVAL
+  seconds from another thread, which costs the loop next to nothing, even on
+  the C.H.I.P. Samples taken inside the loop are put under the phase running
+  at the time (input, sim, net or draw, the ones stats.py times), found from
+  the loop's source: the lines between `start = now()` and
+  `stats.add(phase, now()-start)`. The file holds collapsed stacks, one
+  `frame;frame;...;frame count` line per stack, which flamegraph.pl,
+  speedscope and inferno turn into flame graphs.
+- `cprofile` counts every call with cProfile, at a much higher cost, and
+  writes its statistics (read them with `python3 -m pstats file`).
+
+`python3 spong.py profile file [--ticks n] [--profiler sample/cprofile]
+[--ai name:param] [--tick 30/60/120] [--seed n]` profiles n ticks of an
+AI-vs-AI match without a terminal or a network: the same input, simulation
+and drawing as a game, frames being composed but written nowhere. With the
+same seed, the same ticks are played every time.
+"""
+
+import os
+import re
+import sys
+import time
+import inspect
+import cProfile
+import threading
+from random import Random
+
+import agents
+import engine
+import render
+from stats import Stats
+from engine import SCR_H, SCR_W, TICK_RATES, BASE_TICK_RATE
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Profilers available
+PROFILERS = ('sample', 'cprofile')
+
+# Seconds between two samples of the stack
+SAMPLE_INTERVAL = 0.005
+
+# Ticks profiled by the headless run, and its AIs when none is given
+TICKS       = 10000
+DEFAULT_AIS = ('ai', 'ai')
+
+# A timed phase of the loop starts with `start = now()` and ends with
+# `stats.add(phase, now()-start)`
+PHASE_START = re.compile(r'(\w+) = now\(\)')
+PHASE_END   = re.compile(r"stats\.add\('(\w+)', now\(\)-(\w+)\)")
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 spong.py profile file [--ticks n] ' \
+              '[--profiler sample/cprofile] [--ai name:param]... ' \
+              '[--tick 30/60/120] [--seed n]'
+MSG_CANT    = 'Could not write the profile to {}'
+MSG_CANT_AI = 'Could not load the AI controller {}'
+MSG_RESULTS = '{} ticks in {:.2f} s ({:.0f} ticks/s), profile written to {}'
+MSG_HEADER  = '{:<6} {:>10} {:>10} {:>10} {:>7}'
+MSG_ROW     = '{:<6} {:>10.3f} {:>10.3f} {:>10.3f} {:>6.1f}%'
+
+
+def phase_lines(function : callable) -> dict:
+    """Phase timed around each line of function, by line number (empty if
+    its source can't be found)
+
+    Returns
+    -------
+
+    phases : dict
+        phase of every line inside a timed phase (the innermost one, as the
+        whole loop iteration is timed too)
+    """
+    try:
+        lines, first = inspect.getsourcelines(function)
+    except (OSError, TypeError):
+        return {}
+
+    phases, starts = {}, {}
+    for number, line in enumerate(lines, first):
+        for match in PHASE_START.finditer(line):
+            starts[match.group(1)] = number
+        match = PHASE_END.search(line)
+        if match is not None and match.group(2) in starts:
+            # Inner phases end first, and keep their lines
+            for inside in range(starts[match.group(2)], number+1):
+                phases.setdefault(inside, match.group(1))
+    return phases
+
+
+class Sampler(threading.Thread):
+    """Counts the stacks of a thread, looked at every interval seconds"""
+
+    def __init__(
+        self,
+        thread   : int,
+        function : callable = None,
+        interval : float = SAMPLE_INTERVAL
+    ):
+        """Sample the thread whose ident is thread, putting what runs inside
+        function under its phases"""
+        super().__init__(daemon=True)
+        self.thread   = thread
+        self.interval = interval
+        self.stopping = threading.Event()
+        self.counts   = {}
+
+        # Frames are labelled file:function, the labels kept by code object
+        self.labels = {}
+        self.code   = getattr(function, '__code__', None)
+        self.phases = phase_lines(function) if function is not None else {}
+
+
+    def _label(self, code) -> str:
+        """Label of a frame running code"""
+        label = self.labels.get(code)
+        if label is None:
+            label = '{}:{}'.format(
+                os.path.basename(code.co_filename), code.co_name
+            )
+            self.labels[code] = label
+        return label
+
+
+    def sample(self):
+        """Count the thread's current stack"""
+        frame = sys._current_frames().get(self.thread)
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            if code is self.code and frame.f_lineno in self.phases:
+                stack.append('[' + self.phases[frame.f_lineno] + ']')
+            stack.append(self._label(code))
+            frame = frame.f_back
+        if not stack: return
+
+        key = ';'.join(reversed(stack))
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+
+    def run(self):
+        while not self.stopping.wait(self.interval): self.sample()
+
+
+    def stop(self):
+        """Stop sampling (after the sample being taken, if any)"""
+        self.stopping.set()
+        self.join()
+
+
+class Profiler:
+    """Profiles the thread that starts it, until stopped"""
+
+    def __init__(
+        self,
+        path     : str,
+        kind     : str = 'sample',
+        function : callable = None
+    ):
+        """Profile with the given kind of profiler (see PROFILERS) and write
+        the profile to path. Samples inside function are put under its
+        phases"""
+        self.path     = path
+        self.kind     = kind
+        self.function = function
+        self.profiler = None
+
+
+    def start(self):
+        """Start profiling the calling thread"""
+        if self.kind == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        else:
+            self.profiler = Sampler(threading.get_ident(), self.function)
+            self.profiler.start()
+
+
+    def stop(self):
+        """Stop profiling and write the profile (only the first call does
+        anything, so that it can run again on exit)"""
+        if self.profiler is None: return
+        profiler, self.profiler = self.profiler, None
+
+        try:
+            if self.kind == 'cprofile':
+                profiler.disable()
+                profiler.dump_stats(self.path)
+                return
+
+            profiler.stop()
+            with open(self.path, 'w') as file:
+                for stack, count in sorted(profiler.counts.items()):
+                    file.write('{} {}\n'.format(stack, count))
+        except OSError:
+            print(MSG_CANT.format(self.path), file=sys.stderr)
+
+
+class NullWindow:
+    """Stands in for the screen and the renderer's pad, without a
+    terminal"""
+
+    def addstr(self, y : int, x : int, text : str): pass
+    def getmaxyx(self): return (SCR_H+2, SCR_W+2)
+    def erase(self): pass
+    def noutrefresh(self, *args): pass
+
+
+def simulate(
+    ticks     : int,
+    left      : str,
+    right     : str,
+    tick_rate : int,
+    seed      : int,
+    stats     : Stats
+) -> engine.State:
+    """Play ticks of a match between the AIs left and right, one tick per
+    loop iteration, as spong.main does without the terminal and the network.
+    Its phases are timed in stats
+
+    Returns
+    -------
+
+    state : engine.State
+        the match's last state
+    """
+    import spong
+
+    rnd = Random(seed)
+    arena = spong.Arena(0, 1, SCR_W, SCR_H)
+    player1 = spong.Player('left', arena)
+    player2 = spong.Player('right', arena)
+    ball = spong.Ball(arena.bound_x//2, arena.bound_y//2, 0, 0)
+    rules = engine.make_rules(tick_rate, arena.x, arena.y, SCR_W, SCR_H)
+    state = engine.new_state(rnd.getrandbits(31), rules)
+    ai1 = agents.create(left, rnd.getrandbits(32))
+    ai2 = agents.create(right, rnd.getrandbits(32))
+
+    renderer = render.Renderer(NullWindow(), SCR_H+2, SCR_W+2, NullWindow())
+    arena.draw(renderer.static)
+    score, now = None, time.perf_counter
+    p1_action = p2_action = None
+
+    for _ in range(ticks):
+        loop_start = now()
+
+        start = now()
+        if engine.ai_decides(state.tick, rules):
+            status = {
+                'p1' : state.p1_y, 'p2' : state.p2_y,
+                'ball' : engine.ball(state)
+            }
+            p1_action = ai1(None, arena, player1, None, True, status)
+            p2_action = ai2(None, arena, player2, None, True, status)
+        stats.add('input', now()-start)
+
+        start = now()
+        if engine.paddle_moves(state.tick, rules):
+            state = engine.step(state, p1_action, p2_action, rules)
+        else:
+            state = engine.step(state, None, None, rules)
+        stats.add('sim', now()-start)
+
+        start = now()
+        spong.sync(state, player1, player2, ball)
+        if (player1.score, player2.score) != score:
+            score = (player1.score, player2.score)
+            spong.draw_score(renderer.score, score)
+            renderer.invalidate()
+        frame = renderer.begin()
+        player1.draw(frame, arena)
+        player2.draw(frame, arena)
+        ball.draw(frame)
+        renderer.flush()
+        stats.add('draw', now()-start)
+
+        stats.add('loop', now()-loop_start)
+
+    return state
+
+
+def get_args() -> dict:
+    """Parse `profile file [--ticks n] [--profiler sample/cprofile] [--ai
+    name:param]... [--tick 30/60/120] [--seed n]`, exiting on bad arguments
+
+    Returns
+    -------
+
+    options : dict
+        the profile's path, the profiler and simulate()'s arguments but
+        the stats
+    """
+    args = sys.argv[2:]
+    if len(args) % 2 == 0: sys.exit(MSG_USAGE)
+
+    options = {
+        'path' : args[0], 'profiler' : 'sample', 'ticks' : TICKS, 'ais' : [],
+        'tick_rate' : BASE_TICK_RATE, 'seed' : 0
+    }
+    for name, value in zip(args[1::2], args[2::2]):
+        if name == '--ticks' and value.isdigit() and int(value) > 0:
+            options['ticks'] = int(value)
+        elif name == '--profiler' and value in PROFILERS:
+            options['profiler'] = value
+        elif name == '--ai' and len(options['ais']) < 2:
+            try:
+                agents.create(value)
+            except ValueError:
+                sys.exit(MSG_USAGE)
+            except ImportError:
+                sys.exit(MSG_CANT_AI.format(value))
+            options['ais'].append(value)
+        elif name == '--tick' and value.isdigit() and int(value) in TICK_RATES:
+            options['tick_rate'] = int(value)
+        elif name == '--seed' and value.isdigit():
+            options['seed'] = int(value)
+        else:
+            sys.exit(MSG_USAGE)
+
+    options['ais'] += DEFAULT_AIS[len(options['ais']):]
+    return options
+
+
+def main():
+    options = get_args()
+    stats = Stats()
+
+    profiler = Profiler(options['path'], options['profiler'], simulate)
+    began = time.perf_counter()
+    profiler.start()
+    simulate(
+        options['ticks'], options['ais'][0], options['ais'][1],
+        options['tick_rate'], options['seed'], stats
+    )
+    profiler.stop()
+    elapsed = time.perf_counter()-began
+
+    print(MSG_RESULTS.format(
+        options['ticks'], elapsed, options['ticks']/elapsed, options['path']
+    ))
+    print(MSG_HEADER.format('(ms)', 'mean', 'p99', 'max', 'share'))
+    total = stats.phases['loop'].total or 1
+    for phase in ('input', 'sim', 'draw', 'loop'):
+        histogram = stats.phases[phase]
+        print(MSG_ROW.format(
+            phase, histogram.mean()*1000, histogram.percentile(99)*1000,
+            histogram.max*1000, 100*histogram.total/total
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+"""Binary wire protocol spoken between Spong hosts, joiners and controllers.
+
+Every message is a frame made of a fixed 4 bytes header followed by a fixed
+size payload:
+
+    header  : payload length (uint16), protocol version (uint8), type (uint8)
+    HELLO   : player name (16 bytes, space padded), side (uint8),
+              tick rate (uint8), random seed (uint32),
+              session token (uint32), net mode (uint8)
+    INPUT   : sequence number (uint32), action (uint8)
+    STATE   : sequence number (uint32), action (uint8),
+              ball x, y (uint16), ball vx, vy (int16),
+              player 1 y, player 2 y (uint8),
+              player 1 score, player 2 score (uint16),
+              sequence number of the receiver's last INPUT applied (uint32)
+    INPUTS  : newest sequence number (uint32), count (uint8),
+              last REDUNDANCY actions, oldest first (REDUNDANCY uint8)
+    SNAPSHOT: last input sequence number applied (uint32),
+              tick (uint32), player 1 y, player 2 y (uint8),
+              player 1 score, player 2 score (uint16),
+              ball x, y (uint16), ball vx, vy (int16),
+              generator state (uint32)
+    PING    : sequence number (uint32)
+    PONG    : sequence number of the PING answered (uint32)
+    ACK     : sequence number of the newest INPUT received (uint32)
+
+INPUTS is only used over UDP (see transport.py), one frame per datagram.
+STATE is only sent by dedicated servers (see server.py): their joiners move
+their own paddle right away, replaying the inputs the server hasn't applied
+yet on top of its state. SNAPSHOT is also sent by the TCP host, on events
+and to spectators (see broadcast.py), with 0 as its sequence number.
+Actions are bit-packed in a single byte (see ACTION_BITS). The ball's
+coordinates are fixed-point, in 1/engine.ONE of a cell. All integers are
+big-endian (network order).
+
+Joiners send a PING every now and then (see stats.py), which the host or
+server answers right away with a PONG. Remote controls never send any, so
+they never get a frame they don't expect.
+
+Remote controls say SIDE_CONTROLLER in their HELLO. They are sent no state
+at all: they send an INPUT only when their action changes (the action is
+held until then), and get an ACK every ACK_INTERVAL seconds, telling them
+the host is still there and which of their inputs it got.
+
+The host's HELLO gives the joiner a session token. Should the connection
+drop, the joiner connects again sending the token in its HELLO, and the host
+(which kept the match waiting) answers with its HELLO and a SNAPSHOT to carry
+on from. Token 0 means no session (a new joiner, or a dedicated server).
+
+Over TCP, both players must run the same netcode: the lockstep or rollback
+(see rollback.py), which their HELLOs say with NET_LOCKSTEP or NET_ROLLBACK.
+A player told of another net mode than its own gives up on the game.
+Dedicated servers, spectators, remote controls and UDP peers always say
+NET_LOCKSTEP.
+"""
+
+import socket
+import struct
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Protocol version, bump it whenever a frame layout changes
+VERSION = 9
+
+# Message types
+MSG_HELLO    = 1
+MSG_INPUT    = 2
+MSG_STATE    = 3
+MSG_INPUTS   = 4
+MSG_SNAPSHOT = 5
+MSG_PING     = 6
+MSG_PONG     = 7
+MSG_ACK      = 8
+
+# Sides a peer can be told to play on
+SIDE_LEFT       = 0
+SIDE_RIGHT      = 1
+SIDE_SPECTATOR  = 2 # sent in HELLO to watch instead of play
+SIDE_CONTROLLER = 3 # sent in HELLO by remote controls, to get no state
+
+# Netcode a player runs, sent in HELLO
+NET_LOCKSTEP = 0
+NET_ROLLBACK = 1
+
+# Bit-packed actions
+ACT_UP   = 0x01
+ACT_DOWN = 0x02
+ACT_QUIT = 0x04
+
+ACTION_BITS = {None : 0, 'up' : ACT_UP, 'down' : ACT_DOWN, 'quit' : ACT_QUIT}
+
+# Sequence numbers wrap around at 32 bits
+SEQ_MASK = 0xFFFFFFFF
+
+# Number of actions repeated in every INPUTS frame, so that a few lost
+# datagrams don't lose any action
+REDUNDANCY = 8
+
+# Seconds between two ACKs sent to a remote control
+ACK_INTERVAL = 1
+
+# Frame layouts
+HEADER   = struct.Struct('!HBB')
+HELLO    = struct.Struct('!16sBBIIB')
+INPUT    = struct.Struct('!IB')
+STATE    = struct.Struct('!IBHHhhBBHHI')
+INPUTS   = struct.Struct('!IB%ds' % REDUNDANCY)
+SNAPSHOT = struct.Struct('!IIBBHHHHhhI')
+PING     = struct.Struct('!I')
+PONG     = struct.Struct('!I')
+ACK      = struct.Struct('!I')
+
+PAYLOADS = {
+    MSG_HELLO : HELLO, MSG_INPUT : INPUT, MSG_STATE : STATE,
+    MSG_INPUTS : INPUTS, MSG_SNAPSHOT : SNAPSHOT, MSG_PING : PING,
+    MSG_PONG : PONG, MSG_ACK : ACK
+}
+
+# Header and payload packed in one go (a single pack call per frame)
+_HELLO_FRAME    = struct.Struct('!HBB16sBBIIB')
+_INPUT_FRAME    = struct.Struct('!HBBIB')
+_STATE_FRAME    = struct.Struct('!HBBIBHHhhBBHHI')
+_INPUTS_FRAME   = struct.Struct('!HBBIB%ds' % REDUNDANCY)
+_SNAPSHOT_FRAME = struct.Struct('!HBBIIBBHHHHhhI')
+_PING_FRAME     = struct.Struct('!HBBI')
+
+MAX_FRAME = HEADER.size + max(s.size for s in PAYLOADS.values())
+
+
+class ProtocolError(Exception):
+    """Raised when the peer sends something that isn't a valid frame"""
+
+
+def _payload(length : int, version : int, msg_type : int) -> struct.Struct:
+    """Layout of a frame's payload, given its header"""
+    payload = PAYLOADS.get(msg_type)
+    if version != VERSION or payload is None or length != payload.size:
+        raise ProtocolError(
+            'bad frame (version %d, type %d)' % (version, msg_type)
+        )
+    return payload
+
+
+def pack_action(action : str or None) -> int:
+    """Convert an action string ('up', 'down', 'quit' or None) to its bits"""
+    return ACTION_BITS.get(action, 0)
+
+
+def unpack_action(bits : int) -> str or None:
+    """Convert action bits back to the action string used by the game"""
+    if   bits & ACT_QUIT: return 'quit'
+    elif bits & ACT_UP  : return 'up'
+    elif bits & ACT_DOWN: return 'down'
+    return None
+
+
+def encode_hello(
+    name      : str,
+    side      : int,
+    tick_rate : int = 0,
+    seed      : int = 0,
+    token     : int = 0,
+    net       : int = NET_LOCKSTEP
+) -> bytes:
+    """Encode the handshake frame carrying the player's name, the side the
+    receiving peer should play on, the simulation tick rate, the match's
+    random seed, the session token (the host's rate and seed are the ones
+    both peers use, joiners send 0, and the token of the session they
+    resume, if any) and the net mode the sender runs"""
+    return _HELLO_FRAME.pack(
+        HELLO.size, VERSION, MSG_HELLO, name.encode()[:16].ljust(16), side,
+        tick_rate, seed, token, net
+    )
+
+
+def encode_input(seq : int, action : str or None) -> bytes:
+    """Encode a joiner's action for the given tick"""
+    return _INPUT_FRAME.pack(
+        INPUT.size, VERSION, MSG_INPUT, seq & SEQ_MASK, pack_action(action)
+    )
+
+
+def encode_state(
+    seq      : int,
+    action   : str or None,
+    ball     : tuple,
+    p1_y     : int,
+    p2_y     : int,
+    p1_score : int,
+    p2_score : int,
+    ack      : int = 0
+) -> bytes:
+    """Encode the host's action alongside the ball, paddles and score
+
+    Parameters
+    ----------
+
+    seq      : int
+        tick number, wraps around at 32 bits
+    action   : str or None
+        host's action on this tick
+    ball     : tuple(int, int, int, int)
+        ball's x, y, vx and vy, as in engine.State (fixed-point)
+    p1_y     : int
+    p2_y     : int
+        paddles' y position
+    p1_score : int
+    p2_score : int
+    ack      : int
+        sequence number of the receiver's last input applied (0 for
+        spectators)
+    """
+    x, y, vx, vy = ball
+    return _STATE_FRAME.pack(
+        STATE.size, VERSION, MSG_STATE, seq & SEQ_MASK, pack_action(action),
+        x, y, vx, vy, p1_y, p2_y, p1_score, p2_score, ack & SEQ_MASK
+    )
+
+
+def encode_inputs(seq : int, actions : list) -> bytes:
+    """Encode a joiner's latest actions, oldest first, seq being the
+    sequence number of the newest one (at most REDUNDANCY actions)"""
+    return _INPUTS_FRAME.pack(
+        INPUTS.size, VERSION, MSG_INPUTS, seq & SEQ_MASK, len(actions),
+        bytes(pack_action(action) for action in actions)
+    )
+
+
+def encode_snapshot(ack : int, state : tuple) -> bytes:
+    """Encode the host's whole simulation state (an engine.State) and the
+    sequence number of the last joiner's input applied to it"""
+    tick = state[0] & SEQ_MASK
+    return _SNAPSHOT_FRAME.pack(
+        SNAPSHOT.size, VERSION, MSG_SNAPSHOT, ack & SEQ_MASK, tick,
+        *state[1:]
+    )
+
+
+def encode_ping(seq : int) -> bytes:
+    """Encode a ping, to be answered with a pong carrying the same seq"""
+    return _PING_FRAME.pack(PING.size, VERSION, MSG_PING, seq & SEQ_MASK)
+
+
+def encode_pong(seq : int) -> bytes:
+    """Encode the answer to the ping with the given seq"""
+    return _PING_FRAME.pack(PONG.size, VERSION, MSG_PONG, seq & SEQ_MASK)
+
+
+def encode_ack(seq : int) -> bytes:
+    """Encode the acknowledgement of a remote control's inputs, up to the
+    one with the given seq"""
+    return _PING_FRAME.pack(ACK.size, VERSION, MSG_ACK, seq & SEQ_MASK)
+
+
+def decode(data : bytes) -> (int, tuple):
+    """Decode a datagram holding exactly one frame
+
+    Returns
+    -------
+
+    tuple(msg_type : int, fields : tuple)
+    """
+    if len(data) < HEADER.size: raise ProtocolError('truncated frame')
+    payload = _payload(*HEADER.unpack_from(data))
+    if len(data) != HEADER.size+payload.size:
+        raise ProtocolError('truncated frame')
+    return HEADER.unpack_from(data)[2], payload.unpack_from(data, HEADER.size)
+
+
+def decode_name(raw : bytes) -> str:
+    """Decode the name field of a HELLO frame"""
+    return raw.strip().decode(errors='replace')[:16]
+
+
+class FrameReader:
+    """Reads whole frames from a stream socket into a preallocated buffer.
+
+    TCP may split a frame across several reads or coalesce several frames in a
+    single read, so the header and payload are always read to completion with
+    recv_into before being decoded."""
+
+    def __init__(self, sock : socket.socket):
+        """Bind the reader to a connected socket"""
+        self.sock = sock
+        self.buf  = bytearray(MAX_FRAME)
+        self.view = memoryview(self.buf)
+
+
+    def _fill(self, start : int, end : int):
+        """Read bytes into buf[start:end], blocking until all of them arrive"""
+        while start < end:
+            n = self.sock.recv_into(self.view[start:end])
+            if not n: raise ConnectionError('peer closed the connection')
+            start += n
+
+
+    def read(self) -> (int, tuple):
+        """Read the next frame
+
+        Returns
+        -------
+
+        tuple(msg_type : int, fields : tuple)
+            the fields are in the order described in the module docstring
+        """
+        self._fill(0, HEADER.size)
+        length, version, msg_type = HEADER.unpack_from(self.buf)
+        payload = _payload(length, version, msg_type)
+
+        self._fill(HEADER.size, HEADER.size+length)
+        return msg_type, payload.unpack_from(self.buf, HEADER.size)
+
+
+    def expect(self, msg_type : int) -> tuple:
+        """Read the next frame, which must be of the given type"""
+        got, fields = self.read()
+        if got != msg_type:
+            raise ProtocolError('expected frame %d, got %d' % (msg_type, got))
+        return fields
+
+
+class FrameParser:
+    """Splits a byte stream into frames, for event-driven code (asyncio) that
+    is handed data in arbitrary chunks instead of reading from a socket"""
+
+    def __init__(self):
+        """Start with an empty buffer"""
+        self.buf = bytearray()
+
+
+    def feed(self, data : bytes) -> list:
+        """Append data to the buffer and decode every complete frame in it
+
+        Returns
+        -------
+
+        frames : list(tuple(msg_type : int, fields : tuple))
+        """
+        self.buf += data
+        frames, start, end = [], 0, len(self.buf)
+
+        while end-start >= HEADER.size:
+            length, version, msg_type = HEADER.unpack_from(self.buf, start)
+            payload = _payload(length, version, msg_type)
+
+            if end-start < HEADER.size+length: break
+            frames.append(
+                (msg_type, payload.unpack_from(self.buf, start+HEADER.size))
+            )
+            start += HEADER.size+length
+
+        del self.buf[:start]
+        return frames
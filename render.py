@@ -0,0 +1,175 @@
+"""Dirty-cell renderer: frames are composed off-screen from layers and only
+the cells that changed since the last frame are sent to the terminal.
+
+A frame is made of three layers, bottom to top: the static layer (arena and
+names, drawn once), the score layer (drawn again only when someone scores)
+and the frame itself (paddles, ball and overlays, drawn on every frame). The
+first two are cached together as the background each frame starts from.
+
+Changed cells go to a curses pad holding the whole frame, which is then
+copied to the screen. When the terminal is resized the pad is just copied
+again, clipped to the new size, with nothing drawn or composed again.
+
+Drawing code doesn't need to know about it: a Layer has the same addstr as a
+curses window, so Arena.draw, Player.draw and Ball.draw can draw on it.
+"""
+
+import curses
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+def cursor_move_bytes(y : int, x : int) -> int:
+    """Length of the escape sequence moving the cursor to (y, x), ESC[y;xH"""
+    return 4 + len(str(y+1)) + len(str(x+1))
+
+
+class Layer:
+    """A grid of characters that can be drawn on like a curses window"""
+
+    def __init__(self, height : int, width : int, fill : str = ' '):
+        """Create a layer filled with fill (None for a transparent layer, to
+        be laid on top of another)"""
+        self.height, self.width = height, width
+        self.fill = fill
+        self.rows = [[fill]*width for _ in range(height)]
+
+
+    def clear(self):
+        """Fill the whole layer again"""
+        for row in self.rows: row[:] = [self.fill]*self.width
+
+
+    def addstr(self, y : int, x : int, text : str):
+        """Write text at (y, x), clipped to the layer's width"""
+        end = min(x+len(text), self.width)
+        if 0 <= y < self.height and x < end:
+            self.rows[y][x:end] = text[:end-x]
+
+
+    def plot(self, ys : list, xs : list, char : str):
+        """Write char on every cell (ys[i], xs[i]), all inside the layer, at
+        once (for many small objects, see chaos.py)"""
+        rows = self.rows
+        for y, x in zip(ys, xs): rows[y][x] = char
+
+
+class Renderer:
+    """Composes frames on top of the cached static and score layers and
+    writes to the screen only the cells that differ from the previous frame"""
+
+    def __init__(
+        self,
+        screen : curses.window,
+        height : int,
+        width  : int,
+        pad    : curses.window = None
+    ):
+        """Renderer for the height x width area at the screen's top-left
+        corner. The screen is cleared, so that the renderer knows exactly
+        what's on it. Given a pad, frames are written to it and nothing
+        reaches the terminal (to render without one, see profiling.py)"""
+        self.screen = screen
+        self.height, self.width = height, width
+        self.static = Layer(height, width)
+        self.score  = Layer(height, width, None)
+        self.frame  = Layer(height, width)
+        self.shown  = Layer(height, width)
+
+        # Static and score layers composed, None until the next frame
+        self.background = None
+
+        # The whole frame, off-screen (one extra row and column, as curses
+        # can't write the bottom-right cell of a window)
+        self.terminal = pad is None
+        self.pad = curses.newpad(height+1, width+1) if pad is None else pad
+        self.screen_h, self.screen_w = screen.getmaxyx()
+
+        # Counters of the last frame and of the whole game
+        self.cells_written = 0
+        self.bytes_flushed = 0
+        self.total_cells   = 0
+        self.total_bytes   = 0
+        self.frames        = 0
+
+        # The screen itself is never drawn on, only the pad is copied to it
+        screen.erase()
+        screen.noutrefresh()
+
+
+    def invalidate(self):
+        """Compose the background again on the next frame, after drawing on
+        the static or the score layer"""
+        self.background = None
+
+
+    def begin(self) -> Layer:
+        """Start a new frame, with the static and score layers as its
+        background
+
+        Returns
+        -------
+
+        frame : Layer
+            layer where the dynamic elements of the frame must be drawn
+        """
+        if self.background is None:
+            self.background = [
+                [cell if cell is not None else under
+                 for under, cell in zip(static, score)]
+                for static, score in zip(self.static.rows, self.score.rows)
+            ]
+        self.frame.rows = [row[:] for row in self.background]
+        return self.frame
+
+
+    def show(self):
+        """Copy the pad to the screen, as much of it as fits"""
+        bottom = min(self.height, self.screen_h)-1
+        right  = min(self.width,  self.screen_w)-1
+        if bottom >= 0 and right >= 0:
+            self.pad.noutrefresh(0, 0, 0, 0, bottom, right)
+
+
+    def resize(self):
+        """Fit the frame to the terminal's new size (after a KEY_RESIZE):
+        the screen is cleared and the pad copied to it again"""
+        self.screen_h, self.screen_w = self.screen.getmaxyx()
+        self.screen.erase()
+        self.screen.noutrefresh()
+        self.show()
+        curses.doupdate()
+
+
+    def flush(self):
+        """Write the changed cells of the frame and update the terminal"""
+        cells = flushed = 0
+        addstr = self.pad.addstr
+
+        for y, (new, old) in enumerate(zip(self.frame.rows, self.shown.rows)):
+            if new == old: continue
+
+            # Write each run of changed cells with a single addstr
+            x, width = 0, len(new)
+            while x < width:
+                if new[x] == old[x]:
+                    x += 1
+                    continue
+                start = x
+                while x < width and new[x] != old[x]: x += 1
+                addstr(y, start, ''.join(new[start:x]))
+                old[start:x] = new[start:x]
+                cells   += x-start
+                flushed += x-start + cursor_move_bytes(y, start)
+
+        if self.terminal:
+            self.show()
+            curses.doupdate()
+
+        self.cells_written, self.bytes_flushed = cells, flushed
+        self.total_cells += cells
+        self.total_bytes += flushed
+        self.frames      += 1
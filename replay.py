@@ -0,0 +1,337 @@
+"""Match recordings: compact, append-only files that can be replayed from any
+tick.
+
+A recording starts with a header (format version, tick rate, seed and
+keyframe interval) followed by blocks of the same size, each one being a
+keyframe (the whole engine.State) and the actions of the next KEYFRAME_EVERY
+ticks, one byte per tick (player 1's action bits in the low nibble, player
+2's in the high one, see protocol.pack_action). A recording cut short, by a
+crash for instance, is still readable up to its last whole tick.
+
+Since blocks have a fixed size, the keyframe before any tick is found with
+a multiplication, and the state on that tick is re-simulated from there
+with engine.step. The file is memory-mapped, so only the blocks read are
+loaded.
+
+Watch a recording with `python3 spong.py replay file [--from tick]
+[--speed x]`, where x multiplies the recorded tick rate, or is `max` to
+re-simulate the whole match headless as fast as possible (which also checks
+every keyframe against the simulation, pointing out where a desync began).
+"""
+
+import sys
+import mmap
+import time
+import curses
+import struct
+
+import engine
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Format identification, bump the version whenever the layout changes
+MAGIC          = b'SPNG'
+FORMAT_VERSION = 2
+
+# Ticks between two keyframes
+KEYFRAME_EVERY = 256
+
+# File layouts: header (magic, format version, tick rate, seed, keyframe
+# interval) and keyframe (engine.State's fields, in order)
+HEADER   = struct.Struct('!4sBBIH')
+KEYFRAME = struct.Struct('!IBBHHHHhhI')
+
+# Both players' actions of every possible tick byte
+ACTIONS = tuple(
+    (protocol.unpack_action(b & 0x0F), protocol.unpack_action(b >> 4))
+    for b in range(256)
+)
+
+# Seconds skipped by the left/right arrows while watching
+SEEK_STEP = 5
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 spong.py replay file [--from tick] ' \
+              '[--speed x/max]'
+MSG_BAD     = 'Not a Spong recording: {}'
+MSG_EMPTY   = 'The recording holds no tick: {}'
+MSG_SUMMARY = '{} ticks re-simulated in {:.3f} s ({:.0f} ticks/s), ' \
+              'final score {} x {}'
+MSG_SYNCED  = 'Every keyframe matches the simulation'
+MSG_DESYNC  = 'Desync: the keyframe of tick {} differs from the simulation'
+
+
+class Recorder:
+    """Appends a match to a recording, tick by tick"""
+
+    def __init__(
+        self,
+        path           : str,
+        seed           : int,
+        tick_rate      : int,
+        keyframe_every : int = KEYFRAME_EVERY
+    ):
+        """Create the recording file and write its header"""
+        self.file           = open(path, 'wb')
+        self.keyframe_every = keyframe_every
+        self.flush_every    = tick_rate
+        self.ticks          = 0
+        self.file.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, tick_rate, seed, keyframe_every
+        ))
+
+
+    def record(
+        self,
+        state     : engine.State,
+        p1_action : str or None,
+        p2_action : str or None
+    ):
+        """Record the actions both players took on state (the state before
+        the tick is stepped)"""
+        # Once a second, whatever was recorded so far reaches the disk, in
+        # case the game never gets to close the file
+        if self.ticks % self.flush_every == 0: self.file.flush()
+
+        if self.ticks % self.keyframe_every == 0:
+            self.file.write(KEYFRAME.pack(*state))
+
+        self.file.write(bytes((
+            protocol.pack_action(p1_action)
+            | protocol.pack_action(p2_action) << 4,
+        )))
+        self.ticks += 1
+
+
+    def close(self):
+        """Write what's left and close the file"""
+        self.file.close()
+
+
+class Replay:
+    """A memory-mapped recording"""
+
+    def __init__(self, path : str):
+        """Open the recording, raising ValueError if it isn't one"""
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.map) < HEADER.size:
+            raise ValueError(MSG_BAD.format(path))
+        magic, version, self.tick_rate, self.seed, self.keyframe_every = \
+            HEADER.unpack_from(self.map)
+        if (magic != MAGIC or version != FORMAT_VERSION
+            or self.keyframe_every == 0):
+            raise ValueError(MSG_BAD.format(path))
+
+        # The recorder quit before the first tick (seek needs a keyframe)
+        if len(self.map) < HEADER.size+KEYFRAME.size:
+            raise ValueError(MSG_EMPTY.format(path))
+
+        self.rules = engine.make_rules(self.tick_rate)
+        self.block = KEYFRAME.size+self.keyframe_every
+
+        # Only whole ticks count, the last block may be incomplete
+        blocks, rest = divmod(len(self.map)-HEADER.size, self.block)
+        self.ticks = (
+            blocks*self.keyframe_every + max(rest-KEYFRAME.size, 0)
+        )
+
+
+    def keyframe(self, block : int) -> engine.State:
+        """State at the start of the given block"""
+        return engine.State._make(KEYFRAME.unpack_from(
+            self.map, HEADER.size + block*self.block
+        ))
+
+
+    def actions(self, start : int, stop : int) -> iter:
+        """Yield (p1_action, p2_action) of every tick from start to stop,
+        skipping the keyframes between them"""
+        every = self.keyframe_every
+        while start < stop:
+            block, first = divmod(start, every)
+            offset = HEADER.size + block*self.block + KEYFRAME.size
+            last = min(every, first+stop-start)
+            for b in self.map[offset+first:offset+last]: yield ACTIONS[b]
+            start += last-first
+
+
+    def seek(self, tick : int) -> engine.State:
+        """State on the given tick (before it's stepped), re-simulated from
+        the keyframe before it"""
+        tick = max(0, min(tick, self.ticks))
+        block = tick//self.keyframe_every
+
+        # The recording may end right on a block boundary, with no keyframe
+        keyframe_end = HEADER.size + block*self.block + KEYFRAME.size
+        if block and keyframe_end > len(self.map): block -= 1
+
+        state, step, rules = self.keyframe(block), engine.step, self.rules
+        for p1_action, p2_action in self.actions(
+            block*self.keyframe_every, tick
+        ):
+            state = step(state, p1_action, p2_action, rules)
+        return state
+
+
+    def states(self, start : int = 0) -> iter:
+        """Yield the state of every tick from start to the end, the last one
+        being the state after the match's last tick"""
+        state, step, rules = self.seek(start), engine.step, self.rules
+        yield state
+        for p1_action, p2_action in self.actions(start, self.ticks):
+            state = step(state, p1_action, p2_action, rules)
+            yield state
+
+
+    def verify(self) -> int or None:
+        """Re-simulate the whole match, comparing every keyframe with the
+        simulation
+
+        Returns
+        -------
+
+        tick : int or None
+            tick of the first keyframe that differs from the simulation, or
+            None if they all match
+        """
+        every = self.keyframe_every
+        for tick, state in enumerate(self.states()):
+            if (tick % every == 0 and tick < self.ticks
+                and state != self.keyframe(tick//every)):
+                return tick
+        return None
+
+
+    def close(self):
+        """Unmap the file"""
+        self.map.close()
+
+
+def play(scr : curses.window, replay : Replay, start : int, speed : float):
+    """Watch the recording on the terminal, from the start tick, at speed
+    times the recorded tick rate. Space pauses, the left/right arrows seek
+    and q quits"""
+    # The drawing code is the game's own
+    from spong import Arena, Player, Ball, sync, draw_score, SCR_H, SCR_W
+    from clock import Clock, RENDER_RATE
+    import render
+
+    curses.curs_set(0)
+    scr.nodelay(1)
+
+    arena   = Arena(0, 1, SCR_W, SCR_H)
+    player1 = Player('left', arena)
+    player2 = Player('right', arena)
+    ball    = Ball(arena.bound_x//2, arena.bound_y//2, 0, 0)
+
+    renderer = render.Renderer(scr, SCR_H+2, SCR_W+2)
+    arena.draw(renderer.static)
+
+    # Enough ticks per frame to keep up with any speed
+    rate  = replay.tick_rate*speed
+    clock = Clock(rate, max_catch_up=int(rate/RENDER_RATE)+2)
+
+    tick, paused, score = start, False, None
+    state, step, rules = replay.seek(tick), engine.step, replay.rules
+    actions = replay.actions(tick, replay.ticks)
+
+    while True:
+        # Playback controls
+        key = scr.getch()
+        if key in (ord('q'), ord('Q')): break
+        elif key == ord(' '): paused = not paused
+        elif key == curses.KEY_RESIZE: renderer.resize()
+        elif key in (curses.KEY_LEFT, curses.KEY_RIGHT):
+            seconds = SEEK_STEP if key == curses.KEY_RIGHT else -SEEK_STEP
+            tick = max(0, min(tick+seconds*replay.tick_rate, replay.ticks))
+            state = replay.seek(tick)
+            actions = replay.actions(tick, replay.ticks)
+
+        # Run the ticks that are due, until the end of the recording
+        for _ in range(clock.ticks_due()):
+            if paused or tick >= replay.ticks: break
+            p1_action, p2_action = next(actions)
+            state = step(state, p1_action, p2_action, rules)
+            tick += 1
+
+        sync(state, player1, player2, ball)
+        if clock.render_due():
+            if (player1.score, player2.score) != score:
+                score = (player1.score, player2.score)
+                draw_score(renderer.score, score)
+                renderer.invalidate()
+            frame = renderer.begin()
+            frame.addstr(0, 0, '%d/%d' % (tick, replay.ticks))
+            if paused: frame.addstr(0, SCR_W-5, 'PAUSE')
+            player1.draw(frame, arena)
+            player2.draw(frame, arena)
+            ball.draw(frame)
+            renderer.flush()
+
+        clock.wait()
+
+
+def run_headless(replay : Replay):
+    """Re-simulate the whole recording as fast as possible, then check it
+    against its keyframes"""
+    start = time.perf_counter()
+    desync = replay.verify()
+    elapsed = time.perf_counter()-start
+
+    state = replay.seek(replay.ticks)
+    print(MSG_SUMMARY.format(
+        replay.ticks, elapsed, replay.ticks/max(elapsed, 1e-9),
+        state.p1_score, state.p2_score
+    ))
+    print(MSG_SYNCED if desync is None else MSG_DESYNC.format(desync))
+
+
+def get_args() -> (str, int, float or None):
+    """Parse `replay file [--from tick] [--speed x/max]`, exiting on bad
+    arguments
+
+    Returns
+    -------
+
+    tuple(path : str, start : int, speed : float or None)
+        speed is None for a headless replay at maximum speed
+    """
+    args = sys.argv[2:]
+    if len(args) % 2 == 0: sys.exit(MSG_USAGE)
+
+    start, speed = 0, 1.0
+    for name, value in zip(args[1::2], args[2::2]):
+        try:
+            if name == '--from':
+                start = int(value)
+            elif name == '--speed':
+                speed = None if value == 'max' else float(value)
+                if speed is not None and speed <= 0: raise ValueError
+            else:
+                raise ValueError
+        except ValueError:
+            sys.exit(MSG_USAGE)
+
+    return args[0], start, speed
+
+
+def main():
+    path, start, speed = get_args()
+    try:
+        replay = Replay(path)
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+
+    if speed is None: run_headless(replay)
+    else            : curses.wrapper(play, replay, start, speed)
+    replay.close()
+
+
+if __name__ == '__main__':
+    main()
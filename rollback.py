@@ -0,0 +1,145 @@
+"""Rollback netcode, for games played with `--net rollback`.
+
+Neither peer waits for the other: both send their input for every tick over
+TCP and simulate both paddles right away, predicting that the peer keeps
+doing what it did last. When the peer's input for a tick arrives and differs
+from the prediction, the state saved at that tick is restored and every tick
+since is simulated again with the real input. Lag no longer delays your own
+paddle: at worst the other one jumps a little when a prediction was wrong.
+
+engine.State is an immutable tuple, so saving a state is keeping a reference
+to it. A ring buffer holds the states and inputs of the last few ticks, and a
+peer only runs ahead of the newest input it got from the other by WINDOW
+ticks, so at most WINDOW ticks are ever simulated again at once.
+"""
+
+import engine
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Ticks a peer may predict ahead of the other's newest input before waiting
+# for it (12 ticks are 0.4 s at 30 Hz)
+WINDOW = 12
+
+
+class Rollback:
+    """Both paddles simulated from our inputs and the peer's (predicted
+    until they arrive)"""
+
+    def __init__(
+        self,
+        state  : engine.State,
+        first  : bool,
+        rules  : engine.Rules = engine.RULES,
+        window : int = WINDOW
+    ):
+        """Start from state, our paddle being player 1's if first"""
+        self.state  = state
+        self.first  = first
+        self.rules  = rules
+        self.window = window
+
+        # Ring buffers indexed by tick: state at the start of the tick, our
+        # action on it, the peer's action used for it and the peer's real
+        # one, if it arrived (as a (tick, action) pair). The peer's inputs can
+        # be up to WINDOW ticks ahead, the states needed WINDOW ticks behind
+        self.size   = 2*window+2
+        self.states = [None]*self.size
+        self.local  = [None]*self.size
+        self.used   = [None]*self.size
+        self.remote = [None]*self.size
+
+        # Peer's newest action (the prediction) and its tick, the oldest
+        # tick predicted wrong, and the next tick to hand out as settled
+        # (both actions known)
+        self.last      = None
+        self.confirmed = state.tick-1
+        self.wrong     = None
+        self.settled   = state.tick
+
+        # Rollbacks done and ticks simulated again
+        self.rollbacks   = 0
+        self.resimulated = 0
+
+
+    def _step(self, state : engine.State, local, remote) -> engine.State:
+        """One tick, with our action and the peer's"""
+        if self.first: return engine.step(state, local, remote, self.rules)
+        return engine.step(state, remote, local, self.rules)
+
+
+    def _remote(self, tick : int) -> str or None:
+        """Peer's action on a tick: the real one, or the prediction"""
+        known = self.remote[tick % self.size]
+        if known is not None and known[0] == tick: return known[1]
+        return self.last
+
+
+    def can_advance(self) -> bool:
+        """Whether the next tick is within WINDOW ticks of the peer's newest
+        input"""
+        return self.state.tick-self.confirmed <= self.window
+
+
+    def advance(self, action : str or None) -> engine.State:
+        """Simulate the next tick with our action and the peer's (predicted
+        if it hasn't arrived)"""
+        tick, i = self.state.tick, self.state.tick % self.size
+        remote = self._remote(tick)
+        self.states[i], self.local[i] = self.state, action
+        self.used[i] = remote
+        self.state = self._step(self.state, action, remote)
+        return self.state
+
+
+    def receive(self, tick : int, action : str or None):
+        """Take the peer's action on a tick (they arrive in order)"""
+        self.remote[tick % self.size] = (tick, action)
+        self.confirmed, self.last = tick, action
+
+        # Already simulated with another action
+        if (tick < self.state.tick and self.used[tick % self.size] != action
+            and (self.wrong is None or tick < self.wrong)):
+            self.wrong = tick
+
+
+    def reconcile(self) -> engine.State:
+        """Simulate again every tick since the oldest one predicted wrong
+        (at most WINDOW ticks)
+
+        Returns
+        -------
+
+        state : engine.State
+            the current state, corrected
+        """
+        if self.wrong is None: return self.state
+
+        size, step = self.size, self._step
+        state = self.states[self.wrong % size]
+        for tick in range(self.wrong, self.state.tick):
+            i = tick % size
+            remote = self._remote(tick)
+            self.states[i], self.used[i] = state, remote
+            state = step(state, self.local[i], remote)
+
+        self.rollbacks   += 1
+        self.resimulated += self.state.tick-self.wrong
+        self.state, self.wrong = state, None
+        return state
+
+
+    def settle(self) -> iter:
+        """Yield (state, p1_action, p2_action) for every tick that can't
+        change any more (both actions known) not yielded yet, oldest first.
+        Call it after reconcile"""
+        last = min(self.confirmed, self.state.tick-1)
+        while self.settled <= last:
+            i = self.settled % self.size
+            local, remote = self.local[i], self.used[i]
+            if self.first: yield self.states[i], local, remote
+            else         : yield self.states[i], remote, local
+            self.settled += 1
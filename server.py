@@ -0,0 +1,382 @@
+"""Headless dedicated server, hosting many Spong matches at once.
+
+Run it with `python3 spong.py serve ip port [--tick 30/60/120] [--record
+directory]`, the latter recording every match (see replay.py). Players join
+it just like they join a host (`python3 spong.py join ...` or a remote
+control) and are paired in rooms as they arrive. All the rooms are simulated
+on the same event loop tick, without a thread per connection. Every client
+has its own write buffer limit: frames are dropped for a client that can't
+keep up, instead of stalling the other rooms.
+
+Spectators (see broadcast.py) watch the oldest room, or the next one to
+start. They're sent the very same frame as the room's players. Remote
+controls (see protocol.py) are sent no frame at all, but an ACK now and then.
+"""
+
+import os
+import sys
+import time
+import asyncio
+import socket
+from random import getrandbits
+from collections import deque
+
+import engine
+import replay
+import protocol
+import transport
+from clock import Clock
+from engine import TICK_RATES, BASE_TICK_RATE
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 spong.py serve ip port [--tick 30/60/120] ' \
+              '[--record directory]'
+MSG_SERVING = 'Serving Spong on {}:{} at {} Hz (Ctrl+C to stop)'
+
+# Bytes waiting in a client's write buffer above which its frames are dropped
+HIGH_WATER = 4096
+
+# Seconds a client may go without taking any frame before being disconnected
+STALL_TIMEOUT = 5
+
+# Recording file of each match, in the --record directory
+RECORDING_NAME = 'match-{}-{}.rec'
+
+
+class Client(asyncio.Protocol):
+    """A player's connection. Decodes its frames as they arrive and queues
+    its inputs, one of which every tick of the room consumes, in order (a
+    remote control's action is held until it sends another)"""
+
+    def __init__(self, server):
+        """Bind the connection to the server that will pair it"""
+        self.server       = server
+        self.parser       = protocol.FrameParser()
+        self.transport    = None
+        self.name         = None
+        self.room         = None
+        self.inputs       = deque(maxlen=transport.MAX_QUEUED)
+        self.applied      = 0
+        self.paused_since = None
+        self.dropped      = 0
+        self.watching     = False
+        self.controller   = None
+
+
+    def connection_made(self, transport : asyncio.Transport):
+        """Set the write buffer limits that trigger pause_writing"""
+        self.transport = transport
+        transport.set_write_buffer_limits(high=HIGH_WATER)
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+    def data_received(self, data : bytes):
+        """Handle the handshake, the player's inputs and pings"""
+        try:
+            frames = self.parser.feed(data)
+        except protocol.ProtocolError:
+            self.transport.abort()
+            return
+
+        for msg_type, fields in frames:
+            if msg_type == protocol.MSG_HELLO and self.name is None:
+                self.identify(protocol.decode_name(fields[0]), fields[1])
+                if fields[1] == protocol.SIDE_SPECTATOR:
+                    self.server.watch(self)
+                else:
+                    self.server.enqueue(self)
+            elif msg_type == protocol.MSG_PING:
+                self.transport.write(protocol.encode_pong(fields[0]))
+            elif msg_type == protocol.MSG_INPUT:
+                action = protocol.unpack_action(fields[1])
+                if action == 'quit':
+                    self.transport.close()
+                elif self.controller is not None:
+                    self.controller.change(*fields)
+                else:
+                    # Should the queue overflow (the client's clock runs
+                    # faster), its oldest inputs are never applied, which
+                    # the client finds out from the sequence numbers
+                    self.inputs.append((fields[0], action))
+
+
+    def identify(self, name : str, side : int):
+        """Take the name and the side sent in the client's HELLO"""
+        self.name = name
+        if side == protocol.SIDE_CONTROLLER:
+            self.controller = transport.HeldInput()
+
+
+    def connection_lost(self, exc : Exception or None):
+        """Leave the waiting queue, stop watching or end the room"""
+        self.server.drop(self)
+
+
+    def pause_writing(self):
+        """The write buffer is over HIGH_WATER, stop sending to this client"""
+        self.paused_since = asyncio.get_event_loop().time()
+
+
+    def resume_writing(self):
+        """The write buffer drained, frames can be sent again"""
+        self.paused_since = None
+
+
+    def take(self, moves : bool = True) -> str or None:
+        """Action for this tick: the oldest input not applied yet (None if
+        there's none), or the remote control's held action if its paddle
+        moves on this tick (see engine.paddle_moves)"""
+        if self.controller is not None: return self.controller.take(moves)
+        if not self.inputs: return None
+        self.applied, action = self.inputs.popleft()
+        return action
+
+
+    def send(self, frame : bytes):
+        """Send a frame, unless the client can't keep up (each state frame
+        holds the whole state, so a dropped frame is never needed later)"""
+        if self.paused_since is None:
+            self.transport.write(frame)
+        else:
+            self.dropped += 1
+
+
+class Room:
+    """A match between two clients, simulated by the server"""
+
+    def __init__(
+        self,
+        left   : Client,
+        right  : Client,
+        number : int,
+        rules  : engine.Rules = engine.RULES
+    ):
+        """Start a new match between the two clients, served by the rules
+        (the server gives it a recorder when matches are recorded)"""
+        self.clients    = (left, right)
+        self.number     = number
+        self.seed       = getrandbits(31)
+        self.state      = engine.new_state(self.seed, rules)
+        self.recorder   = None
+        self.spectators = []
+        left.room = right.room = self
+
+
+    def add_spectator(self, client : Client, tick_rate : int):
+        """Let the client watch, sending it both players' names"""
+        left, right = self.clients
+        client.room = self
+        client.send(protocol.encode_hello(
+            left.name, protocol.SIDE_LEFT, tick_rate
+        ))
+        client.send(protocol.encode_hello(
+            right.name, protocol.SIDE_RIGHT, tick_rate
+        ))
+        self.spectators.append(client)
+
+
+    def step(self, rules : engine.Rules):
+        """Advance the match by one tick and send the new state to both
+        clients, with the last input of theirs applied, and every spectator
+        (encoded once for all of them)"""
+        left, right = self.clients
+        moves = engine.paddle_moves(self.state.tick, rules)
+        left_action, right_action = left.take(moves), right.take(moves)
+        if self.recorder is not None:
+            self.recorder.record(self.state, left_action, right_action)
+        state = self.state = engine.step(
+            self.state, left_action, right_action, rules
+        )
+
+        for client in self.clients:
+            if client.controller is None:
+                client.send(protocol.encode_state(
+                    state.tick, None, state[5:9], state.p1_y, state.p2_y,
+                    state.p1_score, state.p2_score, client.applied
+                ))
+        if self.spectators:
+            frame = protocol.encode_state(
+                state.tick, None, state[5:9], state.p1_y, state.p2_y,
+                state.p1_score, state.p2_score
+            )
+            for spectator in self.spectators: spectator.send(frame)
+
+
+    def ack(self):
+        """Let the remote controls know which of their inputs arrived"""
+        for client in self.clients:
+            if client.controller is not None:
+                client.send(protocol.encode_ack(client.controller.seq))
+
+
+    def close(self):
+        """End the match, disconnecting both clients and the spectators"""
+        if self.recorder is not None: self.recorder.close()
+        for client in self.clients+tuple(self.spectators):
+            client.room = None
+            client.transport.close()
+
+
+class Server:
+    """Pairs clients in rooms and runs the shared simulation tick"""
+
+    def __init__(self, tick_rate : int, record : str = None):
+        """Start with no rooms and nobody waiting. Matches are recorded in
+        the record directory, if given"""
+        self.tick_rate = tick_rate
+        self.rules     = engine.make_rules(tick_rate)
+        self.record    = record
+        self.rooms     = set()
+        self.waiting   = None
+        self.watchers  = []
+        self.matches   = 0
+
+
+    def enqueue(self, client : Client):
+        """Pair the client with the one waiting, or make it wait"""
+        if self.waiting is None:
+            self.waiting = client
+            return
+
+        left, self.waiting = self.waiting, None
+        self.start(left, client)
+
+
+    def start(self, left : Client, right : Client, number : int = None):
+        """Start a match between two clients, numbered after the previous
+        one unless a number is given"""
+        self.matches += 1
+        room = Room(left, right, number or self.matches, self.rules)
+        self.rooms.add(room)
+        if self.record is not None:
+            room.recorder = replay.Recorder(
+                os.path.join(self.record, RECORDING_NAME.format(
+                    int(time.time()), room.number
+                )),
+                room.seed, self.tick_rate
+            )
+
+        left.send(protocol.encode_hello(
+            right.name, protocol.SIDE_LEFT, self.tick_rate
+        ))
+        right.send(protocol.encode_hello(
+            left.name, protocol.SIDE_RIGHT, self.tick_rate
+        ))
+
+        # Those waiting to watch get this match
+        for watcher in self.watchers:
+            room.add_spectator(watcher, self.tick_rate)
+        self.watchers = []
+
+
+    def watch(self, client : Client):
+        """Make the client watch the oldest match, or the next one to start"""
+        client.watching = True
+        if self.rooms:
+            room = min(self.rooms, key=lambda room: room.number)
+            room.add_spectator(client, self.tick_rate)
+        else:
+            self.watchers.append(client)
+
+
+    def drop(self, client : Client):
+        """Forget a disconnected client, ending its room (unless it was only
+        watching)"""
+        if self.waiting is client: self.waiting = None
+
+        if client.watching:
+            if client in self.watchers: self.watchers.remove(client)
+            if client.room is not None: client.room.spectators.remove(client)
+            return
+
+        room = client.room
+        if room is not None:
+            self.rooms.discard(room)
+            room.close()
+
+
+    def reap(self, now : float):
+        """Disconnect the clients that stalled for too long"""
+        for room in list(self.rooms):
+            for client in room.clients+tuple(room.spectators):
+                if (client.paused_since is not None
+                    and now-client.paused_since > STALL_TIMEOUT):
+                    client.transport.abort()
+
+
+    async def run(self):
+        """Simulate every room on a fixed tick, forever"""
+        loop  = asyncio.get_running_loop()
+        clock, rules = Clock(self.tick_rate), self.rules
+        next_ack = loop.time()
+
+        while True:
+            for _ in range(clock.ticks_due()):
+                for room in list(self.rooms): room.step(rules)
+
+            if loop.time() >= next_ack:
+                next_ack = loop.time()+protocol.ACK_INTERVAL
+                for room in self.rooms: room.ack()
+
+            self.reap(loop.time())
+            await asyncio.sleep(max(clock.next_tick_in(), 0))
+
+
+async def serve(ip : str, port : int, tick_rate : int, record : str = None):
+    """Accept connections on (ip, port) and run the matches"""
+    server = Server(tick_rate, record)
+    loop   = asyncio.get_running_loop()
+
+    listener = await loop.create_server(
+        lambda: Client(server), ip, port, reuse_address=True, backlog=128
+    )
+    print(MSG_SERVING.format(ip, port, tick_rate))
+
+    async with listener:
+        await server.run()
+
+
+def get_args() -> (str, int, int, str or None):
+    """Parse `serve ip port [--tick 30/60/120] [--record directory]`,
+    exiting on bad arguments
+
+    Returns
+    -------
+
+    tuple(ip : str, port : int, tick_rate : int, record : str or None)
+    """
+    args = sys.argv[2:]
+    tick_rate, record = BASE_TICK_RATE, None
+
+    if len(args) < 2 or len(args) % 2 or not args[1].isdigit():
+        sys.exit(MSG_USAGE)
+
+    # Optional arguments, given as "--name value" pairs
+    for name, value in zip(args[2::2], args[3::2]):
+        if name == '--tick' and value.isdigit() and int(value) in TICK_RATES:
+            tick_rate = int(value)
+        elif name == '--record' and os.path.isdir(value):
+            record = value
+        else:
+            sys.exit(MSG_USAGE)
+
+    return args[0], int(args[1]), tick_rate, record
+
+
+def main():
+    ip, port, tick_rate, record = get_args()
+    try:
+        asyncio.run(serve(ip, port, tick_rate, record))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
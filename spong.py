@@ -1,33 +1,52 @@
 #! /bin/python3
 
 import sys
+import time
+import atexit
 import socket
 import curses
-import pickle
-from random import choice
-
-try:
-    from AI import AI
-    AI_AVAILABLE = True
-except:
-    AI_AVAILABLE = False
+import selectors
+from copy import copy
+from collections import deque
+from random import getrandbits
+
+import agents
+import engine
+import broadcast
+import render
+import protocol
+import replay
+import rollback
+import profiling
+import transport
+from stats import Stats
+from clock import Clock, INPUT_RATE
+from engine import SCR_H, SCR_W, TICK_RATES, BASE_TICK_RATE
 
 __author__ = 'Felipe V. Calderan'
 __copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
 __license__ = 'BSD 3-Clause "New" or "Revised" License'
 __version__ = '1.0'
 
-# Arena config variables
-SCR_H = 18
-SCR_W = 78
+# Seconds between two full states sent by the host, even with no event
+KEYFRAME_INTERVAL = 2
+
+# Seconds the peer's data can be late before the game shows it's lagging
+LAG_AFTER = 0.25
 
 # Message variables
 MSG_SCR_SMALL = 'Terminal screen is too small (80x20 required)'
-MSG_ARG_WRONG = 'Usage: python3 spong.py host/join ip port player_name'
+MSG_ARG_WRONG = 'Usage: python3 spong.py host/join/watch ip port name ' \
+                '[options] (see README)'
 MSG_CANT_HOST = 'Could not open the server on this IP/port'
 MSG_CANT_JOIN = 'Could not join the game on this IP/port'
 MSG_WAITING   = 'Waiting for another player... (Ctrl+C to cancel)'
+MSG_CANT_REC  = 'Could not create the recording file'
+MSG_CANT_AI   = 'Could not load the AI controller {}'
 MSG_DISCONN   = '----------Disconnected----------'
+MSG_NET_DIFF  = 'The other end plays with another --net mode'
+MSG_LAGGING   = 'lagging'
+MSG_RECONN    = 'rejoining'
 
 
 class Arena:
@@ -64,7 +83,8 @@ class Arena:
 
 
 class Player:
-    """Deals with players position, score and drawing"""
+    """Deals with players position, score and drawing (the game rules are in
+    engine.py)"""
 
     def __init__(self, side : str, arena : Arena):
         """Define player position based on if it's player 1 or player 2"""
@@ -73,17 +93,6 @@ class Player:
         self.score = 0
 
 
-    def goal(self):
-        """Player scored a point"""
-        self.score += 1
-
-
-    def move(self, direction : str):
-        """Move player up or down"""
-        if direction == 'up': self.y -= 1
-        else                : self.y += 1
-
-
     def draw(self, screen : curses.window, arena : Arena):
         """Draw player on the screen's defined y position"""
         # clear player's row
@@ -97,7 +106,8 @@ class Player:
 
 
 class Ball:
-    """Deals with balls's collisions, goals, position and velocity"""
+    """Deals with balls's position, velocity and drawing (collisions and goals
+    are in engine.py)"""
 
     def __init__(self, x : int, y : int, vx : int, vy : int):
         """Define ball position and initial velocity"""
@@ -106,50 +116,15 @@ class Ball:
         self.vx,    self.vy    = vx, vy
 
 
-    def move(self, player1 : Player, player2 : Player, arena : Arena) -> int:
-        """Move ball given its pos, velocity, collision and check for goals"""
-        goal = 0
-
-        # Check for map borders
-        if self.y + self.vy > arena.bound_y-1 or self.y + self.vy < arena.y+1:
-            self.vy *= -1
-
-        if self.x == arena.x+1 or self.x == arena.bound_x-1:
-            if self.x == arena.bound_x-1: player1.goal()
-            else                        : player2.goal()
-            self.old_x, self.old_y = self.x, self.y
-            self.x = arena.bound_x//2+arena.x//2
-            self.y = arena.bound_y//2+arena.y//2
-            self.vx, self.vy = choice((-1, 1)), choice((-1, 0, 1))
-            return
-
-        # Check for player hit
-        if self.x == player1.x+1:
-            if   self.y == player1.y  : self.vx, self.vy = (1, 0)
-            elif self.y == player1.y-1: self.vx, self.vy = (1,-1)
-            elif self.y == player1.y+1: self.vx, self.vy = (1, 1)
-            elif self.y == player1.y-2 and self.vy == 1: self.vx,self.vy=(1,-1)
-            elif self.y == player1.y+2 and self.vy ==-1: self.vx,self.vy=(1, 1)
-
-        if self.x == player2.x-1:
-            if   self.y == player2.y  : self.vx, self.vy = (-1,  0)
-            elif self.y == player2.y-1: self.vx, self.vy = (-1, -1)
-            elif self.y == player2.y+1: self.vx, self.vy = (-1,  1)
-            elif self.y == player2.y-2 and self.vy== 1: self.vx,self.vy=(-1,-1)
-            elif self.y == player2.y+2 and self.vy==-1: self.vx,self.vy=(-1, 1)
-
-        # Set the new ball position (and old position)
-        self.old_x, self.old_y = self.x, self.y
-        self.x,     self.y     = self.x + self.vx, self.y + self.vy
-
-
     def draw(self, screen : curses.window):
         """(Re)draw the ball"""
-        # Erase the ball from the old position
+        # Erase the ball from where it was last drawn (the ball may have moved
+        # more than once since then)
         screen.addstr(self.old_y, self.old_x, ' ')
 
         # Draw the ball on the new position
         screen.addstr(self.y, self.x, 'O')
+        self.old_x, self.old_y = self.x, self.y
 
 
     def upload(self) -> (int, int, int, int):
@@ -170,6 +145,18 @@ class Ball:
         self.x, self.y, self.vx, self.vy = info
 
 
+def sync(
+    state   : engine.State,
+    player1 : Player,
+    player2 : Player,
+    ball    : Ball
+):
+    """Update players and ball (what is drawn) from the simulation state"""
+    player1.y, player1.score = state.p1_y, state.p1_score
+    player2.y, player2.score = state.p2_y, state.p2_score
+    ball.download(engine.ball(state))
+
+
 def show_msg(
     screen        : curses.window,
     screen_height : int,
@@ -187,28 +174,73 @@ def get_args(
     screen        : curses.window,
     screen_height : int,
     screen_width  : int
-) -> (str, str, int, str):
+) -> (str, str, int, str, dict):
     """Verify if the arguments are correctly formatted, if they are, return
     them type-casted and further formatted for convenience
 
     Returns
     -------
 
-    tuple(mode : str, ip : str, port : int, name : str)
+    tuple(mode : str, ip : str, port : int, name : str, options : dict)
+        options holds the optional arguments ('tick' : int, 'net' : str,
+        'record' : str or None, 'deadline' : float, in seconds,
+        'stats' : str or None, 'profile' : str or None, 'profiler' : str,
+        'ai' : str or None)
     """
     # Wrong number of arguments
-    if len(sys.argv) != 5:
+    if len(sys.argv) < 5 or len(sys.argv) % 2 == 0:
         show_msg(screen, screen_height, screen_width, MSG_ARG_WRONG)
 
-    # Invalid mode (only host/join permitted)
-    if sys.argv[1].lower() not in ('host', 'join'):
+    # Invalid mode (only host/join/watch permitted)
+    if sys.argv[1].lower() not in ('host', 'join', 'watch'):
         show_msg(screen, screen_height, screen_width, MSG_ARG_WRONG)
 
     # Invalid port type
     if not sys.argv[3].isdigit():
         show_msg(screen, screen_height, screen_width, MSG_ARG_WRONG)
 
-    return sys.argv[1].lower(), sys.argv[2], int(sys.argv[3]), sys.argv[4][:16]
+    # Optional arguments, given as "--name value" pairs
+    options = {
+        'tick' : BASE_TICK_RATE, 'net' : 'tcp', 'record' : None,
+        'deadline' : agents.DEADLINE, 'stats' : None, 'profile' : None,
+        'profiler' : 'sample', 'ai' : None
+    }
+    for name, value in zip(sys.argv[5::2], sys.argv[6::2]):
+        if name == '--tick' and value.isdigit() and int(value) in TICK_RATES:
+            options['tick'] = int(value)
+        elif (name == '--net' and value.lower() in ('tcp', 'udp', 'rollback')
+              and sys.argv[1].lower() != 'watch'):
+            options['net'] = value.lower()
+        elif name == '--record' and sys.argv[1].lower() == 'host':
+            options['record'] = value
+        elif name == '--deadline' and value.isdigit():
+            options['deadline'] = int(value)/1000
+        elif name == '--stats':
+            options['stats'] = value
+        elif name == '--profile':
+            options['profile'] = value
+        elif name == '--profiler' and value in profiling.PROFILERS:
+            options['profiler'] = value
+        elif name == '--ai' and sys.argv[1].lower() != 'watch':
+            try:
+                agents.validate(value)
+            except ValueError:
+                show_msg(screen, screen_height, screen_width, MSG_ARG_WRONG)
+            options['ai'] = value
+        else:
+            show_msg(screen, screen_height, screen_width, MSG_ARG_WRONG)
+
+    return (
+        sys.argv[1].lower(), sys.argv[2], int(sys.argv[3]), sys.argv[4][:16],
+        options
+    )
+
+
+def draw_score(layer : render.Layer, score : tuple):
+    """Draw the game score (both players' points) on a cleared layer"""
+    layer.clear()
+    layer.addstr(0, SCR_W//2-6, str(score[0]))
+    layer.addstr(0, SCR_W//2+6, str(score[1]))
 
 
 def get_action(
@@ -217,10 +249,12 @@ def get_action(
     player      : Player,
     keys        : dict,
     is_AI       : bool,
-    game_status : dict
+    game_status : dict,
+    ai          : agents.AIWorker = None
 ) -> str or None:
     """Get player's action. The purpuse of this function is to be a wrapper,
-    for convenience if one day another kind of control is to be implemented
+    for convenience if one day another kind of control is to be implemented.
+    Every key pressed since the last call is consumed, the last one wins
 
     Parameters
     ----------
@@ -235,6 +269,9 @@ def get_action(
     game_status : dict
         dictionary containing players y position and ball position & velocity.
         Useful to create an AI, for exemple.
+    ai          : agents.AIWorker
+        worker running the AI, which gets a copy of the player (the AI runs
+        on its own thread)
 
     Returns
     -------
@@ -244,16 +281,21 @@ def get_action(
     action : None
         if no action (or invalid action) is taken
     """
-    if is_AI and AI_AVAILABLE:
-        return AI(screen, arena, player, keys, is_AI, game_status)
+    if is_AI and ai is not None:
+        return ai.act(screen, arena, copy(player), keys, is_AI, game_status)
     else:
+        action = None
         key = screen.getch()
 
-        if key in keys['up_key']     : return 'up'
-        elif key in keys['down_key'] : return 'down'
-        elif key in keys['quit_key'] : return 'quit'
+        while key != -1:
+            if key in keys['up_key']     : action = 'up'
+            elif key in keys['down_key'] : action = 'down'
+            elif key in keys['stats_key']: action = 'stats'
+            elif key in keys['quit_key'] : return 'quit'
+            elif key == curses.KEY_RESIZE: return 'resize'
+            key = screen.getch()
 
-        return None
+        return action
 
 
 def main(scr : curses.window):
@@ -265,18 +307,39 @@ def main(scr : curses.window):
     if sh < SCR_H+2 or sw < SCR_W+2: show_msg(scr, sh, sw, MSG_SCR_SMALL)
 
     # Get args
-    mode, ip, port, plname = get_args(scr, sh, sw)
-
-    # Start socket for host/join mode
-    skt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    mode, ip, port, plname, options = get_args(scr, sh, sw)
+
+    # The AI (--ai, or the default one for players named AI) decides on its
+    # own thread, and is waited for until the deadline. Its module is only
+    # imported now, before connecting to anyone
+    ai = None
+    me_is_AI = mode != 'watch' and (plname == 'AI' or bool(options['ai']))
+    if me_is_AI:
+        spec = options['ai'] or 'ai'
+        try:
+            ai = agents.AIWorker(
+                agents.create(spec, getrandbits(32)), options['deadline'],
+                agents.interval(spec, INPUT_RATE)
+            )
+        except (ValueError, ImportError):
+            show_msg(scr, sh, sw, MSG_CANT_AI.format(spec))
+
+    # Start socket for host/join mode (TCP lockstep or UDP, see transport.py,
+    # or TCP with rollback, see rollback.py)
+    udp = options['net'] == 'udp'
+    if options['net'] == 'rollback': net = protocol.NET_ROLLBACK
+    else                           : net = protocol.NET_LOCKSTEP
+    skt = socket.socket(
+        socket.AF_INET, socket.SOCK_DGRAM if udp else socket.SOCK_STREAM
+    )
     skt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     if mode == 'host':
         try:
             skt.bind((ip, port))
-            skt.listen(1)
+            if not udp: skt.listen(5)
         except:
             show_msg(scr, sh, sw, MSG_CANT_HOST)
-    else:
+    elif not udp:
         try:
             skt.connect((ip, port))
         except:
@@ -286,11 +349,15 @@ def main(scr : curses.window):
     up_key    = set((curses.KEY_UP,   ord('k'), ord('K'), ord('w'), ord('W')))
     down_key  = set((curses.KEY_DOWN, ord('j'), ord('J'), ord('s'), ord('S')))
     quit_key  = set((ord('q'), ord('Q')))
-    keys = {'up_key' : up_key, 'down_key' : down_key, 'quit_key' : quit_key}
-
-    # Activate nodelay (so getch won't interrupt the execution)
+    stats_key = set((ord('i'), ord('I')))
+    keys = {
+        'up_key' : up_key, 'down_key' : down_key, 'quit_key' : quit_key,
+        'stats_key' : stats_key
+    }
+
+    # Activate nodelay (so getch won't interrupt the execution). The game's
+    # pace is set by the clock, not by getch
     scr.nodelay(1)
-    scr.timeout(33)
 
     # Create arena
     arena = Arena(0, 1, SCR_W, SCR_H)
@@ -299,128 +366,532 @@ def main(scr : curses.window):
     player1 = Player('left', arena)
     player2 = Player('right', arena)
 
-    # Create the ball
-    ball = Ball(
-        arena.bound_x//2, arena.bound_y//2, choice((-1, 1)), choice((-1, 0, 1))
-    )
-
-    # Connection accepted
-    accepted = False
+    # Create the ball (its position is set from the state once the game
+    # starts)
+    ball = Ball(arena.bound_x//2, arena.bound_y//2, 0, 0)
 
     # Waiting connection message
     scr.addstr(sh//2, sw//2-len(MSG_WAITING)//2, MSG_WAITING)
     scr.refresh()
-    scr.addstr(sh//2, 0, " "*sw)
 
-    # Draw the arena
-    arena.draw(scr)
+    # Start networking. Both peers run the simulation from the host's seed
+    if mode == 'host':
+        tick_rate, seed = options['tick'], getrandbits(31)
+    spectators, controller = None, False
 
-    # Game loop
-    while True:
-        # Start networking
-        if mode == 'host':
-            if not accepted:
-                # Accept client
-                try:
-                    clskt, claddr = skt.accept()
-                except:
-                    sys.exit()
-                # Write host name on the screen and send it
-                scr.addstr(0, 0, plname)
-                clskt.send(plname.encode().ljust(16))
-                # Receive client name and add to screen
-                try:
-                    clname = clskt.recv(16).strip().decode()[:16]
-                except:
-                    show_msg(scr, 0, SCR_W, MSG_DISCONN)
-                scr.addstr(0, SCR_W+1-len(clname), clname)
-                # Mark client as accpeted
-                accepted = True
+    if mode == 'host' and udp:
+        # Wait for a client's HELLO and answer with host name and tick rate
+        link = transport.UdpHost(skt)
+        try:
+            left, right = plname, link.accept(plname, tick_rate)
+        except:
+            sys.exit()
+        conn = skt
+    elif mode == 'host':
+        # Accept client
+        try:
+            conn, claddr = skt.accept()
+        except:
+            sys.exit()
+        reader = protocol.FrameReader(conn)
+        # Send host name alongside the tick rate, the seed, the session
+        # token the joiner needs to come back, should its connection drop,
+        # and the net mode
+        token = getrandbits(32) or 1
+        hello = protocol.encode_hello(
+            plname, protocol.SIDE_RIGHT, tick_rate, seed, token, net
+        )
+        conn.sendall(hello)
+        # Receive client name, and whether it's a remote control
+        try:
+            name, side, _, _, _, peer_net = reader.expect(protocol.MSG_HELLO)
+            left, right = plname, protocol.decode_name(name)
+        except:
+            show_msg(scr, 0, SCR_W, MSG_DISCONN)
+        # A remote control plays along with any net mode, a joiner must run
+        # the same as the host
+        if side != protocol.SIDE_CONTROLLER and peer_net != net:
+            conn.close()
+            show_msg(scr, 0, SCR_W, MSG_NET_DIFF)
+        # Whoever connects from now on watches (see broadcast.py)
+        spectators = broadcast.Spectators(skt, b''.join((
+            protocol.encode_hello(left, protocol.SIDE_LEFT, tick_rate, seed),
+            protocol.encode_hello(right, protocol.SIDE_RIGHT, tick_rate, seed)
+        )))
+        controller = side == protocol.SIDE_CONTROLLER
+        if controller: link = transport.ControllerLink(conn)
+        else         : link = transport.TcpLink(conn)
+        if not controller: spectators.token = token
+    elif mode == 'watch':
+        # Get both players' names, then follow the game
+        viewer, seed, side = broadcast.Viewer(skt), 0, protocol.SIDE_SPECTATOR
+        try:
+            left, right, tick_rate = viewer.join(plname)
+        except:
+            show_msg(scr, sh, sw, MSG_CANT_JOIN)
+        conn = skt
+    else:
+        if udp:
+            # Send HELLO until the host answers (the seed doesn't matter,
+            # the host sends its whole state on every tick)
+            link, seed, token = transport.UdpJoiner(skt, (ip, port)), 0, 0
+            try:
+                opname, side, tick_rate = link.connect(plname)
+            except:
+                show_msg(scr, sh, sw, MSG_CANT_JOIN)
         else:
-            if not accepted:
-                # Receive host name and add to screen
-                try:
-                    scr.addstr(0, 0, skt.recv(16).strip().decode()[:16])
-                except:
-                    show_msg(scr, 0, SCR_W, MSG_DISCONN)
-                # Write client name on the screen and send it
-                scr.addstr(0, SCR_W+1-len(plname), plname)
-                skt.send(plname.encode().ljust(16))
-                accepted = True
-
-        # Draw the game score
-        scr.addstr(0, SCR_W//2-6, str(player1.score))
-        scr.addstr(0, SCR_W//2+6, str(player2.score))
-
-        # Draw players
-        player1.draw(scr, arena)
-        player2.draw(scr, arena)
-
-        # Draw ball (host) and check goals
-        if mode == 'host':
-            ball.move(player1, player2, arena)
-            ball.draw(scr)
-
-        # Get button press, perform action and send over the network
-        if mode == 'host':
-            action = get_action(
-                scr, arena, player1, keys, plname=='AI',
-                {'p1' : player1.y, 'p2' : player2.y, 'ball' : ball.upload()}
-            )
-            if action == 'up' and player1.y > arena.y+3:
-                player1.move('up')
-            elif action == 'down' and player1.y < arena.bound_y-3:
-                player1.move('down')
-            elif action == 'quit' :
-                clskt.close()
-                sys.exit(0)
-            else: action = None
-
-            # Send ball and host's action
+            reader = protocol.FrameReader(skt)
+            # Send client name first (a dedicated server waits for both
+            # players' names before answering), then receive the opponent's
+            # name, the side to play on, the tick rate, the seed, the
+            # session token (0 from a dedicated server) and the net mode
+            skt.sendall(protocol.encode_hello(
+                plname, protocol.SIDE_LEFT, net=net
+            ))
             try:
-                clskt.send(pickle.dumps((str(action), ball.upload())))
-                player2_action = clskt.recv(16).strip().decode()
-                if player2_action == 'up' and player2.y > arena.y+3:
-                    player2.move('up')
-                elif player2_action == 'down' and player2.y < arena.bound_y-3:
-                    player2.move('down')
+                name, side, tick_rate, seed, token, peer_net = reader.expect(
+                    protocol.MSG_HELLO
+                )
+                opname = protocol.decode_name(name)
             except:
                 show_msg(scr, 0, SCR_W, MSG_DISCONN)
+            if peer_net != net: show_msg(scr, 0, SCR_W, MSG_NET_DIFF)
+            link = transport.TcpLink(skt)
+        if side == protocol.SIDE_LEFT: left, right = plname, opname
+        else                         : left, right = opname, plname
+        conn = skt
+
+    # The simulation rules (arena's bounds and ball speed) at this tick
+    # rate, which the first serve already follows
+    rules = engine.make_rules(tick_rate, arena.x, arena.y, SCR_W, SCR_H)
+    state = engine.new_state(seed, rules)
+
+    # Draw the arena and both names once, on the renderer's static layer
+    renderer = render.Renderer(scr, SCR_H+2, SCR_W+2)
+    arena.draw(renderer.static)
+    renderer.static.addstr(0, 0, left)
+    renderer.static.addstr(0, SCR_W+1-len(right), right)
+
+    # Player controlled from this terminal
+    me = player1 if mode == 'host' or side == protocol.SIDE_LEFT else player2
+
+    clock = Clock(tick_rate)
+    keyframe_every = tick_rate*KEYFRAME_INTERVAL
+
+    # With rollback, both peers simulate the game, predicting each other
+    session = None
+    if options['net'] == 'rollback' and not controller:
+        session = rollback.Rollback(state, me is player1, rules)
+
+    # The host records the match, if asked to (see replay.py)
+    recorder = None
+    if mode == 'host' and options['record'] is not None:
+        try:
+            recorder = replay.Recorder(options['record'], seed, tick_rate)
+        except OSError:
+            show_msg(scr, 0, SCR_W, MSG_CANT_REC)
+
+    # Latest action, kept until a tick consumes it
+    action = None
+
+    # Time spent on each phase of the loop, and round-trip times (the
+    # joiner pings, see stats.py)
+    stats, now = Stats(options['stats']), time.perf_counter
+    if mode != 'watch': link.stats = stats
+
+    # The loop sleeps until something is due or the peer's data arrives.
+    # Over TCP, a tick waiting for the peer is put off until then (with the
+    # time it's been waiting for), while input and drawing go on
+    selector = selectors.DefaultSelector()
+    selector.register(conn, selectors.EVENT_READ)
+    waiting_since, sent, sent_action = None, False, None
+
+    # The joiner's inputs, numbered, that a dedicated server hasn't applied
+    # yet (it says which it applied in every STATE)
+    pending, input_seq = deque(maxlen=transport.MAX_PENDING), 0
+
+    # Since when the TCP peer's connection has been lost (see transport.py),
+    # and the joiner's attempt at coming back
+    lost_since, next_retry, rejoin = None, 0, None
+    score = None
+
+    # Profile the game loop until the game ends, whatever ends it (see
+    # profiling.py)
+    if options['profile'] is not None:
+        profiler = profiling.Profiler(
+            options['profile'], options['profiler'], main
+        )
+        profiler.start()
+        atexit.register(profiler.stop)
 
-        else:
-            action = get_action(
-                scr, arena, player2, keys, plname=='AI',
-                {'p1' : player1.y, 'p2' : player2.y, 'ball': ball.upload()}
+    # Game loop
+    while True:
+        loop_start = now()
+
+        # Get button press (or AI decision) at the input rate
+        if clock.input_due():
+            start = now()
+            new_action = get_action(
+                scr, arena, me, keys, me_is_AI,
+                {'p1' : state.p1_y, 'p2' : state.p2_y,
+                 'ball' : engine.ball(state)}, ai
             )
-            if action == 'up' and player2.y > arena.y+3 :
-                player2.move('up')
-            elif action == 'down' and player2.y < arena.bound_y-3:
-                player2.move('down')
-            elif action == 'quit':
-                skt.close()
+            stats.add('input', now()-start)
+            if new_action == 'stats':
+                stats.shown = not stats.shown
+            elif new_action == 'resize':
+                renderer.resize()
+            elif new_action == 'quit':
+                if recorder is not None: recorder.close()
+                if spectators is not None: spectators.close()
+                conn.close()
                 sys.exit(0)
-            else: action = None
-
-            # Send client's action, then get ball and host's position
+            elif new_action is not None:
+                action = new_action
+
+        # The host may not notice a connection cut silently before its link
+        # times out: a joiner back with its session token while the tick
+        # waits for it takes the place of the old connection right away
+        if (mode == 'host' and lost_since is None and waiting_since is not None
+            and spectators is not None and spectators.token):
+            spectators.poll()
+            if spectators.rejoined is not None:
+                selector.unregister(conn)
+                conn.close()
+                link, lost_since = None, time.monotonic()
+
+        # A dropped TCP peer has RESUME_GRACE seconds to come back: the
+        # joiner connects again with its session token, and the host takes it
+        # back from the spectators and sends the state to carry on from
+        if lost_since is not None:
+            if time.monotonic()-lost_since > transport.RESUME_GRACE:
+                show_msg(scr, 0, SCR_W, MSG_DISCONN)
+            if mode == 'host':
+                spectators.poll()
+                sock = spectators.rejoin()
+                if sock is not None:
+                    link = transport.TcpLink(sock)
+                    link.send(hello + protocol.encode_snapshot(0, state))
+            else:
+                # An attempt goes on along with the loop, until it succeeds,
+                # fails or is RESUME_RETRY seconds old
+                if time.monotonic() >= next_retry:
+                    next_retry = time.monotonic()+transport.RESUME_RETRY
+                    if rejoin is not None:
+                        selector.unregister(rejoin.sock)
+                        rejoin.close()
+                    try:
+                        rejoin = transport.Rejoin((ip, port), plname, token)
+                        selector.register(rejoin.sock, selectors.EVENT_READ)
+                    except OSError:
+                        rejoin = None
+                if rejoin is not None:
+                    try:
+                        resumed = rejoin.poll()
+                    except (OSError, protocol.ProtocolError):
+                        selector.unregister(rejoin.sock)
+                        rejoin.close()
+                        rejoin = None
+                    else:
+                        if resumed is not None:
+                            selector.unregister(rejoin.sock)
+                            (link, state), rejoin = resumed, None
+            if link is not None:
+                link.stats, conn, sent = stats, link.sock, False
+                lost_since = None
+                selector.register(conn, selectors.EVENT_READ)
+                clock.resync()
+
+        # With rollback, take in the peer's inputs and correct the ticks
+        # predicted wrong (only settled ticks are recorded)
+        if session is not None:
+            start = now()
             try:
-                skt.send(str(action).encode().ljust(16))
-                player1_action, ball_info = pickle.loads(
-                    skt.recv(sys.getsizeof(('down', ball.upload()))*3)
-                )
-                if player1_action == 'up' and player1.y > arena.y+3:
-                    player1.move('up')
-                elif player1_action == 'down' and player1.y < arena.bound_y-3:
-                    player1.move('down')
-                ball.download(ball_info)
+                msg = link.next()
+                while msg is not None:
+                    msg_type, fields = msg
+                    if msg_type != protocol.MSG_INPUT:
+                        raise protocol.ProtocolError('expected input')
+                    session.receive(
+                        fields[0], protocol.unpack_action(fields[1])
+                    )
+                    msg = link.next()
             except:
                 show_msg(scr, 0, SCR_W, MSG_DISCONN)
+            stats.add('net', now()-start)
+
+            start = now()
+            state = session.reconcile()
+            if recorder is not None:
+                for settled in session.settle(): recorder.record(*settled)
+            stats.add('sim', now()-start)
+
+        # Run the simulation ticks that are due
+        ticks = clock.ticks_due()
+        for done in range(ticks):
+            # The AI's paddle only moves on some ticks, to be as fast
+            # against the ball at every tick rate (see engine.paddle_moves)
+            if ai is not None and not engine.paddle_moves(state.tick, rules):
+                action = None
+
+            if mode == 'watch':
+                # Nothing to send, only the newest state received matters
+                start = now()
+                try:
+                    state = viewer.poll(state)
+                except:
+                    show_msg(scr, 0, SCR_W, MSG_DISCONN)
+                stats.add('net', now()-start)
+
+            elif session is not None:
+                # Send this tick's action and carry on with the peer's
+                # predicted, unless the peer is too far behind
+                if not session.can_advance():
+                    clock.defer(ticks-done)
+                    break
+                start = now()
+                try:
+                    ping = (stats.ping() if mode == 'join' else None) or b''
+                    link.send(ping + protocol.encode_input(state.tick, action))
+                except:
+                    show_msg(scr, 0, SCR_W, MSG_DISCONN)
+                stats.add('net', now()-start)
 
-            # Draw ball (join) and check goals
-            ball.move(player1, player2, arena)
-            ball.draw(scr)
+                start = now()
+                state = session.advance(action)
+                stats.add('sim', now()-start)
 
-        scr.refresh()
+                # Spectators see the game as the host predicts it
+                if spectators is not None:
+                    spectators.poll()
+                    spectators.send(protocol.encode_snapshot(0, state))
+
+            elif mode == 'host':
+                # Until the client is back, the tick waits
+                if link is None:
+                    clock.defer(ticks-done)
+                    break
+
+                # Get client's action and advance the game
+                try:
+                    start = now()
+                    if controller:
+                        client_action = link.poll(
+                            engine.paddle_moves(state.tick, rules)
+                        )
+                    elif udp:
+                        client_action = link.poll()
+                    else:
+                        # Without the client's input the tick waits
+                        msg = link.next()
+                        if msg is None:
+                            stats.add('net', now()-start)
+                            clock.defer(ticks-done)
+                            break
+                        msg_type, fields = msg
+                        if msg_type != protocol.MSG_INPUT:
+                            raise protocol.ProtocolError('expected input')
+                        client_action = protocol.unpack_action(fields[1])
+                    stats.add('net', now()-start)
+
+                    start = now()
+                    if recorder is not None:
+                        recorder.record(state, action, client_action)
+                    previous = state
+                    state = engine.step(state, action, client_action, rules)
+                    stats.add('sim', now()-start)
+
+                    # Over UDP the whole state goes on every tick. Over TCP
+                    # the client runs the same simulation, so only host's
+                    # action goes, unless the ball hit a paddle, someone
+                    # scored or a keyframe is due. A remote control is
+                    # sent nothing (but an ACK now and then, see transport.py)
+                    start = now()
+                    if udp:
+                        link.send(state)
+                    elif controller:
+                        link.flush()
+                    elif (state.ball_vx != previous.ball_vx
+                          or state.p1_score != previous.p1_score
+                          or state.p2_score != previous.p2_score
+                          or state.tick % keyframe_every == 0):
+                        link.send(protocol.encode_snapshot(0, state))
+                    else:
+                        link.send(protocol.encode_input(state.tick, action))
+
+                    # The same frame goes to every spectator
+                    if spectators is not None:
+                        spectators.poll()
+                        spectators.send(protocol.encode_snapshot(0, state))
+                    stats.add('net', now()-start)
+                except:
+                    # Over TCP the client may come back (see above)
+                    if udp or controller: show_msg(scr, 0, SCR_W, MSG_DISCONN)
+                    selector.unregister(conn)
+                    conn.close()
+                    link, lost_since = None, time.monotonic()
+                    break
+
+            elif udp:
+                # Send client's action and predict the game, reconciled with
+                # the host's newest snapshot
+                start = now()
+                try:
+                    state = link.tick(state, action, rules)
+                    ping = stats.ping()
+                    if ping is not None: skt.sendto(ping, link.peer)
+                except:
+                    show_msg(scr, 0, SCR_W, MSG_DISCONN)
+                stats.add('net', now()-start)
+
+            else:
+                # Send client's action (once per tick), then get the host's
+                # action (and run the same simulation as the host) or the
+                # host's state. Until it arrives (or the host is back) the
+                # tick waits
+                if link is None:
+                    clock.defer(ticks-done)
+                    break
+                start = now()
+                try:
+                    if not sent:
+                        ping = stats.ping() or b''
+                        input_seq += 1
+                        link.send(
+                            ping + protocol.encode_input(input_seq, action)
+                        )
+                        pending.append((input_seq, action))
+                        sent, sent_action, action = True, action, None
+                    msg = link.next()
+
+                    # A dedicated server never waits for anyone, and each
+                    # of its frames holds its whole state: after a stall,
+                    # only the newest one counts
+                    while msg is not None and msg[0] == protocol.MSG_STATE:
+                        newer = link.next()
+                        if newer is None: break
+                        msg = newer
+                except:
+                    # Come back to the host, if it gave a session token
+                    if not token: show_msg(scr, 0, SCR_W, MSG_DISCONN)
+                    selector.unregister(conn)
+                    conn.close()
+                    link, lost_since, msg = None, time.monotonic(), None
+                stats.add('net', now()-start)
+                if msg is None:
+                    clock.defer(ticks-done)
+                    break
+                msg_type, fields = msg
+                sent = False
+
+                start = now()
+
+                if msg_type == protocol.MSG_INPUT:
+                    other = protocol.unpack_action(fields[1])
+                    if me is player1:
+                        state = engine.step(state, sent_action, other, rules)
+                    else:
+                        state = engine.step(state, other, sent_action, rules)
+
+                elif msg_type == protocol.MSG_SNAPSHOT:
+                    state = engine.State(*fields[1:])
+
+                else:
+                    # A dedicated server sends its state on every tick. The
+                    # client's own paddle moves right away: it's where the
+                    # server has it, moved by the inputs not applied yet
+                    (seq, _, bx, by, bvx, bvy, p1_y, p2_y,
+                     p1_score, p2_score, ack) = fields
+                    while pending and pending[0][0] <= ack: pending.popleft()
+                    my_y = p1_y if me is player1 else p2_y
+                    for _, pending_action in pending:
+                        my_y = engine.move_paddle(my_y, pending_action, rules)
+                    if me is player1: p1_y = my_y
+                    else            : p2_y = my_y
+                    state = engine.State(
+                        seq, p1_y, p2_y, p1_score, p2_score,
+                        bx, by, bvx, bvy, 0
+                    )
+                stats.add('sim', now()-start)
+
+            # The action is used up (the TCP client's once it was sent)
+            if mode == 'host' or udp or session is not None: action = None
+
+        # Since when a tick has been waiting for the peer
+        if clock.deferred:
+            if waiting_since is None: waiting_since = time.monotonic()
+        elif ticks:
+            waiting_since = None
+
+        # Update what is drawn and draw a new frame at the render rate
+        sync(state, player1, player2, ball)
+        if clock.render_due():
+            start = now()
+
+            # Draw the game score on its layer, only when someone scored
+            if (player1.score, player2.score) != score:
+                score = (player1.score, player2.score)
+                draw_score(renderer.score, score)
+                renderer.invalidate()
+
+            frame = renderer.begin()
+
+            # Draw players and ball
+            player1.draw(frame, arena)
+            player2.draw(frame, arena)
+            ball.draw(frame)
+
+            # Show when the peer's data is late (over UDP, when nothing
+            # came from the peer for a while), or the peer is gone for now
+            if lost_since is not None:
+                frame.addstr(0, SCR_W//2-4, MSG_RECONN)
+            elif mode != 'watch':
+                since = link.last_seen if udp else waiting_since
+                if since is not None and time.monotonic()-since > LAG_AFTER:
+                    frame.addstr(0, SCR_W//2-3, MSG_LAGGING)
+
+            # Timings overlay, toggled with i
+            if stats.shown:
+                extra = {'skipped' : clock.skipped,
+                         'bytes' : renderer.bytes_flushed}
+                if session is not None: extra['rollbacks'] = session.rollbacks
+                for i, line in enumerate(stats.lines(**extra)):
+                    frame.addstr(arena.y+2+i, arena.x+3, line)
+
+            # Only the cells that changed reach the terminal
+            renderer.flush()
+            stats.add('draw', now()-start)
+
+        stats.add('loop', now()-loop_start)
+        stats.dump(
+            skipped=clock.skipped, frames=renderer.frames,
+            cells=renderer.total_cells, bytes=renderer.total_bytes
+        )
+        clock.wait(selector)
 
 
 if __name__ == '__main__':
-    curses.wrapper(main)
+    if len(sys.argv) > 1 and sys.argv[1].lower() == 'serve':
+        # Dedicated server, runs headless (see server.py)
+        import server
+        server.main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'lobby':
+        # Matchmaking over a pool of dedicated servers (see lobby.py)
+        import lobby
+        lobby.main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'replay':
+        # Watch or re-simulate a recorded match (see replay.py)
+        replay.main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'tournament':
+        # Headless AI-vs-AI tournament (see tournament.py)
+        import tournament
+        tournament.main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'chaos':
+        # A local match with many balls at once (see chaos.py)
+        import chaos
+        chaos.main()
+    elif len(sys.argv) > 1 and sys.argv[1].lower() == 'profile':
+        # Profile ticks of a headless AI-vs-AI match (see profiling.py)
+        profiling.main()
+    else:
+        curses.wrapper(main)
@@ -0,0 +1,179 @@
+"""Instrumentation of the game loop: where each tick's time goes, and how far
+away the other end is.
+
+Every phase of the loop (input, simulation, network and drawing) is timed on
+every tick, and the timings go into fixed-memory histograms. Joiners also
+send sequence-stamped pings (see protocol.py) to measure the round-trip time
+and its jitter. Press `i` during a game to show the numbers on screen, or
+give `--stats file` to append them to a file every few seconds (one JSON
+object per line).
+"""
+
+import json
+import time
+from bisect import bisect_right
+
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Upper bounds of the histogram buckets, in seconds (1-2-5 steps from 1 us
+# to 5 s, and one last bucket for anything slower)
+BOUNDS = tuple(
+    m * 10**e / 1e6 for e in range(7) for m in (1, 2, 5)
+)
+
+# Phases of a tick timed separately, and the whole loop iteration
+PHASES = ('input', 'sim', 'net', 'draw', 'loop')
+
+# Seconds between two pings, and pings in flight remembered at once
+PING_INTERVAL = 1
+PING_SLOTS    = 16
+
+# Seconds between two dumps to the stats file
+DUMP_INTERVAL = 5
+
+
+class Histogram:
+    """Count of values in fixed buckets, along with their sum and maximum"""
+
+    def __init__(self, bounds : tuple = BOUNDS):
+        """Start with every bucket empty"""
+        self.bounds = bounds
+        self.counts = [0]*(len(bounds)+1)
+        self.count  = 0
+        self.total  = 0.0
+        self.max    = 0.0
+
+
+    def add(self, value : float):
+        """Count a value"""
+        self.counts[bisect_right(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max: self.max = value
+
+
+    def mean(self) -> float:
+        """Mean of the values counted"""
+        return self.total/self.count if self.count else 0.0
+
+
+    def percentile(self, p : float) -> float:
+        """Upper bound of the bucket holding the p-th percentile (or the
+        maximum, if lower)"""
+        if not self.count: return 0.0
+        rank, seen = p/100*self.count, 0
+        for i, count in enumerate(self.counts[:-1]):
+            seen += count
+            if seen >= rank and count: return min(self.bounds[i], self.max)
+        return self.max
+
+
+    def summary(self) -> dict:
+        """Count, mean, median, 99th percentile and maximum (in ms)"""
+        return {
+            'count' : self.count,
+            'mean'  : round(self.mean()*1000, 3),
+            'p50'   : round(self.percentile(50)*1000, 3),
+            'p99'   : round(self.percentile(99)*1000, 3),
+            'max'   : round(self.max*1000, 3)
+        }
+
+
+class Stats:
+    """Timings of the game loop and round-trip times"""
+
+    def __init__(self, path : str = None):
+        """Start measuring, dumping to the file at path if given"""
+        self.phases = dict((phase, Histogram()) for phase in PHASES)
+        self.rtt    = Histogram()
+        self.jitter = 0.0
+        self.last   = None
+
+        # Send times of the pings in flight, by sequence number
+        self.ping_seq  = 0
+        self.ping_sent = [None]*PING_SLOTS
+        self.next_ping = time.monotonic()
+
+        self.path      = path
+        self.next_dump = time.monotonic()+DUMP_INTERVAL
+        self.shown     = False
+
+
+    def add(self, phase : str, seconds : float):
+        """Count the time a phase took"""
+        self.phases[phase].add(seconds)
+
+
+    def ping(self) -> bytes or None:
+        """A ping frame to send, if it's time to send one"""
+        now = time.monotonic()
+        if now < self.next_ping: return None
+
+        self.next_ping = now+PING_INTERVAL
+        self.ping_seq += 1
+        self.ping_sent[self.ping_seq % PING_SLOTS] = (self.ping_seq, now)
+        return protocol.encode_ping(self.ping_seq)
+
+
+    def pong(self, seq : int):
+        """Count the round-trip time of the ping answered, and update the
+        jitter (as in RTP, a running mean of the RTT's variation)"""
+        sent = self.ping_sent[seq % PING_SLOTS]
+        if sent is None or sent[0] != seq: return
+        self.ping_sent[seq % PING_SLOTS] = None
+
+        rtt = time.monotonic()-sent[1]
+        self.rtt.add(rtt)
+        if self.last is not None:
+            self.jitter += (abs(rtt-self.last)-self.jitter)/16
+        self.last = rtt
+
+
+    def summary(self, **extra) -> dict:
+        """Every histogram's summary, the jitter (in ms) and the extra
+        values given"""
+        summary = dict(
+            (phase, histogram.summary())
+            for phase, histogram in self.phases.items()
+        )
+        summary['rtt']    = self.rtt.summary()
+        summary['jitter'] = round(self.jitter*1000, 3)
+        summary.update(extra)
+        return summary
+
+
+    def lines(self, **extra) -> list:
+        """Lines of the on-screen overlay, extra values going last"""
+        lines = ['%-6s %8s %8s %8s  (ms)' % ('', 'mean', 'p99', 'max')]
+        for name, histogram in (
+            [(phase, self.phases[phase]) for phase in PHASES]
+            + [('rtt', self.rtt)]
+        ):
+            lines.append('%-6s %8.3f %8.3f %8.3f' % (
+                name, histogram.mean()*1000, histogram.percentile(99)*1000,
+                histogram.max*1000
+            ))
+        lines.append('jitter %8.3f' % (self.jitter*1000))
+        lines.extend('%s %s' % item for item in sorted(extra.items()))
+        return lines
+
+
+    def dump(self, **extra):
+        """Append the summary to the stats file, if one was given and it's
+        time to"""
+        if self.path is None or time.monotonic() < self.next_dump: return
+        self.next_dump = time.monotonic()+DUMP_INTERVAL
+
+        summary = self.summary(**extra)
+        summary['time'] = round(time.time(), 3)
+        try:
+            with open(self.path, 'a') as file:
+                file.write(json.dumps(summary, sort_keys=True) + '\n')
+        except OSError:
+            # Not worth stopping the game for
+            self.path = None
@@ -0,0 +1,45 @@
+"""batch.BatchEnv plays every match exactly as engine.step does"""
+
+from random import Random
+
+import pytest
+
+import engine
+
+np    = pytest.importorskip('numpy')
+batch = pytest.importorskip('batch')
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+ACTIONS = {batch.NOOP : None, batch.UP : 'up', batch.DOWN : 'down'}
+
+MATCHES = 16
+TICKS   = 3000
+
+
+@pytest.mark.parametrize('tick_rate', engine.TICK_RATES)
+def test_same_as_engine(tick_rate):
+    rules = engine.make_rules(tick_rate)
+    env = batch.BatchEnv(MATCHES, 100, rules)
+    env.reset()
+    states = [engine.new_state(100+i, rules) for i in range(MATCHES)]
+
+    assert [env.match(i) for i in range(MATCHES)] == states
+
+    rnd = Random(tick_rate)
+    for _ in range(TICKS):
+        actions = np.array([
+            [rnd.choice(tuple(ACTIONS)) for _ in range(2)]
+            for _ in range(MATCHES)
+        ])
+        env.step(actions)
+        states = [
+            engine.step(state, ACTIONS[p1], ACTIONS[p2], rules)
+            for state, (p1, p2) in zip(states, actions.tolist())
+        ]
+    assert [env.match(i) for i in range(MATCHES)] == states
+    assert any(state.p1_score or state.p2_score for state in states)
+
@@ -0,0 +1,60 @@
+"""engine.step keeps the same game at every tick rate"""
+
+import pytest
+
+import engine
+from engine import ONE, SHIFT
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+@pytest.mark.parametrize('tick_rate', engine.TICK_RATES)
+def test_serve_speed(tick_rate):
+    # The first serve already goes at this tick rate's speed
+    state = engine.new_state(5, engine.make_rules(tick_rate))
+    speed = engine.ONE*engine.BASE_TICK_RATE//tick_rate
+    assert abs(state.ball_vx) == speed
+
+
+@pytest.mark.parametrize('tick_rate', engine.TICK_RATES)
+@pytest.mark.parametrize('side', (0, 1))
+@pytest.mark.parametrize('slope', (-1, 0, 1))
+def test_no_tunnelling(tick_rate, side, slope):
+    # A ball at top speed, from any fraction of a cell, bounces off a paddle
+    # that covers its row instead of going through
+    rules = engine.make_rules(tick_rate)
+    left, top, bound_x, bound_y, speed, max_speed, _ = rules
+    face = engine.paddle_x(side, rules) + (1 if side == 0 else -1)
+    vx = -max_speed if side == 0 else max_speed
+    middle = (top+bound_y)//2
+
+    for offset in range(0, 2*ONE, ONE//16):
+        x = ((face + (10 if side == 0 else -10)) << SHIFT) + offset
+        state = engine.new_state(0, rules)._replace(
+            ball_x=x, ball_y=middle << SHIFT, ball_vx=vx, ball_vy=slope*speed
+        )
+        while (state.ball_vx > 0) == (vx > 0):
+            # The paddle follows the ball's row
+            row = engine.ball(state)[1]
+            row = max(top+3, min(row, bound_y-3))
+            if side == 0: state = state._replace(p1_y=row)
+            else        : state = state._replace(p2_y=row)
+            state = engine.step(state, None, None, rules)
+            assert state.p1_score == state.p2_score == 0, offset
+
+
+@pytest.mark.parametrize('tick_rate', engine.TICK_RATES)
+def test_held_paddle_speed(tick_rate):
+    # A held action moves its paddle as many times a second at every rate
+    rules = engine.make_rules(tick_rate)
+    moves = [engine.paddle_moves(tick, rules) for tick in range(tick_rate)]
+    assert sum(moves) == engine.BASE_TICK_RATE
+    # An AI decides as often, a BASE_TICK_RATE tick before its paddle moves
+    decides = [engine.ai_decides(tick, rules) for tick in range(tick_rate)]
+    assert sum(decides) == engine.BASE_TICK_RATE
+    every = rules.paddle_every
+    assert all(decides[tick] == moves[tick+every-1]
+               for tick in range(tick_rate-every+1))
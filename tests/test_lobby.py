@@ -0,0 +1,82 @@
+"""lobby.Lobby pairs the players in order of arrival, whatever their names"""
+
+import socket
+
+import pytest
+
+import protocol
+
+lobby = pytest.importorskip('lobby')
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+class FakeWorker:
+    """Takes the hand offs in place of a worker process"""
+
+    def __init__(self):
+        self.rooms = 0
+        self.handed = []
+
+
+    def hand_off(self, kind : str, number : int, peers : list):
+        self.handed.append((kind, [peer.name for peer in peers]))
+        for peer in peers: peer.sock.close()
+
+
+@pytest.fixture
+def lobby_and_worker():
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    worker = FakeWorker()
+    room = lobby.Lobby(listener, [])
+    room.workers.append(worker)
+    yield room, worker
+    listener.close()
+
+
+def connect(room : 'lobby.Lobby', name : str) -> socket.socket:
+    """Connect to the lobby and send a player's HELLO"""
+    sock = socket.create_connection(room.listener.getsockname())
+    sock.sendall(protocol.encode_hello(name, protocol.SIDE_LEFT))
+    serve(room)
+    return sock
+
+
+def serve(room : 'lobby.Lobby'):
+    """Let the lobby take in what arrived"""
+    for _ in range(5):
+        for key, _ in room.selector.select(0.05):
+            if key.fileobj is room.listener: room.accept()
+            else                           : room.read(key.data)
+
+
+def test_same_names_pair(lobby_and_worker):
+    room, worker = lobby_and_worker
+    socks = [connect(room, 'AI'), connect(room, 'AI')]
+    assert worker.handed == [('match', ['AI', 'AI'])]
+    assert not room.waiting
+    for sock in socks: sock.close()
+
+
+def test_order_of_arrival(lobby_and_worker):
+    room, worker = lobby_and_worker
+    socks = [connect(room, name) for name in ('a', 'b', 'c')]
+    assert worker.handed == [('match', ['a', 'b'])]
+    assert [peer.name for peer in room.waiting.values()] == ['c']
+    for sock in socks: sock.close()
+
+
+def test_closed_connection_leaves(lobby_and_worker):
+    room, worker = lobby_and_worker
+    connect(room, 'bob').close()
+    serve(room)
+    assert not room.waiting
+    sock = connect(room, 'bob')
+    assert [peer.name for peer in room.waiting.values()] == ['bob']
+    assert worker.handed == []
+    sock.close()
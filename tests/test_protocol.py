@@ -0,0 +1,78 @@
+"""Frames encoded by protocol.py come back the same, whole or in pieces"""
+
+import pytest
+
+import engine
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+STATE = engine.new_state(1234)
+
+FRAMES = [
+    (protocol.encode_hello(
+        'player', protocol.SIDE_RIGHT, 60, 1234, 99, protocol.NET_ROLLBACK
+    ), protocol.MSG_HELLO, (
+        b'player'.ljust(16), protocol.SIDE_RIGHT, 60, 1234, 99,
+        protocol.NET_ROLLBACK
+    )),
+    (protocol.encode_input(7, 'up'), protocol.MSG_INPUT,
+     (7, protocol.ACT_UP)),
+    (protocol.encode_state(
+        8, 'down', (1000, 2000, -300, 256), 5, 6, 1, 2, 4
+    ), protocol.MSG_STATE,
+     (8, protocol.ACT_DOWN, 1000, 2000, -300, 256, 5, 6, 1, 2, 4)),
+    (protocol.encode_inputs(9, [None, 'up', 'down']), protocol.MSG_INPUTS,
+     (9, 3, bytes((0, protocol.ACT_UP, protocol.ACT_DOWN)).ljust(
+         protocol.REDUNDANCY, b'\0'
+     ))),
+    (protocol.encode_snapshot(3, STATE), protocol.MSG_SNAPSHOT,
+     (3,) + tuple(STATE)),
+    (protocol.encode_ping(10), protocol.MSG_PING, (10,)),
+    (protocol.encode_pong(11), protocol.MSG_PONG, (11,)),
+    (protocol.encode_ack(12), protocol.MSG_ACK, (12,)),
+]
+
+
+@pytest.mark.parametrize('frame, msg_type, fields', FRAMES)
+def test_decode(frame, msg_type, fields):
+    assert protocol.decode(frame) == (msg_type, fields)
+
+
+@pytest.mark.parametrize('frame, msg_type, fields', FRAMES)
+def test_truncated(frame, msg_type, fields):
+    for end in range(len(frame)):
+        with pytest.raises(protocol.ProtocolError):
+            protocol.decode(frame[:end])
+
+
+def test_bad_version():
+    frame = bytearray(protocol.encode_ping(1))
+    frame[2] = protocol.VERSION+1
+    with pytest.raises(protocol.ProtocolError):
+        protocol.decode(bytes(frame))
+
+
+def test_parser_byte_by_byte():
+    stream = b''.join(frame for frame, _, _ in FRAMES)
+    parser, frames = protocol.FrameParser(), []
+    for i in range(len(stream)):
+        frames += parser.feed(stream[i:i+1])
+    assert frames == [(msg_type, fields) for _, msg_type, fields in FRAMES]
+
+
+def test_parser_coalesced():
+    stream = b''.join(frame for frame, _, _ in FRAMES)
+    parser = protocol.FrameParser()
+    assert parser.feed(stream[:-1]) == [
+        (msg_type, fields) for _, msg_type, fields in FRAMES[:-1]
+    ]
+    assert parser.feed(stream[-1:]) == [FRAMES[-1][1:]]
+
+
+def test_actions():
+    for action in (None, 'up', 'down', 'quit'):
+        assert protocol.unpack_action(protocol.pack_action(action)) == action
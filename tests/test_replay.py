@@ -0,0 +1,63 @@
+"""Recordings made by replay.Recorder play back the match recorded"""
+
+from random import Random
+
+import pytest
+
+import engine
+import replay
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+def record(path : str, ticks : int, tick_rate : int) -> list:
+    """Record ticks of a match with random actions
+
+    Returns
+    -------
+
+    states : list
+        the state before every tick, and the one after the last
+    """
+    rnd, rules = Random(ticks), engine.make_rules(tick_rate)
+    state = engine.new_state(7, rules)
+    recorder = replay.Recorder(path, 7, tick_rate, keyframe_every=16)
+    states = [state]
+    for _ in range(ticks):
+        p1, p2 = (rnd.choice((None, 'up', 'down')) for _ in range(2))
+        recorder.record(state, p1, p2)
+        state = engine.step(state, p1, p2, rules)
+        states.append(state)
+    recorder.close()
+    return states
+
+
+@pytest.mark.parametrize('ticks', (1, 16, 100))
+def test_playback(tmp_path, ticks):
+    path = str(tmp_path/'match.rec')
+    states = record(path, ticks, 60)
+
+    recording = replay.Replay(path)
+    assert recording.ticks == ticks
+    assert recording.verify() is None
+    assert list(recording.states()) == states
+    for tick in (0, ticks//2, ticks):
+        assert recording.seek(tick) == states[tick]
+    recording.close()
+
+
+def test_no_tick(tmp_path):
+    path = str(tmp_path/'empty.rec')
+    record(path, 0, 30)
+    with pytest.raises(ValueError):
+        replay.Replay(path)
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path/'other.rec'
+    path.write_bytes(b'not a recording at all')
+    with pytest.raises(ValueError):
+        replay.Replay(str(path))
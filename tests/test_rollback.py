@@ -0,0 +1,97 @@
+"""Two rollback.Rollback peers, their inputs delayed and reordered in time,
+end up on the state a plain simulation of both inputs gives"""
+
+from collections import deque
+from random import Random
+
+import pytest
+
+import engine
+import rollback
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+TICKS = 1500
+
+
+def play(seed : int, tick_rate : int, max_latency : int):
+    """Run both peers, each one sending its inputs to the other with up to
+    max_latency steps of delay, until both played TICKS ticks
+
+    Returns
+    -------
+
+    tuple(peers : tuple, actions : tuple, settled : tuple)
+        both peers, the actions each one played and the ticks each one
+        settled
+    """
+    rnd = Random(seed)
+    rules = engine.make_rules(tick_rate)
+    start = engine.new_state(seed, rules)
+    peers = (
+        rollback.Rollback(start, True, rules),
+        rollback.Rollback(start, False, rules)
+    )
+    actions, settled = ([], []), ([], [])
+    pipes, now = (deque(), deque()), 0
+
+    while min(peer.state.tick for peer in peers) < TICKS or any(pipes):
+        now += 1
+        for me, peer in enumerate(peers):
+            # What the other sent and already arrived
+            incoming = pipes[1-me]
+            while incoming and incoming[0][0] <= now:
+                _, tick, action = incoming.popleft()
+                peer.receive(tick, action)
+            peer.reconcile()
+            settled[me].extend(peer.settle())
+
+            # The peers run at different speeds
+            if (peer.state.tick < TICKS and peer.can_advance()
+                and rnd.random() < (0.9, 0.8)[me]):
+                if rnd.random() < 0.3 or not actions[me]:
+                    action = rnd.choice((None, 'up', 'down'))
+                else:
+                    action = actions[me][-1]
+                actions[me].append(action)
+                tick = peer.state.tick
+                peer.advance(action)
+
+                # In order, as over TCP
+                outgoing = pipes[me]
+                at = now + rnd.randint(0, max_latency)
+                if outgoing: at = max(at, outgoing[-1][0])
+                outgoing.append((at, tick, action))
+
+    for peer in peers: peer.reconcile()
+    return peers, actions, settled
+
+
+@pytest.mark.parametrize('tick_rate', engine.TICK_RATES)
+@pytest.mark.parametrize('seed', (1, 2, 3))
+def test_convergence(seed, tick_rate):
+    peers, actions, settled = play(seed, tick_rate, 8)
+
+    rules = engine.make_rules(tick_rate)
+    state = engine.new_state(seed, rules)
+    for p1_action, p2_action in zip(*actions):
+        state = engine.step(state, p1_action, p2_action, rules)
+
+    assert peers[0].state == peers[1].state == state
+    assert settled[0] == settled[1]
+    assert len(settled[0]) == TICKS
+    assert peers[0].rollbacks and peers[1].rollbacks
+
+
+def test_window():
+    # Without news from the other, a peer stops WINDOW ticks ahead
+    state = engine.new_state(0)
+    peer = rollback.Rollback(state, True)
+    for _ in range(rollback.WINDOW): peer.advance(None)
+    assert not peer.can_advance()
+    peer.receive(0, None)
+    peer.reconcile()
+    assert peer.can_advance()
@@ -0,0 +1,80 @@
+"""server.Room applies every input of its players, in order, and tells
+each player which of its inputs it applied"""
+
+import engine
+import protocol
+import server
+import transport
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+class FakeTransport:
+    """Keeps what's written to it"""
+
+    def __init__(self):
+        self.written = []
+        self.closed  = False
+
+    def write(self, data : bytes): self.written.append(data)
+    def close(self): self.closed = True
+    def set_write_buffer_limits(self, high : int): pass
+    def get_extra_info(self, name : str): return None
+
+
+def connect(name : str) -> server.Client:
+    """A client that said its HELLO, to a server that doesn't pair it"""
+    client = server.Client(server.Server(engine.BASE_TICK_RATE))
+    client.connection_made(FakeTransport())
+    client.identify(name, protocol.SIDE_LEFT)
+    return client
+
+
+def states(client : server.Client) -> list:
+    """STATE frames written to the client"""
+    frames = protocol.FrameParser().feed(b''.join(client.transport.written))
+    return [
+        fields for msg_type, fields in frames
+        if msg_type == protocol.MSG_STATE
+    ]
+
+
+def test_inputs_in_one_read():
+    left, right = connect('left'), connect('right')
+    room = server.Room(left, right, 1)
+    start_y = room.state.p2_y
+
+    # Both inputs arrive before the room's next tick
+    right.data_received(
+        protocol.encode_input(1, 'up') + protocol.encode_input(2, 'up')
+    )
+    room.step(engine.RULES)
+    room.step(engine.RULES)
+    assert room.state.p2_y == start_y-2
+
+    # The last input applied goes to its own sender only
+    assert [fields[-1] for fields in states(right)] == [1, 2]
+    assert [fields[-1] for fields in states(left)] == [0, 0]
+
+
+def test_no_input():
+    left, right = connect('left'), connect('right')
+    room = server.Room(left, right, 1)
+    start = room.state
+    room.step(engine.RULES)
+    assert (room.state.p1_y, room.state.p2_y) == (start.p1_y, start.p2_y)
+    assert states(right)[-1][-1] == 0
+
+
+def test_held_input_waits():
+    # A remote control's tap isn't lost on a tick its paddle can't move on
+    held = transport.HeldInput()
+    held.change(1, protocol.ACT_UP)
+    held.change(2, 0)
+    assert held.take(False) is None
+    assert held.take(True) == 'up'
+    assert held.take(False) is None
+    assert held.take(True) is None
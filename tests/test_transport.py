@@ -0,0 +1,105 @@
+"""transport.TcpLink hands out whole frames and finds out dead peers, and a
+Rejoin connects again without blocking"""
+
+import socket
+import time
+
+import pytest
+
+import engine
+import protocol
+import transport
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+
+@pytest.fixture
+def pair():
+    left, right = socket.socketpair()
+    yield transport.TcpLink(left), right
+    left.close()
+    right.close()
+
+
+def test_frames(pair):
+    link, peer = pair
+    frame = protocol.encode_input(5, 'down')
+    peer.sendall(frame[:3])
+    assert link.next() is None
+    peer.sendall(frame[3:] + protocol.encode_input(6, None))
+    assert link.next() == (protocol.MSG_INPUT, (5, protocol.ACT_DOWN))
+    assert link.next() == (protocol.MSG_INPUT, (6, 0))
+    assert link.next() is None
+
+
+def test_ping_answered(pair):
+    link, peer = pair
+    peer.sendall(protocol.encode_ping(3))
+    assert link.next() is None
+    link.flush()
+    assert protocol.decode(peer.recv(64)) == (protocol.MSG_PONG, (3,))
+
+
+def test_closed(pair):
+    link, peer = pair
+    peer.close()
+    with pytest.raises(ConnectionError):
+        link.next()
+
+
+
+def test_silent_peer(pair):
+    link, peer = pair
+    link.timeout = 0.05
+    assert link.next() is None
+    time.sleep(0.1)
+    with pytest.raises(ConnectionError):
+        link.next()
+
+
+def poll_rejoin(rejoin):
+    for _ in range(100):
+        resumed = rejoin.poll()
+        if resumed is not None: return resumed
+        time.sleep(0.01)
+
+
+def test_rejoin():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    rejoin = transport.Rejoin(listener.getsockname(), 'joiner', 1234)
+    # Nothing blocks until the host answers
+    assert rejoin.poll() is None
+
+    host, _ = listener.accept()
+    reader = protocol.FrameReader(host)
+    assert reader.expect(protocol.MSG_HELLO)[4] == 1234
+    state = engine.new_state(7)._replace(tick=90)
+    host.sendall(
+        protocol.encode_hello('host', protocol.SIDE_RIGHT)
+        + protocol.encode_snapshot(0, state)
+    )
+    link, resumed = poll_rejoin(rejoin)
+    assert resumed == state
+    host.sendall(protocol.encode_input(91, 'up'))
+    for _ in range(100):
+        msg = link.next()
+        if msg is not None: break
+        time.sleep(0.01)
+    assert msg == (protocol.MSG_INPUT, (91, protocol.ACT_UP))
+    link.sock.close()
+    host.close()
+    listener.close()
+
+
+def test_rejoin_refused():
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    addr = listener.getsockname()
+    listener.close()
+    with pytest.raises(OSError):
+        poll_rejoin(transport.Rejoin(addr, 'joiner', 1234))
@@ -0,0 +1,287 @@
+"""Headless AI-vs-AI round-robin tournaments.
+
+Run one with `python3 spong.py tournament [--ai name:param]... [options]`,
+each --ai adding an entrant (an AI controller registered in agents.py, e.g.
+`ai:20` for AI.py's bot with an atrociousness of 20). Every pair of entrants
+plays --rounds times on each side. The matches run headless, as fast as
+engine.step goes, spread over a pool of worker processes.
+
+The entrants are ranked by Elo rating, alongside their win rates and the
+length of their rallies (paddle hits per point). Every match gets its seeds
+(the ball's and the AIs') from the tournament's --seed in schedule order, so
+the same seed gives the same results whatever the number of workers.
+"""
+
+import sys
+import time
+from random import Random
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import agents
+import engine
+from engine import TICK_RATES, BASE_TICK_RATE
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Entrants when none is given
+DEFAULT_ENTRANTS = ('ai:4', 'ai:10', 'ai:20', 'ai:40')
+
+# Points to win a match, and ticks before a match is called a draw (at
+# BASE_TICK_RATE, two minutes)
+POINTS    = 3
+MAX_TICKS = 3600
+
+# Elo ratings
+ELO_START = 1500
+ELO_K     = 16
+
+# Matches sent to a worker at once
+CHUNK_SIZE = 16
+
+# Message variables
+MSG_USAGE   = 'Usage: python3 spong.py tournament [--ai name:param]... ' \
+              '[--rounds n] [--seed n] [--workers n] [--points n] ' \
+              '[--tick 30/60/120]'
+MSG_CANT_AI = 'Could not load the AI controller {}'
+MSG_RESULTS = '{} matches in {:.2f} s ({:.0f} matches/s, {:.0f} ticks/s)'
+MSG_HEADER  = '{:<12} {:>6} {:>6} {:>6} {:>6} {:>6} {:>8}'
+MSG_ROW     = '{:<12} {:>6.0f} {:>6} {:>5.1f}% {:>6} {:>6} {:>8.2f}'
+
+# A match to play: the entrants on the left and right, and its seed
+Match = namedtuple('Match', ('left', 'right', 'seed'))
+
+
+class Seat:
+    """What an AI sees of its paddle (AI.py only needs its position)"""
+
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x : int, y : int):
+        self.x, self.y = x, y
+
+
+def play(
+    match     : Match,
+    points    : int,
+    rules     : engine.Rules,
+    tick_rate : int = BASE_TICK_RATE
+) -> tuple:
+    """Play a match at tick_rate until an entrant scores points, or for as
+    long as MAX_TICKS last at BASE_TICK_RATE
+
+    Returns
+    -------
+
+    tuple(p1_score : int, p2_score : int, ticks : int, hits : int)
+        final score, ticks played and paddle hits
+    """
+    rnd = Random(match.seed)
+    state = engine.new_state(rnd.getrandbits(31), rules)
+    left  = agents.create(match.left,  rnd.getrandbits(32))
+    right = agents.create(match.right, rnd.getrandbits(32))
+
+    # Both AIs see the same (updated in place) seats and game status
+    p1 = Seat(engine.paddle_x(0, rules), 0)
+    p2 = Seat(engine.paddle_x(1, rules), 0)
+    status = {}
+
+    step, ball = engine.step, engine.ball
+    hits, scores, last_vx = 0, 0, state.ball_vx
+    left_action = right_action = None
+    for _ in range(MAX_TICKS*(tick_rate//BASE_TICK_RATE)):
+        (_, p1.y, p2.y, p1_score, p2_score, _, _, vx, _, _) = state
+        if p1_score+p2_score != scores:
+            if p1_score == points or p2_score == points: break
+            scores = p1_score+p2_score
+        # A paddle sent the ball back (a goal serves it in a random way)
+        elif vx != last_vx:
+            hits += 1
+        last_vx = vx
+
+        if engine.ai_decides(state.tick, rules):
+            status['p1'], status['p2'] = p1.y, p2.y
+            status['ball'] = ball(state)
+            left_action  = left( None, None, p1, None, True, status)
+            right_action = right(None, None, p2, None, True, status)
+        if engine.paddle_moves(state.tick, rules):
+            state = step(state, left_action, right_action, rules)
+        else:
+            state = step(state, None, None, rules)
+
+    return state.p1_score, state.p2_score, state.tick, hits
+
+
+def _play_chunk(matches : list, points : int, tick_rate : int) -> list:
+    """Play matches in a worker process"""
+    rules = engine.make_rules(tick_rate)
+    return [play(match, points, rules, tick_rate) for match in matches]
+
+
+def schedule(entrants : list, rounds : int, seed : int) -> list:
+    """Every pair of entrants, on both sides, rounds times"""
+    rnd = Random(seed)
+    return [
+        Match(left, right, rnd.getrandbits(64))
+        for _ in range(rounds)
+        for left in range(len(entrants))
+        for right in range(len(entrants))
+        if left != right
+    ]
+
+
+def run(
+    entrants  : list,
+    rounds    : int,
+    seed      : int,
+    workers   : int = None,
+    points    : int = POINTS,
+    tick_rate : int = BASE_TICK_RATE
+) -> (list, list):
+    """Play the tournament
+
+    Parameters
+    ----------
+
+    entrants  : list
+        AI controllers, as 'name' or 'name:param'
+    rounds    : int
+        times each pair of entrants plays on each side
+    seed      : int
+    workers   : int
+        worker processes (the number of CPUs by default)
+    points    : int
+    tick_rate : int
+
+    Returns
+    -------
+
+    tuple(matches : list, results : list)
+        matches played (with indices in entrants) and their results, as
+        returned by play()
+    """
+    matches = schedule(entrants, rounds, seed)
+    chunks = [
+        [match._replace(left=entrants[match.left],
+                        right=entrants[match.right])
+         for match in matches[i:i+CHUNK_SIZE]]
+        for i in range(0, len(matches), CHUNK_SIZE)
+    ]
+
+    results = []
+    with ProcessPoolExecutor(workers) as pool:
+        for chunk in pool.map(
+            _play_chunk, chunks, [points]*len(chunks),
+            [tick_rate]*len(chunks)
+        ):
+            results.extend(chunk)
+    return matches, results
+
+
+def standings(entrants : list, matches : list, results : list) -> list:
+    """Elo ratings, wins, draws, losses and rallies of every entrant, updated
+    match by match in schedule order
+
+    Returns
+    -------
+
+    table : list
+        one dict per entrant, best rated first
+    """
+    table = [
+        {'name' : name, 'elo' : ELO_START, 'games' : 0, 'wins' : 0,
+         'draws' : 0, 'losses' : 0, 'hits' : 0, 'points' : 0}
+        for name in entrants
+    ]
+
+    for match, (p1_score, p2_score, _, hits) in zip(matches, results):
+        left, right = table[match.left], table[match.right]
+
+        # Left's score: 1 for a win, 0.5 for a draw, 0 for a loss
+        score = (p1_score > p2_score) + (p1_score == p2_score)/2
+        expected = 1/(1 + 10**((right['elo']-left['elo'])/400))
+        left['elo']  += ELO_K*(score-expected)
+        right['elo'] -= ELO_K*(score-expected)
+
+        for entrant, result in ((left, score), (right, 1-score)):
+            entrant['games']  += 1
+            entrant['wins']   += result == 1
+            entrant['draws']  += result == 0.5
+            entrant['losses'] += result == 0
+            entrant['hits']   += hits
+            entrant['points'] += p1_score+p2_score
+
+    return sorted(table, key=lambda entrant: -entrant['elo'])
+
+
+def get_args() -> dict:
+    """Parse `tournament [--ai name:param]... [--rounds n] [--seed n]
+    [--workers n] [--points n] [--tick 30/60/120]`, exiting on bad
+    arguments
+
+    Returns
+    -------
+
+    args : dict
+        run()'s arguments
+    """
+    args = sys.argv[2:]
+    if len(args) % 2: sys.exit(MSG_USAGE)
+
+    options = {
+        'entrants' : [], 'rounds' : 10, 'seed' : 0, 'workers' : None,
+        'points' : POINTS, 'tick_rate' : BASE_TICK_RATE
+    }
+    numbers = {
+        '--rounds' : 'rounds', '--seed' : 'seed', '--workers' : 'workers',
+        '--points' : 'points', '--tick' : 'tick_rate'
+    }
+    for name, value in zip(args[::2], args[1::2]):
+        if name == '--ai':
+            try:
+                agents.create(value)
+            except ValueError:
+                sys.exit(MSG_USAGE)
+            except ImportError:
+                sys.exit(MSG_CANT_AI.format(value))
+            options['entrants'].append(value)
+        elif name in numbers and value.isdigit() and int(value) > 0:
+            options[numbers[name]] = int(value)
+        elif name == '--seed' and value.isdigit():
+            options['seed'] = int(value)
+        else:
+            sys.exit(MSG_USAGE)
+
+    if options['tick_rate'] not in TICK_RATES: sys.exit(MSG_USAGE)
+    if len(options['entrants']) < 2:
+        options['entrants'] = list(DEFAULT_ENTRANTS)
+    return options
+
+
+def main():
+    options = get_args()
+
+    start = time.perf_counter()
+    matches, results = run(**options)
+    elapsed = time.perf_counter()-start
+
+    ticks = sum(result[2] for result in results)
+    print(MSG_RESULTS.format(
+        len(matches), elapsed, len(matches)/elapsed, ticks/elapsed
+    ))
+    print(MSG_HEADER.format(
+        'entrant', 'elo', 'games', 'wins', 'draws', 'losses', 'rally'
+    ))
+    for entrant in standings(options['entrants'], matches, results):
+        print(MSG_ROW.format(
+            entrant['name'], entrant['elo'], entrant['games'],
+            100*entrant['wins']/entrant['games'], entrant['draws'],
+            entrant['losses'], entrant['hits']/max(entrant['points'], 1)
+        ))
+
+
+if __name__ == '__main__':
+    main()
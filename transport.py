@@ -0,0 +1,492 @@
+"""Transports of a game played from the terminal.
+
+Over TCP (the default) the game runs in lockstep: the host waits for the
+joiner's input before each tick, and the joiner for the host's answer. A
+TcpLink does it with a non-blocking socket, so while a frame is late the game
+loop keeps drawing and reading keys (spong.main shows that it's lagging).
+
+Should a TCP connection drop, the joiner has RESUME_GRACE seconds to connect
+again with its session token (see protocol.py) and carry on from the host's
+state, the game waiting for it meanwhile. Each attempt (a Rejoin) runs on a
+non-blocking socket too, so the game loop keeps drawing and reading keys. A
+connection cut without either end being told (no FIN nor RST) is found out
+by silence: both ends send on every tick, so a TcpLink that hears nothing
+for PEER_TIMEOUT seconds gives up on the peer.
+
+UDP is the alternative to the lockstep. Neither side ever waits for the
+other: the host simulates at its own pace, sending a SNAPSHOT of the whole
+state on every tick, and the joiner sends its inputs on every tick, each
+datagram repeating the last REDUNDANCY inputs. Lost or reordered datagrams
+are simply superseded by the next ones.
+
+The joiner predicts its own paddle and the ball with engine.step and, when a
+snapshot arrives, reconciles: it restarts from the authoritative state and
+replays the inputs the host hadn't applied yet.
+
+Remote controls (see protocol.py) don't play in lockstep either: they send
+their action only when it changes, so the host holds it in between and
+simulates at its own pace, sending them nothing but an ACK now and then.
+"""
+
+import os
+import time
+import errno
+import socket
+from collections import deque
+
+import engine
+import protocol
+
+__author__ = 'Felipe V. Calderan'
+__copyright__ = 'Copyright (C) 2021 Felipe V. Calderan'
+__license__ = 'BSD 3-Clause "New" or "Revised" License'
+__version__ = '1.0'
+
+# Seconds without hearing from the peer before it's considered gone
+PEER_TIMEOUT = 5
+
+# Seconds between HELLO retries, and before giving up joining
+HELLO_RETRY     = 0.5
+CONNECT_TIMEOUT = 10
+
+# Seconds a TCP game waits for a dropped joiner to come back, and between
+# two attempts of the joiner to connect again
+RESUME_GRACE = 30
+RESUME_RETRY = 1
+
+# Max. inputs the host keeps queued, or the joiner keeps for replaying
+MAX_QUEUED  = 16
+MAX_PENDING = 128
+
+DATAGRAM_SIZE = 512
+
+# Bytes read at once from a TCP peer
+RECV_SIZE = 4096
+
+
+class TcpLink:
+    """Either end of a TCP lockstep game, on a non-blocking socket: frames are
+    sent without waiting for the socket to take them, and received ones are
+    handed out once complete"""
+
+    # Seconds of silence before the peer is considered gone (None to wait
+    # forever)
+    timeout = PEER_TIMEOUT
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a connected socket (made non-blocking), once the HELLOs have
+        been exchanged"""
+        sock.setblocking(False)
+        self.sock      = sock
+        self.parser    = protocol.FrameParser()
+        self.frames    = deque()
+        self.outbox    = bytearray()
+        self.stats     = None
+        self.last_seen = time.monotonic()
+
+
+    def send(self, data : bytes):
+        """Queue data, and send as much of the queue as the socket takes"""
+        self.outbox += data
+        self.flush()
+
+
+    def flush(self):
+        """Send as much of the queue as the socket takes"""
+        while self.outbox:
+            try:
+                sent = self.sock.send(self.outbox)
+            except (BlockingIOError, InterruptedError):
+                break
+            del self.outbox[:sent]
+
+
+    def next(self) -> (int, tuple) or None:
+        """The next game frame, if it has fully arrived. Pings are answered
+        and pongs handed to the stats (see stats.py) on the way. Raises
+        ConnectionError if the peer closed the connection, or wasn't heard
+        from for timeout seconds
+
+        Returns
+        -------
+
+        tuple(msg_type : int, fields : tuple) or None
+        """
+        self.flush()
+        while not self.frames:
+            try:
+                data = self.sock.recv(RECV_SIZE)
+            except (BlockingIOError, InterruptedError):
+                if (self.timeout is not None
+                    and time.monotonic()-self.last_seen > self.timeout):
+                    raise ConnectionError('peer timed out')
+                return None
+            if not data: raise ConnectionError('peer closed the connection')
+            self.last_seen = time.monotonic()
+
+            for msg_type, fields in self.parser.feed(data):
+                if msg_type == protocol.MSG_PING:
+                    self.send(protocol.encode_pong(fields[0]))
+                elif msg_type == protocol.MSG_PONG:
+                    if self.stats is not None: self.stats.pong(fields[0])
+                else:
+                    self.frames.append((msg_type, fields))
+
+        return self.frames.popleft()
+
+
+class Rejoin:
+    """A joiner's attempt at connecting to the host again, resuming the
+    session with its token. The socket is non-blocking, so that the game
+    loop goes on meanwhile: it waits for sock in its selector, and polls"""
+
+    def __init__(self, addr : tuple, name : str, token : int):
+        """Start connecting to the host. Raises OSError if it can't even
+        start"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        err = sock.connect_ex(addr)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            raise OSError(err, os.strerror(err))
+        self.sock  = sock
+        self.link  = None
+        self.hello = protocol.encode_hello(
+            name, protocol.SIDE_LEFT, token=token
+        )
+        self.got_hello = False
+
+
+    def poll(self) -> (TcpLink, engine.State) or None:
+        """Send the HELLO once connected, and take in the host's answer.
+        Raises OSError (or protocol.ProtocolError) if the host can't be
+        reached or doesn't take the joiner back
+
+        Returns
+        -------
+
+        tuple(link : TcpLink, state : engine.State)
+            link to the host, and the state to carry on from
+        None
+            if the host hasn't answered yet
+        """
+        if self.link is None:
+            err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err: raise OSError(err, os.strerror(err))
+            try:
+                self.sock.getpeername()
+            except OSError:
+                return None # Still connecting
+            self.link = TcpLink(self.sock)
+            self.link.send(self.hello)
+
+        msg = self.link.next()
+        while msg is not None:
+            msg_type, fields = msg
+            if not self.got_hello and msg_type == protocol.MSG_HELLO:
+                self.got_hello = True
+            elif self.got_hello and msg_type == protocol.MSG_SNAPSHOT:
+                return self.link, engine.State(*fields[1:])
+            else:
+                raise protocol.ProtocolError('unexpected frame %d' % msg_type)
+            msg = self.link.next()
+        return None
+
+
+    def close(self):
+        """Give up the attempt"""
+        self.sock.close()
+
+
+class HeldInput:
+    """A remote control's action, held until it sends another one. Changes
+    are applied one per tick the paddle can move on (see
+    engine.paddle_moves), so that a quick tap still lasts a tick"""
+
+    def __init__(self):
+        """Start with no action"""
+        self.changes = deque(maxlen=MAX_QUEUED)
+        self.action  = None
+        self.seq     = 0
+
+
+    def change(self, seq : int, bits : int):
+        """Queue the action sent with the given sequence number"""
+        self.seq = seq
+        self.changes.append(protocol.unpack_action(bits))
+
+
+    def take(self, moves : bool = True) -> str or None:
+        """Action for this tick: the next change, or the one held, if the
+        paddle moves on it (the changes wait otherwise)"""
+        if not moves: return None
+        if self.changes: self.action = self.changes.popleft()
+        return self.action
+
+
+class ControllerLink(TcpLink):
+    """Host's end of a game against a remote control: it sends only its
+    changes of action, and is sent only an ACK every ACK_INTERVAL seconds"""
+
+    # A remote control stays silent for as long as its action doesn't change
+    timeout = None
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a connected socket (made non-blocking), once the HELLOs have
+        been exchanged"""
+        super().__init__(sock)
+        self.input    = HeldInput()
+        self.next_ack = time.monotonic()
+
+
+    def poll(self, moves : bool = True) -> str or None:
+        """Take in the remote control's inputs and return its action for
+        this tick, if its paddle moves on it (see HeldInput.take). Raises
+        ConnectionError if it disconnected"""
+        while True:
+            msg = self.next()
+            if msg is None: break
+            msg_type, fields = msg
+            if msg_type != protocol.MSG_INPUT:
+                raise protocol.ProtocolError('expected input')
+            self.input.change(*fields)
+
+        if time.monotonic() >= self.next_ack:
+            self.next_ack = time.monotonic()+protocol.ACK_INTERVAL
+            self.send(protocol.encode_ack(self.input.seq))
+
+        return self.input.take(moves)
+
+
+class Link:
+    """What both ends of a UDP game have in common"""
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a UDP socket"""
+        self.sock      = sock
+        self.peer      = None
+        self.last_seen = time.monotonic()
+        self.stats     = None
+
+
+    def receive(self) -> iter:
+        """Yield (msg_type, fields) for every datagram waiting, skipping the
+        invalid ones and those not coming from the peer. Pings are answered
+        and pongs handed to the stats (see stats.py) on the way"""
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(DATAGRAM_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            if self.peer is not None and addr != self.peer: continue
+            try:
+                msg = protocol.decode(data)
+            except protocol.ProtocolError:
+                continue
+            self.last_seen = time.monotonic()
+
+            if msg[0] == protocol.MSG_PING and self.peer is not None:
+                try:
+                    self.sock.sendto(protocol.encode_pong(*msg[1]), self.peer)
+                except (BlockingIOError, InterruptedError):
+                    pass
+            elif msg[0] == protocol.MSG_PONG:
+                if self.stats is not None: self.stats.pong(*msg[1])
+            else:
+                yield msg
+
+
+    def check_alive(self):
+        """Raise ConnectionError if the peer went silent for too long"""
+        if time.monotonic()-self.last_seen > PEER_TIMEOUT:
+            raise ConnectionError('peer timed out')
+
+
+class UdpHost(Link):
+    """Host's end: applies the joiner's inputs as they come and sends the
+    authoritative state on every tick"""
+
+    def __init__(self, sock : socket.socket):
+        """Wrap a bound UDP socket"""
+        super().__init__(sock)
+        self.hello  = None
+        self.queued = deque()
+        self.last   = 0
+        self.ack    = 0
+
+
+    def accept(self, name : str, tick_rate : int) -> str:
+        """Wait for a joiner's HELLO and answer it
+
+        Returns
+        -------
+
+        name : str
+            the joiner's name
+        """
+        self.sock.setblocking(True)
+        while True:
+            data, addr = self.sock.recvfrom(DATAGRAM_SIZE)
+            try:
+                msg_type, fields = protocol.decode(data)
+            except protocol.ProtocolError:
+                continue
+            if msg_type == protocol.MSG_HELLO: break
+
+        self.sock.setblocking(False)
+        self.peer  = addr
+        self.hello = protocol.encode_hello(
+            name, protocol.SIDE_RIGHT, tick_rate
+        )
+        self.sock.sendto(self.hello, self.peer)
+        self.last_seen = time.monotonic()
+        return protocol.decode_name(fields[0])
+
+
+    def poll(self) -> str or None:
+        """Take in the joiner's datagrams and return its action for this tick
+        (the oldest one not applied yet)"""
+        for msg_type, fields in self.receive():
+            if msg_type == protocol.MSG_HELLO:
+                # Our answer got lost
+                self.sock.sendto(self.hello, self.peer)
+            elif msg_type == protocol.MSG_INPUTS:
+                seq, count, actions = fields
+                for i in range(count):
+                    action_seq = seq-count+1+i
+                    if action_seq > self.last:
+                        self.queued.append((action_seq, actions[i]))
+                        self.last = action_seq
+
+        self.check_alive()
+
+        # If the joiner got ahead (its clock is a bit faster), catch up
+        while len(self.queued) > MAX_QUEUED:
+            self.ack, _ = self.queued.popleft()
+
+        if not self.queued: return None
+        self.ack, bits = self.queued.popleft()
+        return protocol.unpack_action(bits)
+
+
+    def send(self, state : engine.State):
+        """Send the state, stamped with the last joiner's input applied"""
+        try:
+            self.sock.sendto(
+                protocol.encode_snapshot(self.ack, state), self.peer
+            )
+        except (BlockingIOError, InterruptedError):
+            pass
+
+
+class UdpJoiner(Link):
+    """Joiner's end: sends its inputs, predicts the game locally and
+    reconciles with the host's snapshots"""
+
+    def __init__(self, sock : socket.socket, addr : tuple):
+        """Wrap a UDP socket that will talk to the host at addr"""
+        super().__init__(sock)
+        # Resolved, to compare it with the source of the datagrams
+        self.peer     = socket.getaddrinfo(
+            addr[0], addr[1], sock.family, socket.SOCK_DGRAM
+        )[0][4]
+        self.side     = None
+        self.seq      = 0
+        self.recent   = deque(maxlen=protocol.REDUNDANCY)
+        self.pending  = deque()
+        self.snapshot = None
+
+
+    def connect(self, name : str) -> (str, int, int):
+        """Send HELLO until the host answers
+
+        Returns
+        -------
+
+        tuple(name : str, side : int, tick_rate : int)
+            host's name, side to play on and tick rate
+        """
+        hello = protocol.encode_hello(name, protocol.SIDE_LEFT)
+        self.sock.setblocking(False)
+        start = time.monotonic()
+
+        while time.monotonic()-start < CONNECT_TIMEOUT:
+            self.sock.sendto(hello, self.peer)
+            time.sleep(HELLO_RETRY)
+            for msg_type, fields in self.receive():
+                if msg_type == protocol.MSG_HELLO:
+                    name, self.side, tick_rate, _, _, _ = fields
+                    return protocol.decode_name(name), self.side, tick_rate
+
+        raise ConnectionError('host did not answer')
+
+
+    def _step(
+        self,
+        state  : engine.State,
+        action : str or None,
+        rules  : engine.Rules
+    ) -> engine.State:
+        """Predict one tick, moving our paddle (the host's one is assumed
+        to stay still)"""
+        if self.side == protocol.SIDE_LEFT:
+            return engine.step(state, action, None, rules)
+        return engine.step(state, None, action, rules)
+
+
+    def tick(
+        self,
+        state  : engine.State,
+        action : str or None,
+        rules  : engine.Rules
+    ) -> engine.State:
+        """Send this tick's action and predict the next state
+
+        Parameters
+        ----------
+
+        state  : engine.State
+            state predicted on the previous tick
+        action : str or None
+            action taken on this tick
+        rules  : engine.Rules
+
+        Returns
+        -------
+
+        state : engine.State
+            predicted state, reconciled with the newest host's snapshot
+        """
+        # Send this action alongside the previous ones
+        self.seq += 1
+        self.recent.append(action)
+        self.pending.append((self.seq, action))
+        if len(self.pending) > MAX_PENDING: self.pending.popleft()
+        try:
+            self.sock.sendto(
+                protocol.encode_inputs(self.seq, list(self.recent)), self.peer
+            )
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        # Keep the newest snapshot, datagrams may arrive out of order
+        fresh = False
+        for msg_type, fields in self.receive():
+            if msg_type != protocol.MSG_SNAPSHOT: continue
+            if self.snapshot is None or fields[1] > self.snapshot[1]:
+                self.snapshot, fresh = fields, True
+
+        self.check_alive()
+
+        # No news from the host: keep predicting from our previous state
+        if not fresh: return self._step(state, action, rules)
+
+        # Restart from the host's state, replaying what it hasn't applied
+        ack = self.snapshot[0]
+        while self.pending and self.pending[0][0] <= ack:
+            self.pending.popleft()
+
+        state = engine.State(*self.snapshot[1:])
+        for _, pending_action in self.pending:
+            state = self._step(state, pending_action, rules)
+        return state